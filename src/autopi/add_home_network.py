@@ -55,9 +55,10 @@ def set_home_network():
     else:
         priority = None
 
-    wpa.add_network(network_config=wpa.make_network(ssid, password, priority))
-    if wpa.get_country() is None:
-        wpa.update_country(country=Config.DEFAULT_COUNTRY)
+    with wpa.EditSession() as session:
+        session.add_network(wpa.make_network(ssid, password, priority))
+        if session.config.country is None:
+            session.set_country(Config.DEFAULT_COUNTRY)
 
 
 def main():
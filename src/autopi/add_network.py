@@ -5,6 +5,7 @@ import argparse
 import subprocess
 import sys
 from dataclasses import dataclass
+from typing import Optional
 
 from util import wpa_interface as wpa
 from util.config import Config
@@ -19,6 +20,7 @@ class _Args:
     priority: int
     password: str
     interface: str
+    country: Optional[str]
 
 
 def _parse_args():
@@ -55,6 +57,11 @@ def _parse_args():
         default=Config.DEFAULT_WIRELESS_INTERFACE,
         help=f"interface to add network to. Defaults to {Config.DEFAULT_WIRELESS_INTERFACE}",
     )
+    parser.add_argument(
+        "--country",
+        type=str,
+        help="also set the ISO 3166-1 country code, in the same write and reconfigure as the network",
+    )
 
     pass_group = parser.add_mutually_exclusive_group(required=True)
     pass_group.add_argument(
@@ -80,6 +87,7 @@ def _parse_args():
         args.priority,
         None if args.no_password else args.password,
         args.interface,
+        args.country,
     )
 
 
@@ -89,7 +97,7 @@ def main():
 
     try:
         new_network = wpa.make_network(cli_args.ssid, cli_args.password, cli_args.priority)
-    except (RuntimeError, subprocess.CalledProcessError) as e:
+    except RuntimeError as e:
         # TODO: log error
         print(e, file=sys.stderr)
         sys.exit(1)
@@ -100,14 +108,15 @@ def main():
             return
 
     try:
-        wpa.add_network(new_network, cli_args.config_file)
+        # the config is written and wpa_supplicant reconfigured once, and only if the country or network is new
+        with wpa.EditSession(cli_args.config_file, cli_args.interface, reconfigure=True) as session:
+            if cli_args.country is not None:
+                session.set_country(cli_args.country)
+            session.add_network(new_network)
     except FileNotFoundError as e:
         # TODO: log error
         print(e, file=sys.stderr)
         sys.exit(1)
-
-    try:
-        wpa.run_reconfigure(cli_args.interface)
     except subprocess.CalledProcessError as e:
         # TODO: log error
         print(e, file=sys.stderr)
@@ -2,16 +2,18 @@
 
 """Add network via .txt file."""
 
-from io import TextIOWrapper
+import argparse
+import sys
 
-import util.wpa_interface as wpa
+from util import network_import
 from util.config import Config
 
 # TODO: get default file from config dir
 # on boot, run this, then rewrite file in format...
 # sudo sh -c "printf '%s\n' '#No space after (=).' '#Priority is an int value 1,2, or 3 (3 being prioritized the most).' '#If no password/priority, leave empty or delete line.' '#This file will be reset after network is added.' 'ssid=' 'password=' 'priority=' > /boot/CSM_new_network.txt"
 
-# Look for format:
+# Look for format (repeat the block, separated by a blank line, for several networks; or use CSV, see
+# util/network_import.py):
 #
 # ssid=
 # password=
@@ -20,43 +22,27 @@ from util.config import Config
 #
 
 
-def get_dict(f: TextIOWrapper) -> dict:
-    """Create dictionary of passed in file contents.
-
-    Only includes values in the format `key=value` where `value` is not empty. Excludes comments ('#').
-
-    Args:
-        f (TextIOWrapper): Text file including network info.
-
-    Returns:
-        dict: Dictionary set up with (field, input) Ie. ('ssid', 'CSMwireless').
-    """
-    d = {}
-    for line in f:
-        if line.lstrip().startswith("#"):
-            continue
-        values = list(filter(None, line.strip().split("=")))
-        if len(values) > 1:
-            key, *val = values
-            d[key] = "=".join(val)
-    return d
-
-
 def main():
     """Perform main action and call helper functions."""
-    with open(Config.NEW_NETWORK_FILE, "r") as fin:
-        d = get_dict(fin)
-    if "ssid" not in d:
-        # TODO: log
-        return
-
-    wpa.add_network(
-        network_config=wpa.make_network(
-            ssid=d["ssid"],
-            passwd=d["password"] if "password" in d else None,
-            priority=d["priority"] if "priority" in d else None,
-        )
+    parser = argparse.ArgumentParser(description="Add or update the networks listed in a file.")
+    parser.add_argument(
+        "FILE",
+        nargs="?",
+        default=Config.NEW_NETWORK_FILE,
+        help=f"network list, as key=value blocks or CSV. Defaults to {Config.NEW_NETWORK_FILE}",
     )
+    parser.add_argument("--dry-run", action="store_true", help="report the changes without applying them")
+    args = parser.parse_args()
+
+    with open(args.FILE, "r") as fin:
+        results = network_import.import_networks(network_import.parse_entries(fin), dry_run=args.dry_run)
+    for result in results:
+        # TODO: log
+        ssid = result.entry.ssid if result.entry.ssid is not None else "(no ssid)"
+        message = f" ({result.message})" if result.message else ""
+        print(f"line {result.entry.line}: {ssid}: {result.status}{message}")
+    if any(result.status == network_import.INVALID for result in results):
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -23,20 +23,21 @@ def main():
         validator=wpa.is_valid_ssid,
         error_message=wpa.SSIDLengthError.constraint_msg,
     )
-    if wpa.check_duplicate_ssid(ssid):
-        print("Mutiple networks with SSID: " + ssid)
-        deletion_choice = ui.get_input(
-            "Delete none or all of networks with SSID: " + ssid + "? (all/none)",
-            validator=_is_all_or_none,
-        )
-        if deletion_choice.lower() == "all":
-            while wpa.check_duplicate_ssid(ssid):
-                _process_output(ssid, wpa.delete_ssid(ssid))
-            _process_output(ssid, wpa.delete_ssid(ssid))
-        else:
-            print("No networks deleted!")
-    else:
-        _process_output(ssid, wpa.delete_ssid(ssid))
+    # one read and at most one write, however many networks are deleted
+    with wpa.EditSession() as session:
+        matches = len(session.config.find(ssid))
+        if matches > 1:
+            print("Mutiple networks with SSID: " + ssid)
+            deletion_choice = ui.get_input(
+                "Delete none or all of networks with SSID: " + ssid + "? (all/none)",
+                validator=_is_all_or_none,
+            )
+            if deletion_choice.lower() != "all":
+                print("No networks deleted!")
+                return
+        deleted = session.config.remove_ssid(ssid, all_matches=True)
+    for _ in range(max(deleted, 1)):
+        _process_output(ssid, deleted > 0)
 
 
 if __name__ == "__main__":
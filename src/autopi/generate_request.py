@@ -1,15 +1,33 @@
 #!/usr/bin/env python3
 """This script generates IP discovery requests and send them as JSON via POST."""
 
-import argparse
 import json
+import subprocess
 import sys
-from http.client import HTTPResponse
-from pathlib import Path
+import threading
+import time
+from http.client import HTTPException
+from typing import List, Optional
 
-import requests
-from util import device_info, network_info
+from util import compact_status, device_info, network_info, trigger
 from util.config import Config
+from util.heartbeat import HeartbeatSchedule
+from util.http_sender import Response, post, post_json
+from util.probes import ProbeRegistry
+from util.spool import Spool
+from util.state_store import StateStore, state_digest
+
+# Version 2 requests carry a digest of the device state. When the state is unchanged, only the devid, event and digest
+# are sent; the server replies with SEND_FULL_STATE if the digest does not match the last state it received.
+PROTOCOL_VERSION = 2
+SEND_FULL_STATE = "send_full_state"
+
+# events raised by hooks, which may come in bursts (e.g. a reconnect); they are coalesced into one request
+TRIGGERED_EVENTS = ("net_update", "ssh_change", "vnc_change")
+
+# probes for the general request fields; they run concurrently, each with its own timeout
+PROBES = ProbeRegistry()
+STATE = StateStore()
 
 
 def generate_shutdown_request() -> dict:
@@ -44,47 +62,51 @@ def _is_vnc_up() -> bool:
     return device_info.is_service_up(Config.VNC_SERVICE)
 
 
-def _get_interface() -> str:
+def _get_interface(snapshot: Optional[network_info.NetworkSnapshot] = None) -> str:
     """Get connected interface.
 
+    Args:
+        snapshot (NetworkSnapshot | None, optional): network state to read. Defaults to capturing it.
+
     Raises:
         RuntimeError: no connected network interfaces
 
     Returns:
         str: interface name
     """
-    connected_interfaces = list(
-        filter(
-            network_info.is_interface_connected,
-            network_info.get_interfaces(),
-        )
-    )
+    snapshot = snapshot if snapshot is not None else network_info.NetworkSnapshot.capture()
+    connected_interfaces = snapshot.get_interfaces()
     if len(connected_interfaces) == 0:
         raise RuntimeError("No connected network interfaces")
-    default_interface = network_info.get_default_interface()
+    default_interface = snapshot.default_interface
     return connected_interfaces[0] if default_interface not in connected_interfaces else default_interface
 
 
-def get_network_fields(interface: str) -> dict:
+def get_network_fields(interface: str, snapshot: Optional[network_info.NetworkSnapshot] = None) -> dict:
     """Return network fields needed for request.
 
+    Args:
+        interface (str): interface to report.
+        snapshot (NetworkSnapshot | None, optional): network state to read. Defaults to capturing it.
+
     Returns:
         dict: dictionary of field(s).
 
     Raises:
         RuntimeError: if no interface can be found
     """
-    ip = network_info.get_interface_ip(interface)
+    snapshot = snapshot if snapshot is not None else network_info.NetworkSnapshot.capture()
+    ip = snapshot.get_interface_ip(interface)
     if ip is None:
         raise RuntimeError("Interface disconnected")
 
-    mac = network_info.get_mac(interface)
+    mac = snapshot.get_mac(interface)
     fields = {
         "ip": ip,
         "mac": mac,
     }
 
-    ssid = network_info.get_ssid(interface)
+    ssid = snapshot.get_ssid(interface)
     if ssid is not None:  # ensures ssid available for interface before adding it
         fields["ssid"] = ssid
 
@@ -103,132 +125,391 @@ def get_service_fields() -> dict:
     }
 
 
+class _Shared:
+    """Compute a value at most once per request, shared by several probes."""
+
+    def __init__(self, func):
+        self._func = func
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self._result = None
+        self._error = None
+        self._done = False
+
+    def __call__(self):
+        with self._lock:
+            if not self._done:
+                try:
+                    self._result = self._func()
+                except Exception as e:
+                    self._error = e
+                self._done = True
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+def _capture_network_fields() -> dict:
+    snapshot = network_info.NetworkSnapshot.capture()
+    return get_network_fields(_get_interface(snapshot), snapshot)
+
+
+_network_fields = _Shared(_capture_network_fields)
+
+
+@PROBES.register("ip")
+def _probe_ip() -> str:
+    return _network_fields()["ip"]
+
+
+@PROBES.register("mac")
+def _probe_mac() -> str:
+    return _network_fields()["mac"]
+
+
+@PROBES.register("ssid")
+def _probe_ssid() -> Optional[str]:
+    return _network_fields().get("ssid")
+
+
+@PROBES.register("ssh", timeout=Config.SERVICE_PROBE_TIMEOUT)
+def _probe_ssh() -> str:
+    return "up" if _is_ssh_up() else "down"
+
+
+@PROBES.register("vnc", timeout=Config.SERVICE_PROBE_TIMEOUT)
+def _probe_vnc() -> str:
+    return "up" if _is_vnc_up() else "down"
+
+
+def get_info_fields(verbose: bool = False) -> dict:
+    """Run the probes for the general request fields.
+
+    The probes run concurrently; a probe that times out contributes its last-known value, and fields without a value
+    are left out.
+
+    Args:
+        verbose (bool, optional): print the latency of each probe. Defaults to False.
+
+    Returns:
+        dict: dictionary of field(s).
+
+    Raises:
+        RuntimeError: if no network interface is connected to the network
+    """
+    _network_fields.reset()
+    results = PROBES.run()
+    fields = {}
+    for name, result in results.items():
+        if verbose:
+            note = " (timed out; last known value)" if result.timed_out else ""
+            print(f"probe {name:<5} {result.latency * 1000:8.1f} ms{note}")
+        if result.error is not None:
+            raise result.error
+        if result.value is not None:
+            fields[name] = result.value
+    return fields
+
+
 def get_id_fields() -> dict:
     """Return dev and hardware IDs.
 
     Returns:
         dict: dictionary with fields {'hwid': hwid, 'devid': devid}
     """
-    return {"hwid": device_info.get_hw_id(), "devid": device_info.get_dev_id()}
-
+    hwid, devid = device_info.get_identity()
+    return {"hwid": hwid, "devid": devid}
 
-def load_request(request_path: Path) -> dict:
-    """Load request JSON file as string.
 
-    If file read fails, a blank string is returned.
+def get_state_digest(state: dict) -> str:
+    """Compute a short digest of the device state.
 
     Args:
-        request_path (Path): path to a file with a json request.
+        state (dict): hwid and info fields of a request.
 
     Returns:
-        dict: parsed file JSON contents.
-
-    Raises:
-        OSError: file open/read failed
+        str: 16 hex character digest, independent of field order.
     """
-    with open(request_path) as f:
-        return json.load(f)
-
+    return state_digest(state)[:16]
 
-def save_request(request_path: Path, request: dict):
-    """Save request JSON file.
 
-    If file open/save fails, the failure is ignored as it is not critical.
+def build_request(
+    event: str, id_fields: dict, info_fields: dict, unchanged: bool = False, reasons: Optional[List[str]] = None
+) -> dict:
+    """Build a request from its fields, without probing the device.
 
     Args:
-        request_path (Path): path to a file with a json request.
-        request (dict): dictionary with data fields.
+        event (str): the type of the event.
+        id_fields (dict): {'hwid': hwid, 'devid': devid}, as from get_id_fields.
+        info_fields (dict): the general request fields, as from get_info_fields; empty for shutdown.
+        unchanged (bool, optional): the info fields are the same as in the previous request. Defaults to False.
+        reasons (list[str] | None, optional): the coalesced events the request reports. Defaults to None.
 
-    Raises:
-        OSError: file open/read failed
+    Returns:
+        dict: all the fields for the request, or a compact heartbeat if unchanged is set.
     """
-    with open(request_path, "w") as f:
-        f.write(json.dumps(request))
+    request = {"version": PROTOCOL_VERSION, "devid": id_fields["devid"], "event": event}
+    if reasons:
+        request["reasons"] = reasons
+    if event != "shutdown":
+        request["digest"] = get_state_digest({"hwid": id_fields["hwid"], **info_fields})
+        if unchanged:
+            return request  # compact heartbeat; the server already has this state
+    return {**request, "hwid": id_fields["hwid"], **info_fields}
 
 
-def generate_request(event: str, force: bool) -> dict:
+def generate_request(event: str, force: bool, verbose: bool = False, reasons: Optional[List[str]] = None) -> dict:
     """Generate the data needed for the request.
 
     Args:
         event (str): the type of the event.
         force (bool): if true, the non-id/event-name fields will not be compared to the previous request, and will always be sent.
+        verbose (bool, optional): print the latency of each probe. Defaults to False.
+        reasons (list[str] | None, optional): the coalesced events the request reports. Defaults to None.
 
     Returns:
-        dict: all the fields for the request.
+        dict: all the fields for the request. If the fields match the previous request, a compact heartbeat with only the
+        protocol version, devid, event and state digest.
 
     Raises:
         RuntimeError: if no network interface is connected to the network
     """
-    CSM_ROOT = Path(Config.ROOT_DIR)
-    REQ_PATH = CSM_ROOT / "old_request.json"
-
     info_fields = {}
     if event != "shutdown":
-        info_fields = {**get_network_fields(_get_interface()), **get_service_fields()}
+        info_fields = get_info_fields(verbose)
 
+    unchanged = False
     try:
-        if force:
-            save_request(REQ_PATH, info_fields)
+        if event == "shutdown":
+            STATE.persist()  # in case the SD card copy missed a change
         else:
-            # TODO: possibly replace this implementation with a checksum
-            # compare new request to previous
-            old = load_request(REQ_PATH)
-            if old == info_fields:
-                info_fields = {}  # clear non-essential fields
-                REQ_PATH.touch()
-            else:
-                save_request(REQ_PATH, info_fields)
+            unchanged = STATE.update(info_fields, force)
     except OSError:
         # TODO probably log this
         pass
 
-    request = get_id_fields()
-    request["event"] = event
-    request = {**request, **info_fields}
-    return request
+    return build_request(event, get_id_fields(), info_fields, unchanged, reasons)
 
 
-def send_request(api_url: str, request: dict) -> HTTPResponse:
+def send_request(api_url: str, request: dict, compact: bool = Config.COMPACT_STATUS) -> Response:
     """Send a POST request with JSON data to the specified url.
 
+    A single status request is sent in the compact binary encoding instead, if enabled and the request can be encoded.
+    If the server does not accept the encoding (415 or 422), the request is sent again as JSON.
+
     Args:
         api_url (str): url to the target for the post request.
         request: Anything that json.dumps(request) can convert to a JSON string.
+        compact (bool, optional): try the compact encoding first. Defaults to Config.COMPACT_STATUS.
 
     Returns:
-        HTTPResponse: the response from the server.
+        Response: the response from the server.
 
     Raises:
-        URLError on connection failure.
+        OSError: on connection failure or timeout.
+        http.client.HTTPException: the server's response is not valid HTTP.
     """
-    return requests.post(api_url, json=request)
+    if compact and isinstance(request, dict):
+        try:
+            body = compact_status.encode_status(request)
+        except ValueError:
+            pass  # not representable; fall back to JSON
+        else:
+            resp = post(api_url, body, compact_status.CONTENT_TYPE, timeout=Config.REQUEST_TIMEOUT)
+            if resp.status_code not in (415, 422):
+                return resp
+    return post_json(api_url, request, timeout=Config.REQUEST_TIMEOUT)
+
+
+def _try_send(api_url: str, request) -> Optional[Response]:
+    """Send a request, returning None if it should be retried later (connection failure or server error)."""
+    try:
+        resp = send_request(api_url, request)
+    except (OSError, HTTPException):
+        return None
+    return resp if resp.status_code < 500 else None
 
 
-def generate_and_send_request(event: str = "general", force: bool = False, verbose: bool = False):
+def _needs_full_state(resp: Response, batch: bool = False) -> bool:
+    """Check if the server asked for the full state, in a single or batch response."""
+    if not resp.ok:
+        return False
+    body = resp.json()
+    if batch:
+        return any(result.get("action") == SEND_FULL_STATE for result in body.get("results", []))
+    return body.get("action") == SEND_FULL_STATE
+
+
+def _sync_network_profile(body, devid: str, verbose: bool = False):
+    """Apply the server's network profile if the hash in a status response differs from the applied one."""
+    if not isinstance(body, dict) or body.get("network_profile") is None:
+        return
+    # deferred, like network_import in sync: the wpa modules are only loaded once the profile hash differs
+    from util.network_profile import NetworkProfile
+
+    try:
+        results = NetworkProfile().sync(body["network_profile"], devid)
+    except (OSError, HTTPException, ValueError, subprocess.CalledProcessError) as e:
+        # TODO probably log this; the profile is fetched again after the next status response
+        if verbose:
+            print("Network profile not applied:", e)
+        return
+    if verbose and results is not None:
+        print("----- Network profile -----")
+        for result in results:
+            message = f" ({result.message})" if result.message else ""
+            print(f"{result.entry.ssid}: {result.status}{message}")
+
+
+def generate_and_send_request(
+    event: str = "general", force: bool = False, verbose: bool = False, reasons: Optional[List[str]] = None
+):
     """Generate the specified request, compare it to previous request if applicable, and send it.
 
+    If the request cannot be delivered (no connection or a server error), it is spooled and replayed, together with any
+    later requests, in one batch once the server is reachable again.
+
+    The response's scheduling hints set when the next keepalive is due (see send_coalesced). If the response names a
+    network profile other than the applied one, the profile is fetched and applied.
+
     Args:
         event (str):
         force (bool): force the request to be generated without comparing to previous request
         verbose (bool): show command output to stdout
-        args (list): normal commandline arguments minus script name
+        reasons (list[str] | None, optional): the coalesced events the request reports. Defaults to None.
 
     Raises:
         RuntimeError: if no network interface is connected to the network
-        URLError: if the connection failed
+        OSError: if the spool could not be written
     """
     api_url = Config.API_URL
-
-    request = generate_request(event, force)
-    resp = send_request(api_url, request)
+    spool = Spool()
+    schedule = HeartbeatSchedule()
+
+    request = generate_request(event, force, verbose, reasons)
+    batch = not spool.is_empty()
+    if batch:
+        # replay the backlog together with this request so the server applies events in order
+        spool.append(request)
+        if not spool.is_ready():
+            if verbose:
+                print("Server unreachable recently; request spooled")
+            return
+        request = spool.requests()
+
+    sent_at = time.time()
+    resp = _try_send(Config.API_BATCH_URL if batch else api_url, request)
+    if resp is None:
+        if not batch:
+            spool.append(request)
+        spool.record_failure()
+        if verbose:
+            print("Request failed; spooled for replay")
+        return
+    if batch:
+        if not 200 <= resp.status_code < 300:
+            # e.g. a server without the batch endpoint, or one that rejects the batch; keep the backlog
+            spool.record_failure()
+            if verbose:
+                print(f"Batch not accepted (response code {resp.status_code}); backlog kept")
+            return
+        spool.clear()
+
+    if _needs_full_state(resp, batch):
+        # the server's last known state differs from the previous request
+        request = generate_request(event, force=True, reasons=reasons)
+        sent_at = time.time()
+        resp = _try_send(api_url, request)
+        if resp is None:
+            spool.append(request)
+            spool.record_failure()
+            if verbose:
+                print("Request failed; spooled for replay")
+            return
+        batch = False
+    if not batch:
+        schedule.update(resp.json() if resp.ok else {}, sent_at)
     if verbose:
         print("----- POST Data ----")
         print(json.dumps(request, indent=4, sort_keys=True))
         print()
         print("----- Response -----")
         print("Response code:", resp.status_code)
+        if resp.resumed is not None:
+            # sessions are cached per process: network_monitor.py resumes them, a one-off run only within the run
+            print("TLS handshake:", "resumed from an earlier request of this process" if resp.resumed else "full")
         print("Response body:")
         print(resp.json())
+    if not batch and resp.ok:
+        _sync_network_profile(resp.json(), request["devid"], verbose)
+
+
+def _send_triggered(verbose: bool = False, settled: bool = False):
+    """Send one request for each burst of pending triggers, waiting for each burst to end.
+
+    If settled, the first burst has already ended and is sent without waiting.
+    """
+    while trigger.pending():
+        if not settled:
+            time.sleep(Config.TRIGGER_DEBOUNCE)
+        settled = False
+        reasons = trigger.collect()
+        if reasons:
+            event = reasons[0] if len(reasons) == 1 else "general"
+            generate_and_send_request(event, verbose=verbose, reasons=reasons)
+
+
+def send_coalesced(event: str = "general", force: bool = False, verbose: bool = False, settled: bool = False):
+    """Send a request for an event, coalesced with the events other processes trigger around the same time.
+
+    Only one sender runs at a time. Events in TRIGGERED_EVENTS are dropped as triggers and sent by the sender holding the
+    lock, after a short debounce window, as one request with the union of the events as its reasons; if another sender
+    holds the lock, it sends them. A keepalive is skipped if another sender is running; other events (start, shutdown
+    and general, as sent by a manual run) wait for it and are sent without the debounce window.
+
+    Keepalives follow the schedule hinted by the server's last response. network_monitor.py sends them at the due time;
+    a keepalive run by hand is skipped if it is not due within a tick, and otherwise sent at the due time. The wait
+    happens before the lock is taken, so triggers are not held up by it.
+
+    Args:
+        event (str, optional): the type of the event. Defaults to "general".
+        force (bool, optional): send the full state without comparing to the previous request. Defaults to False.
+        verbose (bool, optional): show command output to stdout. Defaults to False.
+        settled (bool, optional): the caller has already waited out the burst of a triggered event (as network_monitor
+            does), so it is sent without the debounce window if this process takes the lock. Defaults to False.
+
+    Raises:
+        RuntimeError: if no network interface is connected to the network
+        OSError: if the trigger, lock or spool could not be written
+    """
+    if event == "keepalive":
+        delay = HeartbeatSchedule().delay()
+        if delay is None:
+            if verbose:
+                print("Keepalive not due yet; skipped")
+            return
+        time.sleep(delay)
+
+    triggered = event in TRIGGERED_EVENTS
+    if triggered:
+        trigger.drop(event)
+    lock = trigger.SenderLock()
+    if not lock.acquire(blocking=not triggered and event != "keepalive"):
+        return
+    try:
+        if not triggered:
+            generate_and_send_request(event, force, verbose)
+        _send_triggered(verbose, settled and triggered)
+    finally:
+        lock.release()
+    # a sender that started after the last collect left its trigger to this one
+    while trigger.pending() and lock.acquire(blocking=False):
+        try:
+            _send_triggered(verbose)
+        finally:
+            lock.release()
 
 
 def parse_commandline() -> (str, bool, bool):
@@ -239,6 +520,8 @@ def parse_commandline() -> (str, bool, bool):
         bool: force request to be sent without comparing last update.
         bool: verbose
     """
+    import argparse  # deferred: only needed when run as a script, and slow to import
+
     parser = argparse.ArgumentParser(description="Generate a POST request for a given event.")
     parser.add_argument("--verbose", "-v", action="count", default=0)
     parser.add_argument(
@@ -271,7 +554,7 @@ def parse_commandline() -> (str, bool, bool):
 def main():
     """Catch exceptions."""
     try:
-        generate_and_send_request(*parse_commandline())
+        send_coalesced(*parse_commandline())
     except RuntimeError as re:
         print(re)
         sys.exit(1)
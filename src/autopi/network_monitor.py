@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""Send a net_update request whenever the network configuration changes, and the keepalives when they are due."""
+
+import sys
+import time
+
+from generate_request import send_coalesced
+from util import network_info
+from util.config import Config
+from util.heartbeat import HeartbeatSchedule
+
+
+def _send(event: str, settled: bool = False):
+    """Send a request, reporting failures instead of ending the monitor."""
+    try:
+        send_coalesced(event, settled=settled)
+    except Exception as e:
+        # TODO: log error; the next keepalive will catch up
+        print(e, file=sys.stderr)
+
+
+def run(monitor: network_info.NetlinkMonitor, schedule: HeartbeatSchedule):
+    """Report changes to the server as they happen, and send each keepalive at its due time.
+
+    Keepalives are sent from this process rather than by a timer so that their connections resume the TLS session of
+    the previous request instead of each doing a full handshake. A keepalive that is not delivered, or whose response
+    has no scheduling hints, is retried a tick later.
+    """
+    retry_at = time.monotonic()
+    while True:
+        wait = schedule.until_due()
+        if wait == 0:
+            wait = max(0.0, retry_at - time.monotonic())
+        snapshot = monitor.next_change(wait)
+        if snapshot is None:
+            retry_at = time.monotonic() + Config.HEARTBEAT_TICK
+            _send("keepalive")
+        elif snapshot.is_connected:
+            # next_change() has already waited out the burst, so the debounce window would only delay the request
+            _send("net_update", settled=True)
+
+
+def main():
+    """Watch rtnetlink notifications and the heartbeat schedule until stopped."""
+    with network_info.NetlinkMonitor() as monitor:
+        run(monitor, HeartbeatSchedule())
+
+
+if __name__ == "__main__":
+    main()
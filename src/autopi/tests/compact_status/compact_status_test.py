@@ -0,0 +1,69 @@
+"""compact_status encoding test script."""
+
+import unittest
+
+from autopi.util import compact_status
+
+HEARTBEAT = {
+    "version": 2,
+    "devid": "0b3f1c2e-0000-4000-8000-000000000001",
+    "event": "keepalive",
+    "digest": "0123456789abcdef",
+}
+FULL = {
+    **HEARTBEAT,
+    "event": "start",
+    "hwid": "ab" * 32,
+    "ip": "10.0.0.5",
+    "mac": "b8:27:eb:00:00:01",
+    "ssid": "CSMwireless",
+    "ssh": "up",
+    "vnc": "down",
+}
+
+# the same bytes are decoded in web/tests/compact/compact_test.py
+HEARTBEAT_HEX = "01020300020b3f1c2e0000400080000000000000010123456789abcdef"
+FULL_HEX = (
+    "010201007f0b3f1c2e000040008000000000000001abababababababababababababababababababababababababababababababab"
+    "0123456789abcdef040a0000050b43534d776972656c657373"
+)
+COALESCED = {**HEARTBEAT, "event": "general", "reasons": ["net_update", "ssh_change"]}
+COALESCED_HEX = "01020001020b3f1c2e0000400080000000000000010123456789abcdef30"
+
+
+class TestEncodeStatus(unittest.TestCase):
+    """Tests for the compact status encoding."""
+
+    def test_heartbeat(self):
+        """Check a compact heartbeat encodes to the header, device ID and digest."""
+        self.assertEqual(compact_status.encode_status(HEARTBEAT).hex(), HEARTBEAT_HEX)
+
+    def test_full(self):
+        """Check a full request encodes every field but the MAC address."""
+        self.assertEqual(compact_status.encode_status(FULL).hex(), FULL_HEX)
+
+    def test_reasons(self):
+        """Check the reasons of a coalesced request encode to a bit mask of event codes."""
+        self.assertEqual(compact_status.encode_status(COALESCED).hex(), COALESCED_HEX)
+
+    def test_ipv6(self):
+        """Check IPv6 addresses are packed in 16 bytes."""
+        encoded = compact_status.encode_status({**FULL, "ip": "2001:db8::1"})
+        self.assertEqual(len(encoded), len(bytes.fromhex(FULL_HEX)) + 12)
+
+    def test_unrepresentable(self):
+        """Check requests that cannot be encoded raise ValueError, so they are sent as JSON."""
+        for request in (
+            {**FULL, "event": "reboot"},
+            {**FULL, "ip": "fe80::1%wlan0"},
+            {**FULL, "ssh": "unknown"},
+            {**FULL, "hwid": "abc"},
+            {**FULL, "devid": "not-a-uuid"},
+            {**FULL, "reasons": ["reboot"]},
+        ):
+            with self.assertRaises(ValueError):
+                compact_status.encode_status(request)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,74 @@
+"""device_info identity cache test script."""
+
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from autopi.util import device_info
+
+
+class TestIdentityCache(unittest.TestCase):
+    """Tests for caching the hardware and device IDs per boot."""
+
+    def setUp(self):
+        """Point the boot ID, device ID and run directory at temporary files."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = Path(tmp.name)
+        self.boot_id = self.dir / "boot_id"
+        self.dev_id = self.dir / "CSM_device_id.txt"
+        self.boot_id.write_text("boot-1\n")
+        self.dev_id.write_text("dev-1\n")
+        config = device_info.Config
+        patches = (
+            mock.patch.object(config, "BOOT_ID_FILE", str(self.boot_id)),
+            mock.patch.object(config, "DEV_ID_FILE", str(self.dev_id)),
+            mock.patch.object(config, "RUN_DIR", str(self.dir / "run")),
+            mock.patch.object(device_info, "get_hw_id", side_effect=lambda: "hw-1"),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_cached(self):
+        """Check the IDs are read once and then served from the cache."""
+        self.assertEqual(device_info.get_identity(), ("hw-1", "dev-1"))
+        with mock.patch.object(device_info, "get_dev_id") as get_dev_id:
+            self.assertEqual(device_info.get_identity(), ("hw-1", "dev-1"))
+            get_dev_id.assert_not_called()
+            device_info.get_hw_id.assert_called_once()
+
+    def test_device_id_edited(self):
+        """Check editing the device ID file invalidates the cache."""
+        device_info.get_identity()
+        self.dev_id.write_text("dev-2\n")
+        stat = self.dev_id.stat()
+        os.utime(self.dev_id, ns=(stat.st_atime_ns, stat.st_mtime_ns + 2_000_000_000))
+        self.assertEqual(device_info.get_identity(), ("hw-1", "dev-2"))
+
+    def test_new_boot(self):
+        """Check a new boot ID invalidates the cache."""
+        device_info.get_identity()
+        self.boot_id.write_text("boot-2\n")
+        device_info.get_identity()
+        self.assertEqual(device_info.get_hw_id.call_count, 2)
+
+    def test_corrupt_cache(self):
+        """Check a corrupt cache is ignored and replaced."""
+        (self.dir / "run").mkdir()
+        (self.dir / "run" / "identity.json").write_text("{")
+        self.assertEqual(device_info.get_identity(), ("hw-1", "dev-1"))
+        device_info.get_identity()
+        device_info.get_hw_id.assert_called_once()
+
+    def test_no_boot_id(self):
+        """Check the IDs are still read when the boot ID is unavailable."""
+        self.boot_id.unlink()
+        self.assertEqual(device_info.get_identity(), ("hw-1", "dev-1"))
+        self.assertFalse((self.dir / "run").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,27 @@
+"""device_info service status test script."""
+
+import unittest
+from unittest import mock
+
+from autopi.util import device_info
+
+
+class TestServiceStatus(unittest.TestCase):
+    """Tests for choosing between the D-Bus and subprocess backends."""
+
+    def test_active_state(self):
+        """Check ActiveState values are mapped to up/down."""
+        for state, expected in (("active", True), ("reloading", True), ("inactive", False), ("failed", False)):
+            with mock.patch.object(device_info, "get_unit_active_state", return_value=state):
+                self.assertEqual(device_info.is_service_up("sshd"), expected)
+
+    def test_fallback(self):
+        """Check the subprocess backend is used when the bus is unreachable."""
+        with mock.patch.object(device_info, "get_unit_active_state", side_effect=FileNotFoundError()):
+            with mock.patch.object(device_info, "_is_service_up_subprocess", return_value=True) as fallback:
+                self.assertTrue(device_info.is_service_up("sshd"))
+                fallback.assert_called_once_with("sshd")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""generate_request event coalescing test script."""
+
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from autopi import generate_request
+from autopi.util import trigger
+
+
+class TestSendCoalesced(unittest.TestCase):
+    """Tests for merging bursts of hook events into one request from a single sender."""
+
+    def setUp(self):
+        """Record sent requests instead of sending them, and keep triggers in a temporary directory."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.sent = []
+        patches = (
+            mock.patch.object(generate_request.Config, "RUN_DIR", tmp.name),
+            mock.patch.object(generate_request.Config, "TRIGGER_DEBOUNCE", 0.2),
+            mock.patch.object(generate_request, "generate_and_send_request", side_effect=self._record),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _record(self, event, force=False, verbose=False, reasons=None):
+        self.sent.append((event, reasons))
+
+    def test_single_event(self):
+        """Check a lone event is sent as itself, with itself as the reason."""
+        generate_request.send_coalesced("net_update")
+        self.assertEqual(self.sent, [("net_update", ["net_update"])])
+        self.assertFalse(trigger.pending())
+
+    def test_burst(self):
+        """Check events triggered during the debounce window are merged into the running sender's request."""
+        first = threading.Thread(target=generate_request.send_coalesced, args=("net_update",))
+        first.start()
+        time.sleep(0.05)
+        start = time.perf_counter()
+        generate_request.send_coalesced("ssh_change")
+        generate_request.send_coalesced("net_update")
+        self.assertLess(time.perf_counter() - start, 0.1)  # left to the running sender
+        first.join()
+        self.assertEqual(self.sent, [("general", ["net_update", "ssh_change"])])
+
+    def test_locked(self):
+        """Check a trigger left while another sender holds the lock is sent by the next sender."""
+        lock = trigger.SenderLock()
+        self.assertTrue(lock.acquire(blocking=False))
+        generate_request.send_coalesced("vnc_change")
+        generate_request.send_coalesced("keepalive")
+        self.assertEqual(self.sent, [])
+        lock.release()
+
+        generate_request.send_coalesced("start", force=True)
+        self.assertEqual(self.sent, [("start", None), ("vnc_change", ["vnc_change"])])
+
+    def test_settled(self):
+        """Check a settled event, as from the network monitor, is sent without the debounce window."""
+        start = time.perf_counter()
+        generate_request.send_coalesced("net_update", settled=True)
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(self.sent, [("net_update", ["net_update"])])
+
+    def test_general(self):
+        """Check a general request, as from a manual run, is sent without the debounce window and waits for the lock."""
+        start = time.perf_counter()
+        generate_request.send_coalesced("general")
+        self.assertLess(time.perf_counter() - start, 0.1)
+        self.assertEqual(self.sent, [("general", None)])
+        self.assertFalse(trigger.pending())
+
+        lock = trigger.SenderLock()
+        self.assertTrue(lock.acquire(blocking=False))
+        sender = threading.Thread(target=generate_request.send_coalesced, args=("general",))
+        sender.start()
+        time.sleep(0.1)
+        self.assertEqual(len(self.sent), 1)
+        lock.release()
+        sender.join()
+        self.assertEqual(self.sent, [("general", None), ("general", None)])
+
+    def test_trigger_during_keepalive_wait(self):
+        """Check a trigger dropped while a keepalive waits for its due time is sent without waiting for it."""
+        with mock.patch.object(generate_request.HeartbeatSchedule, "delay", return_value=1.0):
+            keepalive = threading.Thread(target=generate_request.send_coalesced, args=("keepalive",))
+            keepalive.start()
+            time.sleep(0.05)
+            start = time.perf_counter()
+            generate_request.send_coalesced("net_update")
+            self.assertLess(time.perf_counter() - start, 0.5)  # only the debounce window
+            self.assertEqual(self.sent, [("net_update", ["net_update"])])
+            keepalive.join()
+        self.assertEqual(self.sent, [("net_update", ["net_update"]), ("keepalive", None)])
+
+    def test_keepalive_not_due(self):
+        """Check a keepalive that is not due before the next tick is not sent."""
+        with mock.patch.object(generate_request.HeartbeatSchedule, "delay", return_value=None):
+            generate_request.send_coalesced("keepalive")
+        self.assertEqual(self.sent, [])
+
+
+class TestSenderLock(unittest.TestCase):
+    """Tests for the sender lock."""
+
+    def test_exclusive(self):
+        """Check the lock is held by one holder at a time."""
+        with tempfile.TemporaryDirectory() as tmp:
+            first = trigger.SenderLock(f"{tmp}/sender.lock")
+            second = trigger.SenderLock(f"{tmp}/sender.lock")
+            self.assertTrue(first.acquire())
+            self.assertFalse(second.acquire(blocking=False))
+            first.release()
+            self.assertTrue(second.acquire(blocking=False))
+            second.release()
+
+
+if __name__ == "__main__":
+    unittest.main()
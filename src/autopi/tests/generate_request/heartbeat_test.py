@@ -0,0 +1,73 @@
+"""generate_request heartbeat protocol test script."""
+
+import tempfile
+import unittest
+from unittest import mock
+
+from autopi import generate_request
+
+
+class TestHeartbeat(unittest.TestCase):
+    """Tests for full requests versus compact heartbeats."""
+
+    def setUp(self):
+        """Stub the device probes and keep request state in a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.network = {"ip": "10.0.0.5", "mac": "b8:27:eb:00:00:01", "ssid": "CSMwireless"}
+        self.services = {"ssh": "up", "vnc": "down"}
+        self.ids = {"hwid": "a" * 64, "devid": "0b3f1c2e-0000-4000-8000-000000000000"}
+        patches = (
+            mock.patch.object(generate_request.Config, "ROOT_DIR", self.tmp.name),
+            mock.patch.object(generate_request.network_info.NetworkSnapshot, "capture"),
+            mock.patch.object(generate_request, "_get_interface", return_value="wlan0"),
+            mock.patch.object(generate_request, "get_network_fields", side_effect=lambda *_: dict(self.network)),
+            mock.patch.object(generate_request, "_is_ssh_up", side_effect=lambda: self.services["ssh"] == "up"),
+            mock.patch.object(generate_request, "_is_vnc_up", side_effect=lambda: self.services["vnc"] == "up"),
+            mock.patch.object(generate_request.Config, "RUN_DIR", self.tmp.name),
+            mock.patch.object(generate_request, "get_id_fields", side_effect=lambda: dict(self.ids)),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.addCleanup(self.tmp.cleanup)
+
+    def test_unchanged_state(self):
+        """Check an unchanged state is sent as a compact heartbeat with the same digest."""
+        full = generate_request.generate_request("start", force=True)
+        heartbeat = generate_request.generate_request("keepalive", force=False)
+        self.assertEqual(full["hwid"], self.ids["hwid"])
+        self.assertEqual(full["ssh"], "up")
+        self.assertEqual(set(heartbeat), {"version", "devid", "event", "digest"})
+        self.assertEqual(heartbeat["digest"], full["digest"])
+
+    def test_changed_state(self):
+        """Check a changed state is sent in full with a new digest."""
+        first = generate_request.generate_request("start", force=True)
+        self.services["vnc"] = "up"
+        second = generate_request.generate_request("keepalive", force=False)
+        self.assertEqual(second["vnc"], "up")
+        self.assertNotEqual(first["digest"], second["digest"])
+
+    def test_shutdown(self):
+        """Check a shutdown always carries the hardware ID and no digest."""
+        request = generate_request.generate_request("shutdown", force=True)
+        self.assertEqual(request["hwid"], self.ids["hwid"])
+        self.assertNotIn("digest", request)
+
+    def test_build_request(self):
+        """Check requests built from given fields match generated ones."""
+        full = generate_request.generate_request("start", force=True)
+        info = {**self.network, **self.services}
+        self.assertEqual(generate_request.build_request("start", self.ids, info), full)
+        heartbeat = generate_request.build_request("keepalive", self.ids, info, unchanged=True)
+        self.assertEqual(heartbeat, generate_request.generate_request("keepalive", force=False))
+
+    def test_digest_order(self):
+        """Check the digest does not depend on field order."""
+        self.assertEqual(
+            generate_request.get_state_digest({"a": 1, "b": 2}), generate_request.get_state_digest({"b": 2, "a": 1})
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+"""generate_request encoding negotiation test script."""
+
+import json
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from autopi import generate_request
+from autopi.util.http_sender import Response
+
+HEARTBEAT = {"version": 2, "devid": "0b3f1c2e-0000-4000-8000-000000000001", "event": "keepalive", "digest": "0" * 16}
+
+
+class TestSendRequest(unittest.TestCase):
+    """Tests for choosing between the compact and JSON encodings."""
+
+    def setUp(self):
+        """Stub the HTTP sender."""
+        post = mock.patch.object(generate_request, "post", return_value=Response(200, b"{}"))
+        post_json = mock.patch.object(generate_request, "post_json", return_value=Response(200, b"{}"))
+        self.post = post.start()
+        self.post_json = post_json.start()
+        self.addCleanup(post.stop)
+        self.addCleanup(post_json.stop)
+
+    def test_compact(self):
+        """Check a single request is sent compact when the server accepts it."""
+        generate_request.send_request("http://api/status", HEARTBEAT, compact=True)
+        self.assertEqual(self.post.call_args[0][2], generate_request.compact_status.CONTENT_TYPE)
+        self.post_json.assert_not_called()
+
+    def test_fallback(self):
+        """Check the request is sent again as JSON when the server rejects the compact encoding."""
+        self.post.return_value = Response(415, b"")
+        generate_request.send_request("http://api/status", HEARTBEAT, compact=True)
+        self.post_json.assert_called_once()
+
+    def test_json_only(self):
+        """Check batches and unrepresentable requests are sent as JSON."""
+        generate_request.send_request("http://api/status/batch", [HEARTBEAT], compact=True)
+        generate_request.send_request("http://api/status", {**HEARTBEAT, "event": "reboot"}, compact=True)
+        self.post.assert_not_called()
+        self.assertEqual(self.post_json.call_count, 2)
+
+
+class TestReplay(unittest.TestCase):
+    """Tests for keeping the spool until the backlog is accepted."""
+
+    def setUp(self):
+        """Spool to a temporary directory, with one request already spooled, and stub the request and schedule."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.spool = generate_request.Spool(Path(tmp.name) / "spool.jsonl")
+        self.spool.append({**HEARTBEAT, "event": "net_update"})
+        patches = (
+            mock.patch.object(generate_request, "Spool", return_value=self.spool),
+            mock.patch.object(generate_request, "HeartbeatSchedule"),
+            mock.patch.object(generate_request, "generate_request", return_value=dict(HEARTBEAT)),
+            mock.patch.object(generate_request, "_sync_network_profile"),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def _send(self, *responses):
+        with mock.patch.object(generate_request, "send_request", side_effect=responses) as send:
+            generate_request.generate_and_send_request("keepalive")
+        return send
+
+    def test_accepted(self):
+        """Check the spool is cleared when the batch is accepted."""
+        send = self._send(Response(200, b'{"results": []}'))
+        self.assertEqual(send.call_args[0][0], generate_request.Config.API_BATCH_URL)
+        self.assertTrue(self.spool.is_empty())
+
+    def test_rejected(self):
+        """Check the backlog is kept when the server does not accept the batch, e.g. without the batch endpoint."""
+        for status_code in (404, 400):
+            self.spool.clear()
+            self.spool.append({**HEARTBEAT, "event": "net_update"})
+            self._send(Response(status_code, b"{}"))
+            self.assertEqual([r["event"] for r in self.spool.requests()], ["net_update", "keepalive"])
+
+    def test_full_state_failed(self):
+        """Check the full state requested after a replay is spooled if it cannot be sent."""
+        body = json.dumps({"results": [{"index": 1, "status": "ok", "action": "send_full_state"}]}).encode()
+        self._send(Response(200, body), OSError("unreachable"))
+        self.assertEqual([r["event"] for r in self.spool.requests()], ["keepalive"])
+
+
+if __name__ == "__main__":
+    unittest.main()
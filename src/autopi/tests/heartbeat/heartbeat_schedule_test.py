@@ -0,0 +1,68 @@
+"""heartbeat schedule test script."""
+
+import os
+import tempfile
+import unittest
+
+from autopi.util import heartbeat
+
+
+class TestNextDue(unittest.TestCase):
+    """Tests for aligning heartbeats to the device's phase."""
+
+    def test_phase(self):
+        """Check the due time is at the device's phase, close to the requested interval."""
+        due = heartbeat.next_due(sent_at=1000.0, interval=60, phase=17)
+        self.assertEqual(due % 60, 17)
+        self.assertLessEqual(abs(due - 1060), 30)
+
+    def test_bounds(self):
+        """Check hints outside the safe bounds are clamped."""
+        self.assertLessEqual(heartbeat.next_due(0.0, interval=3600, phase=0), 120)
+        self.assertGreaterEqual(heartbeat.next_due(0.0, interval=1, phase=0), 60)
+        self.assertEqual(heartbeat.next_due(0.0, interval=60, phase=-1) % 60, 59)
+
+
+class TestHeartbeatSchedule(unittest.TestCase):
+    """Tests for skipping and delaying timer ticks."""
+
+    def setUp(self):
+        """Keep the schedule in a temporary directory."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "run", "heartbeat.json")
+        self.schedule = heartbeat.HeartbeatSchedule(self.path)
+
+    def test_no_schedule(self):
+        """Check a heartbeat is sent immediately without a schedule."""
+        self.assertEqual(self.schedule.delay(now=1000.0), 0)
+
+    def test_skip_and_delay(self):
+        """Check ticks before the due time are skipped, and the tick before it waits for the due time."""
+        self.schedule.update({"next_interval": 90, "phase_offset": 20}, sent_at=1000.0)  # due at 1100
+        self.assertIsNone(self.schedule.delay(now=1000.0))
+        self.assertAlmostEqual(self.schedule.delay(now=1061.0), 39.0)
+        self.assertEqual(self.schedule.delay(now=1105.0), 0)
+
+    def test_until_due(self):
+        """Check the time until the heartbeat is due, and 0 once it is overdue or without a schedule."""
+        self.assertEqual(self.schedule.until_due(now=1000.0), 0)
+        self.schedule.update({"next_interval": 90, "phase_offset": 20}, sent_at=1000.0)  # due at 1100
+        self.assertAlmostEqual(self.schedule.until_due(now=1000.0), 100.0)
+        self.assertEqual(self.schedule.until_due(now=1105.0), 0)
+
+    def test_no_hints(self):
+        """Check a response without hints removes the schedule."""
+        self.schedule.update({"next_interval": 90, "phase_offset": 30}, sent_at=990.0)
+        self.schedule.update({}, sent_at=1000.0)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.schedule.delay(now=1000.0), 0)
+
+    def test_clock_set_back(self):
+        """Check an implausibly distant due time is ignored."""
+        self.schedule.update({"next_interval": 60, "phase_offset": 0}, sent_at=10000.0)
+        self.assertEqual(self.schedule.delay(now=100.0), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
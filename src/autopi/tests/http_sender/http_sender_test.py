@@ -0,0 +1,64 @@
+"""http_sender test script."""
+
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from autopi.util import http_sender
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.received.append((self.path, self.headers["Content-Type"], json.loads(body)))
+        reply = json.dumps({"status": "ok"}).encode()
+        self.send_response(self.server.status)
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestPostJson(unittest.TestCase):
+    """Tests for sending JSON to a local server."""
+
+    def setUp(self):
+        """Start a local HTTP server."""
+        self.server = HTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.received = []
+        self.server.status = 200
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/status"
+
+    def test_post(self):
+        """Check the body is sent as JSON and the response is decoded."""
+        request = {"devid": "abc", "event": "keepalive", "digest": "0123"}
+        resp = http_sender.post_json(self.url, request, timeout=5)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.ok)
+        self.assertEqual(resp.json(), {"status": "ok"})
+        self.assertEqual(self.server.received, [("/api/status", "application/json", request)])
+
+    def test_error_status(self):
+        """Check error responses are returned rather than raised."""
+        self.server.status = 503
+        resp = http_sender.post_json(self.url, [], timeout=5)
+        self.assertEqual(resp.status_code, 503)
+        self.assertFalse(resp.ok)
+
+    def test_connection_refused(self):
+        """Check a connection failure raises OSError."""
+        url = self.url
+        self.server.server_close()
+        with self.assertRaises(OSError):
+            http_sender.post_json(url, {}, timeout=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""http_sender TLS session resumption test script."""
+
+import os
+import shutil
+import ssl
+import subprocess
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from autopi.util import http_sender
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        reply = b'{"status": "ok"}'
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(reply)))
+        self.end_headers()
+        self.wfile.write(reply)
+
+    def log_message(self, *args):
+        pass
+
+
+@unittest.skipUnless(shutil.which("openssl"), "needs openssl to create a test certificate")
+class TestTlsResumption(unittest.TestCase):
+    """Tests for resuming TLS sessions against a local HTTPS server."""
+
+    @classmethod
+    def setUpClass(cls):
+        """Create a self-signed certificate for localhost."""
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.cert = os.path.join(cls.tmp.name, "cert.pem")
+        key = os.path.join(cls.tmp.name, "key.pem")
+        command = ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost"]
+        command += ["-addext", "subjectAltName=DNS:localhost", "-keyout", key, "-out", cls.cert]
+        subprocess.run(
+            command,
+            check=True,
+            capture_output=True,
+        )
+        cls.server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        cls.server_context.load_cert_chain(cls.cert, key)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Remove the certificate."""
+        cls.tmp.cleanup()
+
+    def setUp(self):
+        """Start a local HTTPS server."""
+        self.server = HTTPServer(("localhost", 0), _Handler)
+        self.server.socket = self.server_context.wrap_socket(self.server.socket, server_side=True)
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"https://localhost:{self.server.server_port}/api/status"
+        self.context = ssl.create_default_context(cafile=self.cert)
+
+    def test_resumed(self):
+        """Check the first connection does a full handshake and the next ones resume its session."""
+        first = http_sender.post_json(self.url, {}, timeout=5, context=self.context)
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(first.resumed)
+        for _ in range(2):
+            resp = http_sender.post_json(self.url, {}, timeout=5, context=self.context)
+            self.assertEqual(resp.json(), {"status": "ok"})
+            self.assertTrue(resp.resumed)
+
+    def test_other_context(self):
+        """Check a session is not offered on a connection with a different context."""
+        http_sender.post_json(self.url, {}, timeout=5, context=self.context)
+        other = ssl.create_default_context(cafile=self.cert)
+        self.assertFalse(http_sender.post_json(self.url, {}, timeout=5, context=other).resumed)
+        self.assertTrue(http_sender.post_json(self.url, {}, timeout=5, context=other).resumed)
+
+    def test_plain_http(self):
+        """Check resumption is not reported for plain HTTP."""
+        server = HTTPServer(("127.0.0.1", 0), _Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        resp = http_sender.post_json(f"http://127.0.0.1:{server.server_port}/", {}, timeout=5)
+        self.assertIsNone(resp.resumed)
+
+
+if __name__ == "__main__":
+    unittest.main()
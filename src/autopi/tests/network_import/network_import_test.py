@@ -0,0 +1,165 @@
+"""network_import test script."""
+
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from autopi.util import network_import
+
+wpa_interface = network_import.wpa  # the module used by network_import, imported as util.wpa_interface
+
+CONFIG = """ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev
+update_config=1
+
+network={
+\tssid="CSMwireless"
+\tkey_mgmt=NONE
+\tpriority=2
+}
+
+network={
+\tssid="lab-1"
+\tkey_mgmt=NONE
+}
+"""
+
+BLOCKS = """# No space after (=).
+ssid=CSMwireless
+priority=2
+
+ssid=lab-1
+password=labpassword1
+ssid=lab-2
+password=short
+
+ssid=lab-3
+priority=
+password=labpassword3
+ssid=lab-3
+priority=high
+"""
+
+CSV = """# campus networks
+ssid,password,priority
+CSMwireless,,2
+lab-1,labpassword1,
+,,
+lab-3,labpassword3,1
+lab-4,,
+"""
+
+
+class TestParseEntries(unittest.TestCase):
+    """Tests for reading network lists."""
+
+    def test_blocks(self):
+        """Check key=value blocks split at blank lines and repeated ssid lines, with empty values left out."""
+        entries = list(network_import.parse_entries(io.StringIO(BLOCKS)))
+        self.assertEqual(
+            [(e.line, e.ssid, e.password, e.priority) for e in entries],
+            [
+                (2, "CSMwireless", None, "2"),
+                (5, "lab-1", "labpassword1", None),
+                (7, "lab-2", "short", None),
+                (10, "lab-3", "labpassword3", None),
+                (13, "lab-3", None, "high"),
+            ],
+        )
+
+    def test_csv(self):
+        """Check CSV rows become entries, skipping empty rows."""
+        entries = list(network_import.parse_entries(io.StringIO(CSV)))
+        self.assertEqual(
+            [(e.line, e.ssid, e.password, e.priority) for e in entries],
+            [
+                (3, "CSMwireless", None, "2"),
+                (4, "lab-1", "labpassword1", None),
+                (6, "lab-3", "labpassword3", "1"),
+                (7, "lab-4", None, None),
+            ],
+        )
+
+    def test_single_network_file(self):
+        """Check the reset CSM_new_network.txt template has no entries."""
+        template = (
+            "# No space after (=).\n# This file will be reset after network is added.\nssid=\npassword=\npriority=\n"
+        )
+        self.assertEqual(list(network_import.parse_entries(io.StringIO(template))), [])
+
+
+class TestImportNetworks(unittest.TestCase):
+    """Tests for applying a network list to the wpa config."""
+
+    def setUp(self):
+        """Write a sample config and stub wpa_supplicant and the PSK cache."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "wpa_supplicant.conf")
+        self.psk_path = os.path.join(tmp.name, "psk")
+        with open(self.path, "w") as fout:
+            fout.write(CONFIG)
+        patches = (
+            mock.patch.object(wpa_interface, "run_reconfigure", return_value=True),
+            mock.patch.object(wpa_interface, "add_running_networks"),
+            mock.patch.object(wpa_interface.wpa_psk, "_cache", wpa_interface.wpa_psk.PskCache(self.psk_path)),
+            mock.patch.object(wpa_interface.WpaConfig, "save", autospec=True, side_effect=wpa_interface.WpaConfig.save),
+        )
+        self.reconfigure, self.add_running, _, self.save = (patch.start() for patch in patches)
+        for patch in patches:
+            self.addCleanup(patch.stop)
+
+    def _import(self, text: str, dry_run: bool = False) -> list:
+        entries = network_import.parse_entries(io.StringIO(text))
+        results = network_import.import_networks(entries, self.path, "wlan0", dry_run)
+        return [(r.entry.ssid, r.status) for r in results]
+
+    def test_blocks(self):
+        """Check new, changed, unchanged, duplicate and invalid entries, applied in one write and one reconfigure."""
+        results = self._import(BLOCKS)
+        self.assertEqual(
+            results,
+            [
+                ("CSMwireless", network_import.UNCHANGED),
+                ("lab-1", network_import.UPDATED),
+                ("lab-2", network_import.INVALID),
+                ("lab-3", network_import.ADDED),
+                ("lab-3", network_import.INVALID),
+            ],
+        )
+        self.save.assert_called_once()
+        self.reconfigure.assert_called_once_with("wlan0")
+        config = wpa_interface.WpaConfig.load(self.path)
+        self.assertEqual([n.ssid for n in config.networks], ["CSMwireless", "lab-1", "lab-3"])
+        self.assertIsNotNone(config.find("lab-1")[0].get("psk"))
+
+    def test_add_only(self):
+        """Check a list that only adds networks adds them to the running wpa_supplicant, not reconfiguring."""
+        results = self._import("ssid,password,priority\nlab-4,,\nlab-5,labpassword5,\nlab-4,,3\n")
+        self.assertEqual(
+            results,
+            [("lab-4", network_import.SUPERSEDED), ("lab-5", network_import.ADDED), ("lab-4", network_import.ADDED)],
+        )
+        self.add_running.assert_called_once()
+        self.reconfigure.assert_not_called()
+        self.assertEqual(wpa_interface.WpaConfig.load(self.path).find("lab-4")[0].get("priority"), "3")
+
+    def test_dry_run(self):
+        """Check a dry run reports the changes without writing the config or the PSK cache."""
+        text = "ssid=lab-6\n\nssid=lab-7\npassword=labpassword7\n"
+        self.assertEqual(
+            self._import(text, dry_run=True), [("lab-6", network_import.ADDED), ("lab-7", network_import.ADDED)]
+        )
+        self.save.assert_not_called()
+        self.reconfigure.assert_not_called()
+        with open(self.path) as fin:
+            self.assertEqual(fin.read(), CONFIG)
+        self.assertFalse(os.path.exists(self.psk_path))
+
+        self._import(text)
+        self.assertTrue(os.path.exists(self.psk_path))
+
+
+if __name__ == "__main__":
+    unittest.main()
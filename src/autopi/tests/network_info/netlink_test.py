@@ -0,0 +1,159 @@
+"""network_info rtnetlink monitor test script."""
+
+import errno
+import socket
+import struct
+import unittest
+from unittest import mock
+
+from autopi.util import network_info
+
+
+def _attr(kind: int, payload: bytes) -> bytes:
+    length = 4 + len(payload)
+    return struct.pack("=HH", length, kind) + payload + b"\0" * ((4 - length % 4) % 4)
+
+
+def _message(kind: int, payload: bytes, seq: int = 0) -> bytes:
+    return struct.pack("=LHHLL", 16 + len(payload), kind, 0, seq, 0) + payload
+
+
+class _StubMonitor(network_info.NetlinkMonitor):
+    """NetlinkMonitor without a socket, for feeding messages by hand."""
+
+    def __init__(self):
+        """Initialize the tracked state only."""
+        self._links = {}
+        self._addresses = {}
+        self._routes = {}
+        self._reported = self.snapshot()
+
+
+def _link(index: int, name: str, up: bool = True) -> bytes:
+    payload = struct.pack("=BxHiII", socket.AF_UNSPEC, 1, index, 1 if up else 0, 0)
+    payload += _attr(3, name.encode() + b"\0") + _attr(1, bytes([0xB8, 0x27, 0xEB, 0, 0, index]))
+    return payload
+
+
+def _addr(index: int, ip: str) -> bytes:
+    return struct.pack("=BBBBI", socket.AF_INET, 24, 0, 0, index) + _attr(2, socket.inet_aton(ip))
+
+
+def _route(index: int, gateway: str, metric: int) -> bytes:
+    payload = struct.pack("=BBBBBBBBI", socket.AF_INET, 0, 0, 0, 254, 3, 0, 1, 0)
+    payload += _attr(5, socket.inet_aton(gateway)) + _attr(4, struct.pack("=i", index))
+    return payload + _attr(6, struct.pack("=I", metric))
+
+
+class TestParsing(unittest.TestCase):
+    """Tests for splitting netlink datagrams."""
+
+    def test_messages(self):
+        """Check several messages in one datagram are split with padding."""
+        data = _message(16, _link(2, "eth0"), seq=7) + _message(3, b"\0" * 4, seq=7)
+        messages = list(network_info._parse_messages(data))
+        self.assertEqual([(kind, seq) for kind, seq, _ in messages], [(16, 7), (3, 7)])
+
+    def test_attributes(self):
+        """Check attributes are keyed by type with padding removed."""
+        attrs = network_info._parse_attributes(_attr(3, b"wlan0\0") + _attr(1, b"\1\2\3\4\5\6"), 0)
+        self.assertEqual(attrs, {3: b"wlan0\0", 1: b"\1\2\3\4\5\6"})
+
+
+class TestMonitorState(unittest.TestCase):
+    """Tests for applying rtnetlink notifications to the snapshot."""
+
+    def setUp(self):
+        """Feed a wired and a wireless interface with addresses and default routes."""
+        self.monitor = _StubMonitor()
+        for kind, payload in (
+            (16, _link(2, "eth0")),
+            (16, _link(3, "wlan0")),
+            (20, _addr(2, "10.0.0.5")),
+            (20, _addr(3, "192.168.1.20")),
+            (24, _route(2, "10.0.0.1", 202)),
+            (24, _route(3, "192.168.1.1", 303)),
+        ):
+            self.monitor._apply(kind, payload)
+
+    def test_snapshot(self):
+        """Check interfaces, addresses and the lowest-metric default route are tracked."""
+        snapshot = self.monitor.snapshot()
+        self.assertEqual([iface.name for iface in snapshot.interfaces], ["eth0", "wlan0"])
+        self.assertEqual(snapshot.interfaces[0].mac, "b8:27:eb:00:00:02")
+        self.assertEqual(snapshot.interfaces[1].addresses, ("192.168.1.20",))
+        self.assertEqual(snapshot.default_gateway, ("10.0.0.1", "eth0"))
+        self.assertTrue(snapshot.is_connected)
+
+    def test_address_removed(self):
+        """Check deleting an address changes the snapshot."""
+        before = self.monitor.snapshot()
+        self.monitor._apply(21, _addr(3, "192.168.1.20"))
+        after = self.monitor.snapshot()
+        self.assertNotEqual(before, after)
+        self.assertEqual(after.interfaces[1].addresses, ())
+
+    def test_link_removed(self):
+        """Check deleting a link drops its addresses and default route."""
+        self.monitor._apply(17, _link(2, "eth0"))
+        snapshot = self.monitor.snapshot()
+        self.assertEqual([iface.name for iface in snapshot.interfaces], ["wlan0"])
+        self.assertEqual(snapshot.default_gateway, ("192.168.1.1", "wlan0"))
+
+    def test_repeated_notification(self):
+        """Check a notification that changes nothing leaves the snapshot equal."""
+        before = self.monitor.snapshot()
+        self.monitor._apply(20, _addr(2, "10.0.0.5"))
+        self.assertEqual(before, self.monitor.snapshot())
+
+    def test_next_change(self):
+        """Check a change is returned once, and a notification that changes nothing is not reported."""
+        self.monitor._reported = self.monitor.snapshot()
+        notifications = [(21, _addr(3, "192.168.1.20")), (20, _addr(2, "10.0.0.5"))]
+
+        def poll(timeout=None):
+            if timeout is None or not notifications:
+                return False
+            self.monitor._apply(*notifications.pop(0))
+            return True
+
+        with mock.patch.object(self.monitor, "poll", side_effect=poll):
+            change = self.monitor.next_change(timeout=1, settle=0)
+            self.assertEqual(change.interfaces[1].addresses, ())
+            self.assertIsNone(self.monitor.next_change(timeout=0, settle=0))  # only the repeated address
+
+    def test_overflow(self):
+        """Check an overflowed socket buffer reloads the state instead of ending the monitor."""
+        before = self.monitor.snapshot()
+        self.monitor._socket = mock.Mock()
+        self.monitor._socket.recv.side_effect = OSError(errno.ENOBUFS, "No buffer space available")
+
+        def refresh():
+            # a change made while the notifications were dropped
+            self.monitor._apply(21, _addr(3, "192.168.1.20"))
+
+        with mock.patch.object(network_info.select, "select", return_value=([self.monitor._socket], [], [])):
+            with mock.patch.object(self.monitor, "refresh", side_effect=refresh) as reload:
+                self.assertTrue(self.monitor.poll(0))
+        reload.assert_called_once_with()
+        self.assertNotEqual(before, self.monitor.snapshot())
+
+    def test_refresh_overflow(self):
+        """Check the dumps are started again if notifications overflow the buffer while they are read."""
+        dumps = []
+
+        def dump(kind):
+            dumps.append(kind)
+            if len(dumps) == 2:
+                raise OSError(errno.ENOBUFS, "No buffer space available")
+            if kind == 18:
+                self.monitor._apply(16, _link(4, "usb0"))
+
+        with mock.patch.object(self.monitor, "_dump", side_effect=dump):
+            self.monitor.refresh()
+        self.assertEqual(dumps, [18, 22, 18, 22, 26])
+        self.assertEqual([iface.name for iface in self.monitor.snapshot().interfaces], ["usb0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
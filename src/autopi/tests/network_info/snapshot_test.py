@@ -0,0 +1,91 @@
+"""network_info snapshot test script."""
+
+import unittest
+from unittest import mock
+
+from autopi.util import network_info
+
+AF_LINK = network_info.netifaces.AF_LINK
+AF_INET = network_info.netifaces.AF_INET
+ADDRESSES = {
+    "lo": {AF_LINK: [{"addr": "00:00:00:00:00:00"}], AF_INET: [{"addr": "127.0.0.1"}]},
+    "eth0": {AF_LINK: [{"addr": "b8:27:eb:00:00:01"}]},
+    "wlan0": {AF_LINK: [{"addr": "b8:27:eb:00:00:02"}], AF_INET: [{"addr": "10.0.0.5"}, {"addr": "10.0.0.6"}]},
+}
+
+
+class TestNetworkSnapshot(unittest.TestCase):
+    """Tests for capturing the network state in one pass."""
+
+    def setUp(self):
+        """Stub netifaces and the wireless probe."""
+        netifaces = mock.patch.multiple(
+            network_info.netifaces,
+            interfaces=mock.DEFAULT,
+            ifaddresses=mock.DEFAULT,
+            gateways=mock.DEFAULT,
+        )
+        self.netifaces = netifaces.start()
+        self.addCleanup(netifaces.stop)
+        self.netifaces["interfaces"].return_value = list(ADDRESSES)
+        self.netifaces["ifaddresses"].side_effect = ADDRESSES.__getitem__
+        self.netifaces["gateways"].return_value = {"default": {AF_INET: ("10.0.0.1", "wlan0")}}
+
+        def probe(name, proc_stats):
+            if name != "wlan0":
+                return network_info.WirelessInfo(name, is_wireless=False)
+            return network_info.WirelessInfo(name, True, True, "CSMwireless")
+
+        patch = mock.patch.object(network_info, "probe_wireless", side_effect=probe)
+        self.probe = patch.start()
+        self.addCleanup(patch.stop)
+        read = mock.patch.object(network_info, "_read_proc_net_wireless", return_value={})
+        self.read = read.start()
+        self.addCleanup(read.stop)
+
+    def test_single_pass(self):
+        """Check each source is queried once per capture."""
+        snapshot = network_info.NetworkSnapshot.capture()
+        for interface in ADDRESSES:
+            snapshot.get_interface_ip(interface)
+            snapshot.get_ssid(interface)
+        self.netifaces["interfaces"].assert_called_once()
+        self.netifaces["gateways"].assert_called_once()
+        self.assertEqual(self.netifaces["ifaddresses"].call_count, len(ADDRESSES))
+        self.read.assert_called_once()
+        self.assertEqual(self.probe.call_count, len(ADDRESSES))
+
+    def test_fields(self):
+        """Check the accessors match the per-field functions."""
+        snapshot = network_info.NetworkSnapshot.capture()
+        self.assertEqual(snapshot.get_interfaces(), ["wlan0"])
+        self.assertEqual(snapshot.get_interfaces(exclude_loopback=False), ["lo", "wlan0"])
+        self.assertEqual(snapshot.get_interface_ip("wlan0"), "10.0.0.5")
+        self.assertIsNone(snapshot.get_interface_ip("eth0"))
+        self.assertIsNone(snapshot.get_interface_ip("missing"))
+        self.assertEqual(snapshot.get_mac("eth0"), "b8:27:eb:00:00:01")
+        self.assertEqual(snapshot.default_interface, "wlan0")
+        self.assertEqual(snapshot.get_ssid("wlan0"), "CSMwireless")
+        self.assertIsNone(snapshot.get_ssid("eth0"))
+        with self.assertRaises(RuntimeError):
+            snapshot.get_mac("missing")
+
+    def test_wrappers(self):
+        """Check the per-field functions read from a snapshot, without probing wireless state."""
+        self.assertEqual(network_info.get_default_gateway(), ("10.0.0.1", "wlan0"))
+        self.assertEqual(network_info.get_default_interface(), "wlan0")
+        self.assertEqual(network_info.get_interfaces(), ["wlan0"])
+        self.assertTrue(network_info.is_interface_connected("wlan0"))
+        self.assertFalse(network_info.is_interface_connected("eth0"))
+        self.probe.assert_not_called()
+
+    def test_no_default_gateway(self):
+        """Check a missing default route is reported as None, and as KeyError by the wrapper."""
+        self.netifaces["gateways"].return_value = {"default": {}}
+        self.assertIsNone(network_info.NetworkSnapshot.capture(wireless=False).default_interface)
+        with self.assertRaises(KeyError):
+            network_info.get_default_gateway()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+"""network_info wireless probe test script."""
+
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from autopi.util import network_info
+
+INPUT_DIR = Path(__file__).absolute().parent / "input"
+
+
+def _fixture(name: str) -> str:
+    with open(INPUT_DIR / name) as f:
+        return f.read()
+
+
+class TestProcNetWireless(unittest.TestCase):
+    """Tests for parsing captured /proc/net/wireless contents."""
+
+    def test_associated(self):
+        """Check link quality and signal level are read."""
+        stats = network_info.parse_proc_net_wireless(_fixture("proc_net_wireless_associated.txt"))
+        self.assertEqual(stats, {"wlan0": (0, 58.0, -52.0)})
+
+    def test_disconnected(self):
+        """Check a disconnected interface is still listed."""
+        stats = network_info.parse_proc_net_wireless(_fixture("proc_net_wireless_disconnected.txt"))
+        self.assertEqual(stats, {"wlan0": (0, 0.0, -256.0)})
+
+    def test_no_interfaces(self):
+        """Check a header-only file yields no interfaces."""
+        self.assertEqual(network_info.parse_proc_net_wireless(_fixture("proc_net_wireless_empty.txt")), {})
+
+
+class TestProbe(unittest.TestCase):
+    """Tests for combining the ioctl and /proc/net/wireless sources."""
+
+    def _probe(self, fixture: str, ioctl_result=None, ioctl_error=None) -> network_info.WirelessInfo:
+        stats = network_info.parse_proc_net_wireless(_fixture(fixture))
+        with mock.patch.object(network_info, "_read_proc_net_wireless", return_value=stats):
+            with mock.patch.object(network_info, "_ioctl_wireless", return_value=ioctl_result, side_effect=ioctl_error):
+                return network_info.probe_wireless("wlan0")
+
+    def test_ioctl(self):
+        """Check the ioctl result is combined with link statistics."""
+        info = self._probe("proc_net_wireless_associated.txt", ioctl_result=("CSMwireless", True))
+        self.assertEqual(info, network_info.WirelessInfo("wlan0", True, True, "CSMwireless", 58.0, -52.0))
+
+    def test_fallback_associated(self):
+        """Check /proc/net/wireless is used when ioctls fail."""
+        info = self._probe("proc_net_wireless_associated.txt", ioctl_error=OSError())
+        self.assertTrue(info.is_wireless)
+        self.assertTrue(info.is_associated)
+        self.assertIsNone(info.ssid)
+
+    def test_fallback_disconnected(self):
+        """Check zero link quality is reported as not associated."""
+        info = self._probe("proc_net_wireless_disconnected.txt", ioctl_error=OSError())
+        self.assertTrue(info.is_wireless)
+        self.assertFalse(info.is_associated)
+
+    def test_not_wireless(self):
+        """Check an interface missing from both sources is not wireless."""
+        info = self._probe("proc_net_wireless_empty.txt", ioctl_error=OSError())
+        self.assertEqual(info, network_info.WirelessInfo("wlan0", is_wireless=False))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+"""network_monitor test script."""
+
+import io
+import unittest
+from contextlib import redirect_stderr
+from unittest import mock
+
+from autopi import network_monitor
+
+
+class _Stop(Exception):
+    pass
+
+
+class _FakeMonitor:
+    """A NetlinkMonitor that returns the given changes, None for a timeout, then stops the loop."""
+
+    def __init__(self, changes):
+        """Keep the changes to return."""
+        self.changes = list(changes)
+        self.timeouts = []
+
+    def next_change(self, timeout=None):
+        """Record the timeout and return the next change."""
+        self.timeouts.append(timeout)
+        if not self.changes:
+            raise _Stop
+        return self.changes.pop(0)
+
+
+class TestRun(unittest.TestCase):
+    """Tests for sending net_update requests on changes and keepalives when they are due."""
+
+    def setUp(self):
+        """Record sent events instead of sending them."""
+        self.schedule = mock.Mock()
+        patch = mock.patch.object(network_monitor, "send_coalesced")
+        self.send = patch.start()
+        self.addCleanup(patch.stop)
+
+    def _run(self, changes) -> _FakeMonitor:
+        monitor = _FakeMonitor(changes)
+        with self.assertRaises(_Stop):
+            network_monitor.run(monitor, self.schedule)
+        return monitor
+
+    def test_keepalive_due(self):
+        """Check the monitor waits for a change until the keepalive is due, then sends it."""
+        self.schedule.until_due.return_value = 30.0
+        monitor = self._run([None])
+        self.assertEqual(monitor.timeouts[0], 30.0)
+        self.send.assert_called_once_with("keepalive", settled=False)
+
+    def test_change(self):
+        """Check a change is sent as a settled net_update, unless the device is not connected."""
+        self.schedule.until_due.return_value = 30.0
+        self._run([mock.Mock(is_connected=True), mock.Mock(is_connected=False)])
+        self.send.assert_called_once_with("net_update", settled=True)
+
+    def test_retry(self):
+        """Check a keepalive that did not reschedule the next one is retried a tick later, not right away."""
+        self.schedule.until_due.return_value = 0.0
+        with mock.patch.object(network_monitor.Config, "HEARTBEAT_TICK", 60.0):
+            monitor = self._run([None, None])
+        self.assertEqual(monitor.timeouts[0], 0.0)
+        self.assertAlmostEqual(monitor.timeouts[1], 60.0, delta=1.0)
+        self.assertEqual(self.send.call_count, 2)
+
+    def test_send_failure(self):
+        """Check a failed request does not end the monitor."""
+        self.schedule.until_due.return_value = 30.0
+        self.send.side_effect = RuntimeError("No connected network interface")
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            self._run([None, mock.Mock(is_connected=True)])
+        self.assertEqual(self.send.call_count, 2)
+        self.assertIn("No connected network interface", stderr.getvalue())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,122 @@
+"""network_profile test script."""
+
+import hashlib
+import os
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from unittest import mock
+
+from autopi import add_network_from_txt
+from autopi.util import network_profile
+
+# the modules network_profile imports on use, as util.network_import and util.wpa_interface
+network_import = add_network_from_txt.network_import
+wpa_interface = network_import.wpa
+
+DEVID = "0b3f1c2e-0000-4000-8000-000000000001"
+PROFILE = b"ssid,password,priority\nCSMwireless,,2\nCSM-staff,staffpassword,3\n"
+PROFILE_HASH = hashlib.sha256(PROFILE).hexdigest()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.server.requests.append(dict(self.headers))
+        if self.headers.get("devid") != DEVID:
+            self.send_response(403)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        tag = f'"{self.server.etag}"'
+        if self.headers.get("If-None-Match") == tag:
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", tag)
+        self.send_header("Content-Length", str(len(self.server.profile)))
+        self.end_headers()
+        self.wfile.write(self.server.profile)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestNetworkProfile(unittest.TestCase):
+    """Tests for fetching and applying the network profile."""
+
+    def setUp(self):
+        """Start a local profile server and write a sample wpa config."""
+        self.server = HTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.requests = []
+        self.server.profile = PROFILE
+        self.server.etag = PROFILE_HASH
+        thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/network_profile"
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.config_file = os.path.join(tmp.name, "wpa_supplicant.conf")
+        with open(self.config_file, "w") as fout:
+            fout.write('network={\n\tssid="CSMwireless"\n\tkey_mgmt=NONE\n\tpriority=2\n}\n')
+        patches = (
+            mock.patch.object(wpa_interface, "run_reconfigure", return_value=True),
+            mock.patch.object(wpa_interface, "add_running_networks"),
+            mock.patch.object(wpa_interface.wpa_psk, "_cache", wpa_interface.wpa_psk.PskCache(tmp.name + "/psk")),
+            # import_networks took its default config file when it was defined
+            mock.patch.object(
+                network_import,
+                "import_networks",
+                side_effect=lambda entries, import_networks=network_import.import_networks: (
+                    import_networks(entries, self.config_file)
+                ),
+            ),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.profile = network_profile.NetworkProfile(os.path.join(tmp.name, "network_profile.etag"))
+
+    def test_apply(self):
+        """Check a new profile is fetched, applied and recorded, and not fetched again."""
+        results = self.profile.sync(PROFILE_HASH, DEVID, self.url)
+        self.assertEqual(
+            [(r.entry.ssid, r.status) for r in results], [("CSMwireless", "unchanged"), ("CSM-staff", "added")]
+        )
+        self.assertEqual(self.profile.applied_hash(), PROFILE_HASH)
+        with open(self.config_file) as fin:
+            self.assertIn('ssid="CSM-staff"', fin.read())
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+
+        self.assertIsNone(self.profile.sync(PROFILE_HASH, DEVID, self.url))
+        self.assertIsNone(self.profile.sync(None, DEVID, self.url))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_not_modified(self):
+        """Check a stale hash sends the applied hash as If-None-Match and applies nothing on 304."""
+        self.profile.sync(PROFILE_HASH, DEVID, self.url)
+        self.assertIsNone(self.profile.sync("0" * 64, DEVID, self.url))
+        self.assertEqual(self.server.requests[-1]["If-None-Match"], f'"{PROFILE_HASH}"')
+        self.assertEqual(self.profile.applied_hash(), PROFILE_HASH)
+
+    def test_hash_mismatch(self):
+        """Check a profile that does not match its ETag is not applied."""
+        self.server.etag = "0" * 64
+        with self.assertRaises(ValueError):
+            self.profile.sync("0" * 64, DEVID, self.url)
+        self.assertIsNone(self.profile.applied_hash())
+
+    def test_forbidden(self):
+        """Check a refused request raises ValueError."""
+        with self.assertRaises(ValueError):
+            self.profile.sync(PROFILE_HASH, "unknown", self.url)
+        self.assertIsNone(self.profile.applied_hash())
+
+
+if __name__ == "__main__":
+    unittest.main()
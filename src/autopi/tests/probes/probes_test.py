@@ -0,0 +1,83 @@
+"""probes test script."""
+
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from autopi.util.probes import ProbeRegistry
+
+
+class TestProbeRegistry(unittest.TestCase):
+    """Tests for running probes concurrently with timeouts."""
+
+    def setUp(self):
+        """Keep the probe cache in a temporary directory."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.registry = ProbeRegistry(os.path.join(tmp.name, "run", "probes.json"))
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def _register_sleeper(self, name: str, delay: float, value, timeout: float = 5.0):
+        @self.registry.register(name, timeout=timeout)
+        def probe():
+            time.sleep(delay)
+            return value
+
+    def test_concurrent(self):
+        """Check probes run concurrently, so the run takes as long as the slowest one."""
+        for name in ("a", "b", "c", "d"):
+            self._register_sleeper(name, 0.2, name)
+        start = time.perf_counter()
+        results = self.registry.run()
+        self.assertLess(time.perf_counter() - start, 0.6)
+        self.assertEqual({name: r.value for name, r in results.items()}, {"a": "a", "b": "b", "c": "c", "d": "d"})
+        self.assertTrue(all(r.latency >= 0.2 for r in results.values()))
+
+    def test_timeout(self):
+        """Check a hung probe times out with its last-known value while the others complete."""
+        state = {"hung": False}
+
+        @self.registry.register("ssh", timeout=0.2)
+        def ssh():
+            if state["hung"]:
+                self.release.wait()
+            return "up"
+
+        self._register_sleeper("ip", 0, "10.0.0.5")
+        self.assertEqual(self.registry.run()["ssh"].value, "up")
+
+        state["hung"] = True
+        start = time.perf_counter()
+        results = self.registry.run()
+        self.assertLess(time.perf_counter() - start, 1.0)
+        self.assertTrue(results["ssh"].timed_out)
+        self.assertTrue(results["ssh"].stale)
+        self.assertEqual(results["ssh"].value, "up")
+        self.assertEqual(results["ip"].value, "10.0.0.5")
+
+    def test_timeout_without_cache(self):
+        """Check a probe that times out before ever succeeding has no value."""
+
+        @self.registry.register("vnc", timeout=0.1)
+        def vnc():
+            self.release.wait()
+
+        self.assertIsNone(self.registry.run()["vnc"].value)
+
+    def test_error(self):
+        """Check an exception is reported in the result, not raised."""
+
+        @self.registry.register("ip")
+        def ip():
+            raise RuntimeError("No connected network interfaces")
+
+        result = self.registry.run()["ip"]
+        self.assertIsInstance(result.error, RuntimeError)
+        self.assertFalse(result.timed_out)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+"""spool test script."""
+
+import tempfile
+import unittest
+from pathlib import Path
+
+from autopi.util.spool import Spool
+
+
+class TestSpool(unittest.TestCase):
+    """Tests for spooling, collapsing and backoff."""
+
+    def setUp(self):
+        """Create a spool in a temporary directory."""
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.spool = Spool(Path(self.tmp.name) / "spool.jsonl")
+
+    def test_order(self):
+        """Check requests are replayed in the order they were spooled, with timestamps."""
+        self.assertTrue(self.spool.is_empty())
+        for event in ("shutdown", "start", "net_update"):
+            self.spool.append({"event": event})
+        requests = self.spool.requests()
+        self.assertEqual([r["event"] for r in requests], ["shutdown", "start", "net_update"])
+        self.assertTrue(all("timestamp" in r for r in requests))
+        self.assertFalse(self.spool.is_empty())
+
+    def test_keepalives_collapsed(self):
+        """Check only the latest keepalive is kept."""
+        self.spool.append({"event": "keepalive", "digest": "1"})
+        self.spool.append({"event": "ssh_change"})
+        self.spool.append({"event": "keepalive", "digest": "2"})
+        events = [(r["event"], r.get("digest")) for r in self.spool.requests()]
+        self.assertEqual(events, [("ssh_change", None), ("keepalive", "2")])
+
+    def test_size_cap(self):
+        """Check the oldest requests are dropped when the spool is full."""
+        spool = Spool(Path(self.tmp.name) / "small.jsonl", max_bytes=300)
+        for i in range(20):
+            spool.append({"event": "net_update", "ip": f"10.0.0.{i}"})
+        requests = spool.requests()
+        self.assertLess(len(requests), 20)
+        self.assertEqual(requests[-1]["ip"], "10.0.0.19")
+        self.assertLessEqual((Path(self.tmp.name) / "small.jsonl").stat().st_size, 300)
+
+    def test_backoff(self):
+        """Check failures postpone the next attempt and clearing resets it."""
+        self.assertTrue(self.spool.is_ready(now=0))
+        self.spool.append({"event": "start"})
+        self.spool.record_failure(now=1000)
+        self.assertTrue(self.spool.is_ready(now=1000 + 10**6))
+        self.spool.clear()
+        self.assertTrue(self.spool.is_empty())
+        self.assertTrue(self.spool.is_ready(now=0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+"""state_store test script."""
+
+import json
+import os
+import tempfile
+import unittest
+
+from autopi.util.state_store import StateStore, state_digest
+
+STATE = {"ip": "138.67.186.24", "mac": "b8:27:eb:12:34:56", "ssh": "up", "vnc": "down"}
+
+
+class TestStateStore(unittest.TestCase):
+    """Tests for keeping the last request state in RAM and on the SD card."""
+
+    def setUp(self):
+        """Use temporary directories for RUN_DIR and ROOT_DIR."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.run_dir = os.path.join(tmp.name, "run")
+        self.persist_dir = os.path.join(tmp.name, "root")
+        self.store = StateStore(run_dir=self.run_dir, persist_dir=self.persist_dir)
+
+    def _persisted(self) -> dict:
+        with open(self.store.persist_path) as fin:
+            return json.load(fin)
+
+    def test_digest_order(self):
+        """Check the digest does not depend on field order."""
+        self.assertEqual(state_digest(STATE), state_digest(dict(reversed(list(STATE.items())))))
+        self.assertNotEqual(state_digest(STATE), state_digest({**STATE, "ssh": "down"}))
+
+    def test_unchanged_skips_writes(self):
+        """Check an unchanged state is reported as such without writing either copy."""
+        self.assertFalse(self.store.update(STATE))
+        self.assertEqual(self._persisted(), STATE)
+        mtimes = (os.stat(self.store.path).st_mtime_ns, os.stat(self.store.persist_path).st_mtime_ns)
+        os.utime(self.store.path, ns=(0, 0))
+        os.utime(self.store.persist_path, ns=(0, 0))
+
+        self.assertTrue(self.store.update(dict(STATE)))
+        self.assertEqual(os.stat(self.store.path).st_mtime_ns, 0)
+        self.assertEqual(os.stat(self.store.persist_path).st_mtime_ns, 0)
+        self.assertNotEqual(mtimes, (0, 0))
+
+    def test_change_persists(self):
+        """Check a changed state is written to both copies."""
+        self.store.update(STATE)
+        changed = {**STATE, "ip": "10.0.0.2"}
+        self.assertFalse(self.store.update(changed))
+        self.assertEqual(self._persisted(), changed)
+        self.assertTrue(self.store.update(changed))
+
+    def test_force(self):
+        """Check a forced update is never reported as unchanged."""
+        self.store.update(STATE)
+        self.assertFalse(self.store.update(STATE, force=True))
+
+    def test_seed_after_reboot(self):
+        """Check the RAM copy is seeded from the SD card copy when RUN_DIR was cleared."""
+        self.store.update(STATE)
+        os.remove(self.store.path)
+        self.assertTrue(self.store.update(STATE))
+        self.assertTrue(os.path.exists(self.store.path))
+
+    def test_persist(self):
+        """Check persist writes the RAM copy only if the SD card copy is out of date."""
+        self.store.persist()  # nothing recorded yet
+        self.assertFalse(os.path.exists(self.store.persist_path))
+
+        self.store.update(STATE)
+        with open(self.store.persist_path, "w") as fout:
+            json.dump({}, fout)
+        self.store.persist()
+        self.assertEqual(self._persisted(), STATE)
+
+        os.utime(self.store.persist_path, ns=(0, 0))
+        self.store.persist()
+        self.assertEqual(os.stat(self.store.persist_path).st_mtime_ns, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
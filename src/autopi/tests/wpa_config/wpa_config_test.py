@@ -0,0 +1,130 @@
+"""wpa_config test script."""
+
+import os
+import tempfile
+import unittest
+
+from autopi.util import wpa_interface
+from autopi.util.wpa_config import WpaConfig
+
+CONFIG = """ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev
+update_config=1
+
+network={
+\tssid="CSMwireless"
+\tkey_mgmt=NONE
+}
+
+# home
+network={
+    ssid="a}b\\"c{"
+    psk=0123
+    priority=2
+}
+
+network={
+\tssid=6869646465
+\tkey_mgmt=NONE
+}
+
+network={
+\tssid="CSMwireless"
+\tpsk="password"
+}
+"""
+
+
+class TestWpaConfig(unittest.TestCase):
+    """Tests for parsing and editing a wpa_supplicant config."""
+
+    def test_lossless(self):
+        """Check a parsed config serializes back to the same text, including odd and unterminated input."""
+        for text in (CONFIG, "", "country=US", CONFIG.rstrip("\n"), CONFIG + 'network={\n\tssid="x"\n'):
+            self.assertEqual(WpaConfig.parse(text).dumps(), text)
+
+    def test_index(self):
+        """Check networks are found by SSID, whether quoted with special characters or hex-encoded."""
+        config = WpaConfig.parse(CONFIG)
+        self.assertEqual(len(config.networks), 4)
+        self.assertEqual(len(config.find("CSMwireless")), 2)
+        self.assertEqual(config.find('a}b\\"c{')[0].get("priority"), "2")
+        self.assertEqual(len(config.find("hidde")), 1)
+        self.assertEqual(config.find("missing"), [])
+
+    def test_remove(self):
+        """Check removing by SSID takes the first or every match, with the blank lines before it."""
+        config = WpaConfig.parse(CONFIG)
+        self.assertEqual(config.remove_ssid('a}b\\"c{'), 1)
+        self.assertNotIn("priority=2", config.dumps())
+        self.assertIn("# home\n\nnetwork={\n\tssid=6869646465", config.dumps())
+
+        self.assertEqual(config.remove_ssid("CSMwireless", all_matches=True), 2)
+        self.assertEqual(config.find("CSMwireless"), [])
+        self.assertEqual(len(config.networks), 1)
+
+    def test_add(self):
+        """Check an added network follows a blank line and is found."""
+        config = WpaConfig.parse(CONFIG)
+        network = 'network={\n\tssid="new"\n\t#psk="secret"\n\tpsk=abcd\n}'
+        self.assertFalse(config.has_network(network))
+        config.add(network)
+        self.assertTrue(config.dumps().endswith('}\n\nnetwork={\n\tssid="new"\n\tpsk=abcd\n}\n'))
+        self.assertTrue(config.has_network(network))
+        self.assertEqual(len(config.find("new")), 1)
+
+    def test_set(self):
+        """Check a setting is replaced in place or added before the closing brace."""
+        network = WpaConfig.parse(CONFIG).find("hidde")[0]
+        network.set("priority", "3")
+        network.set("key_mgmt", "WPA-PSK")
+        self.assertEqual(network.text, "network={\n\tssid=6869646465\n\tkey_mgmt=WPA-PSK\n\tpriority=3\n}\n")
+
+    def test_country(self):
+        """Check the country is replaced in place, or added at the end of the header."""
+        config = WpaConfig.parse(CONFIG)
+        self.assertIsNone(config.country)
+        config.country = "US"
+        self.assertTrue(config.dumps().startswith("ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev\n"))
+        self.assertIn("update_config=1\ncountry=US\n\nnetwork={", config.dumps())
+        config.country = "GB"
+        self.assertEqual(WpaConfig.parse(config.dumps()).country, "GB")
+        self.assertNotIn("US", config.dumps())
+
+
+class TestWpaInterfaceFile(unittest.TestCase):
+    """Tests for the wpa_interface file functions."""
+
+    def setUp(self):
+        """Write the sample config to a temporary file."""
+        fd, self.path = tempfile.mkstemp()
+        with os.fdopen(fd, "w") as fout:
+            fout.write(CONFIG)
+        self.addCleanup(os.remove, self.path)
+
+    def test_queries(self):
+        """Check the SSID queries."""
+        self.assertTrue(wpa_interface.ssid_exists("CSMwireless", self.path))
+        self.assertTrue(wpa_interface.check_duplicate_ssid("CSMwireless", self.path))
+        self.assertFalse(wpa_interface.check_duplicate_ssid('a}b\\"c{', self.path))
+        self.assertFalse(wpa_interface.ssid_exists("CSM", self.path))
+        self.assertTrue(wpa_interface.network_exists('network={\nssid="CSMwireless"\nkey_mgmt=NONE\n}', self.path))
+
+    def test_delete(self):
+        """Check deleting every duplicate in one call."""
+        self.assertTrue(wpa_interface.delete_ssid("CSMwireless", self.path, all_matches=True))
+        self.assertFalse(wpa_interface.ssid_exists("CSMwireless", self.path))
+        self.assertFalse(wpa_interface.delete_ssid("CSMwireless", self.path))
+        self.assertTrue(wpa_interface.ssid_exists('a}b\\"c{', self.path))
+
+    def test_add_and_country(self):
+        """Check adding a network and setting the country."""
+        network = 'network={\n\tssid="new"\n\tkey_mgmt=NONE\n}'
+        self.assertTrue(wpa_interface.add_network(network, self.path))
+        self.assertFalse(wpa_interface.add_network(network, self.path))
+        wpa_interface.update_country("US", self.path)
+        self.assertEqual(wpa_interface.get_country(self.path), "US")
+        self.assertTrue(wpa_interface.ssid_exists("new", self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,184 @@
+"""wpa_ctrl test script."""
+
+import os
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+from autopi.util import wpa_interface
+
+wpa_ctrl = wpa_interface.wpa_ctrl  # the module used by wpa_interface, imported as util.wpa_ctrl
+
+CONFIG = """ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev
+update_config=1
+
+network={
+\tssid="CSMwireless"
+\tkey_mgmt=NONE
+}
+"""
+
+
+class _FakeSupplicant:
+    """A stand-in for wpa_supplicant's control socket for one interface."""
+
+    def __init__(self, path: str):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        self.commands = []
+        self.networks = {}
+        self.silent = False
+        self.delay = 0.0
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+        self.thread.start()
+
+    def _reply(self, command: str) -> str:
+        name, *args = command.split(" ", 2)
+        if name == "ADD_NETWORK":
+            network_id = len(self.networks)
+            self.networks[network_id] = {}
+            return f"{network_id}\n"
+        if name == "SET_NETWORK":
+            network_id, setting = int(args[0]), args[1]
+            key, value = setting.split(" ", 1)
+            if key == "psk" and len(value) != 64:
+                return "FAIL\n"
+            self.networks[network_id][key] = value
+            return "OK\n"
+        if name == "REMOVE_NETWORK":
+            del self.networks[int(args[0])]
+            return "OK\n"
+        if name in ("RECONFIGURE", "ENABLE_NETWORK", "SAVE_CONFIG"):
+            return "OK\n"
+        return "UNKNOWN COMMAND\n"
+
+    def _serve(self):
+        while True:
+            try:
+                data, address = self.sock.recvfrom(4096)
+            except OSError:
+                return
+            command = data.decode()
+            self.commands.append(command)
+            if self.silent:
+                continue
+            time.sleep(self.delay)
+            try:
+                self.sock.sendto(b"<3>CTRL-EVENT-SCAN-STARTED ", address)  # unsolicited event before the reply
+                self.sock.sendto(self._reply(command).encode(), address)
+            except OSError:
+                pass  # the client has gone, as wpa_supplicant logs and ignores
+
+    def close(self):
+        self.sock.close()
+
+
+class TestWpaCtrl(unittest.TestCase):
+    """Tests for the control socket client against a fake wpa_supplicant."""
+
+    def setUp(self):
+        """Start a fake control socket for wlan0."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.ctrl_dir = os.path.join(tmp.name, "wpa_supplicant")
+        os.mkdir(self.ctrl_dir)
+        self.supplicant = _FakeSupplicant(os.path.join(self.ctrl_dir, "wlan0"))
+        self.addCleanup(self.supplicant.close)
+        patches = (
+            mock.patch.object(wpa_ctrl.Config, "WPA_CTRL_DIR", self.ctrl_dir),
+            mock.patch.object(wpa_ctrl.Config, "WPA_CTRL_TIMEOUT", 0.5),
+        )
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.config_file = os.path.join(tmp.name, "wpa_supplicant.conf")
+        with open(self.config_file, "w") as fout:
+            fout.write(CONFIG)
+
+    def test_reconfigure(self):
+        """Check RECONFIGURE is sent, skipping the unsolicited event, and the client socket is removed."""
+        with wpa_ctrl.WpaCtrl("wlan0") as ctrl:
+            local_path = ctrl._local_path
+            ctrl.reconfigure()
+        self.assertEqual(self.supplicant.commands, ["RECONFIGURE"])
+        self.assertFalse(os.path.exists(local_path))
+
+    def test_default_interface(self):
+        """Check reconfiguring without an interface uses the default one only, skipping the P2P device socket."""
+        p2p = _FakeSupplicant(os.path.join(self.ctrl_dir, "p2p-dev-wlan0"))
+        self.addCleanup(p2p.close)
+        p2p.silent = True
+        self.assertEqual(wpa_ctrl.default_interface(), "wlan0")
+        self.assertTrue(wpa_interface.run_reconfigure(None))
+        self.assertEqual(self.supplicant.commands, ["RECONFIGURE"])
+        self.assertEqual(p2p.commands, [])
+
+    def test_add_network(self):
+        """Check a network is added and enabled with ADD_NETWORK, SET_NETWORK and ENABLE_NETWORK."""
+        settings = [("ssid", '"home"'), ("psk", "ab" * 32), ("priority", "2")]
+        with wpa_ctrl.WpaCtrl("wlan0") as ctrl:
+            self.assertEqual(ctrl.add_network_settings(settings, save=True), 0)
+        self.assertEqual(
+            self.supplicant.commands,
+            [
+                "ADD_NETWORK",
+                'SET_NETWORK 0 ssid "home"',
+                f"SET_NETWORK 0 psk {'ab' * 32}",
+                "SET_NETWORK 0 priority 2",
+                "ENABLE_NETWORK 0",
+                "SAVE_CONFIG",
+            ],
+        )
+
+    def test_rejected(self):
+        """Check a rejected setting raises WpaCtrlError and removes the half-configured network."""
+        with wpa_ctrl.WpaCtrl("wlan0") as ctrl:
+            with self.assertRaises(wpa_ctrl.WpaCtrlError):
+                ctrl.add_network_settings([("ssid", '"home"'), ("psk", "short")])
+        self.assertEqual(self.supplicant.networks, {})
+        self.assertEqual(self.supplicant.commands[-1], "REMOVE_NETWORK 0")
+
+    def test_timeout(self):
+        """Check a missing reply raises WpaCtrlError and a missing socket raises OSError."""
+        self.supplicant.silent = True
+        with wpa_ctrl.WpaCtrl("wlan0") as ctrl:
+            with self.assertRaises(wpa_ctrl.WpaCtrlError):
+                ctrl.reconfigure()
+        with self.assertRaises(OSError):
+            wpa_ctrl.WpaCtrl("wlan1").open()
+
+    def test_late_reply(self):
+        """Check a reply that arrives after the timeout is not taken as the reply to the next command."""
+        self.supplicant.delay = 0.7
+        with wpa_ctrl.WpaCtrl("wlan0") as ctrl:
+            with self.assertRaises(wpa_ctrl.WpaCtrlError):
+                ctrl.reconfigure()
+            time.sleep(0.4)  # the RECONFIGURE reply has been sent by now
+            self.supplicant.delay = 0.0
+            self.assertEqual(ctrl.add_network(), 0)
+        self.assertEqual(self.supplicant.commands, ["RECONFIGURE", "ADD_NETWORK"])
+
+    def test_session_adds_without_reconfigure(self):
+        """Check a session that only adds a network adds it to the running wpa_supplicant instead of reconfiguring."""
+        network = wpa_interface.make_network("home", None, 2)
+        with wpa_interface.EditSession(self.config_file, "wlan0", reconfigure=True) as session:
+            session.add_network(network)
+        expected = [
+            "ADD_NETWORK",
+            'SET_NETWORK 0 ssid "home"',
+            "SET_NETWORK 0 key_mgmt NONE",
+            "SET_NETWORK 0 priority 2",
+        ]
+        self.assertEqual(self.supplicant.commands, expected + ["ENABLE_NETWORK 0"])
+        self.assertTrue(wpa_interface.ssid_exists("home", self.config_file))
+
+        with wpa_interface.EditSession(self.config_file, "wlan0", reconfigure=True) as session:
+            session.delete_ssid("home")
+        self.assertEqual(self.supplicant.commands[-1], "RECONFIGURE")
+
+
+if __name__ == "__main__":
+    unittest.main()
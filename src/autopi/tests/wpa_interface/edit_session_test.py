@@ -0,0 +1,107 @@
+"""wpa_interface edit session test script."""
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from autopi.util import wpa_interface
+
+WpaConfig = wpa_interface.WpaConfig  # the class used by wpa_interface, imported as util.wpa_config
+
+CONFIG = """ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev
+update_config=1
+
+network={
+\tssid="CSMwireless"
+\tkey_mgmt=NONE
+}
+"""
+HOME = 'network={\n\tssid="home"\n\tkey_mgmt=NONE\n}'
+
+
+class TestEditSession(unittest.TestCase):
+    """Tests for batching edits into one atomic write and at most one reconfigure."""
+
+    def setUp(self):
+        """Write a sample config and count writes and reconfigures."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, "wpa_supplicant.conf")
+        with open(self.path, "w") as fout:
+            fout.write(CONFIG)
+        os.chmod(self.path, 0o640)
+        save = mock.patch.object(WpaConfig, "save", autospec=True, side_effect=WpaConfig.save)
+        reconfigure = mock.patch.object(wpa_interface, "run_reconfigure", return_value=True)
+        self.save = save.start()
+        self.reconfigure = reconfigure.start()
+        self.addCleanup(save.stop)
+        self.addCleanup(reconfigure.stop)
+
+    def _read(self) -> str:
+        with open(self.path) as fin:
+            return fin.read()
+
+    def test_batch(self):
+        """Check several edits are written once and wpa_supplicant is reconfigured once."""
+        with wpa_interface.EditSession(self.path, "wlan0", reconfigure=True) as session:
+            session.set_country("US")
+            self.assertTrue(session.add_network(HOME))
+            self.assertEqual(session.set_priority("CSMwireless", 2), 1)
+            self.assertTrue(session.delete_ssid("home"))
+            self.assertTrue(session.add_network(HOME))
+        self.save.assert_called_once()
+        self.reconfigure.assert_called_once_with("wlan0")
+
+        config = WpaConfig.load(self.path)
+        self.assertEqual(config.country, "US")
+        self.assertEqual(config.find("CSMwireless")[0].get("priority"), "2")
+        self.assertEqual(len(config.find("home")), 1)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o640)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ["wpa_supplicant.conf"])
+
+    def test_same_country(self):
+        """Check setting the current country does not force a reconfigure when a network is added."""
+        with mock.patch.object(wpa_interface, "add_running_networks") as add_running:
+            with wpa_interface.EditSession(self.path, "wlan0", reconfigure=True) as session:
+                session.set_country("US")
+            with wpa_interface.EditSession(self.path, "wlan0", reconfigure=True) as session:
+                session.set_country("US")
+                session.add_network(HOME)
+        self.assertEqual(self.save.call_count, 2)
+        self.reconfigure.assert_called_once_with("wlan0")  # for the first session, which added the country
+        add_running.assert_called_once_with([HOME], "wlan0")
+
+    def test_unchanged(self):
+        """Check a session that ends with the text it started with neither writes nor reconfigures."""
+        with wpa_interface.EditSession(self.path, reconfigure=True) as session:
+            self.assertFalse(session.add_network('network={\n    ssid="CSMwireless"\n    key_mgmt=NONE\n}'))
+            self.assertFalse(session.delete_ssid("missing"))
+            self.assertTrue(session.add_network(HOME))
+            self.assertTrue(session.changed)
+            session.delete_ssid("home")
+            self.assertFalse(session.changed)
+        self.save.assert_not_called()
+        self.reconfigure.assert_not_called()
+
+    def test_exception(self):
+        """Check nothing is written if the session raises."""
+        with self.assertRaises(KeyError):
+            with wpa_interface.EditSession(self.path) as session:
+                session.set_country("US")
+                raise KeyError()
+        self.save.assert_not_called()
+        self.assertEqual(self._read(), CONFIG)
+
+    def test_wrappers(self):
+        """Check the single-edit functions write through a session without reconfiguring."""
+        self.assertTrue(wpa_interface.add_network(HOME, self.path))
+        wpa_interface.update_country("US", self.path)
+        self.assertTrue(wpa_interface.delete_ssid("home", self.path))
+        self.assertEqual(self.save.call_count, 3)
+        self.reconfigure.assert_not_called()
+        self.assertEqual(wpa_interface.get_country(self.path), "US")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""wpa_psk test script."""
+
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from unittest import mock
+
+from autopi.util import wpa_interface
+
+wpa_psk = wpa_interface.wpa_psk  # the module used by wpa_interface, imported as util.wpa_psk
+
+# IEEE 802.11i-2004, annex H.4, and the wpa_passphrase example
+VECTORS = (
+    ("IEEE", "password", "f42c6fc52df0ebef9ebb4b90b38a5f902e83fe1b135a70e23aed762e9710a12e"),
+    ("ThisIsASSID", "ThisIsAPassword", "0dc0d6eb90555ed6419756b9a15ec3e3209b63df707dd508d14581f8982721af"),
+)
+
+
+class TestDerivePsk(unittest.TestCase):
+    """Tests for deriving and caching PSKs."""
+
+    def setUp(self):
+        """Keep the cache in a temporary directory."""
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_path = os.path.join(tmp.name, "psk_cache.json")
+        patch = mock.patch.object(wpa_psk, "_cache", wpa_psk.PskCache(self.cache_path))
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_vectors(self):
+        """Check the PSKs of known vectors."""
+        for ssid, passphrase, psk in VECTORS:
+            self.assertEqual(wpa_psk.derive_psk(ssid, passphrase), psk)
+
+    def test_wpa_passphrase_format(self):
+        """Check the network block is formatted exactly like wpa_passphrase's output."""
+        ssid, passphrase, psk = VECTORS[1]
+        expected = f'network={{\n\tssid="{ssid}"\n\t#psk="{passphrase}"\n\tpsk={psk}\n}}\n'
+        self.assertEqual(wpa_interface._make_network_with_passwd(ssid, passphrase), expected)
+        if shutil.which("wpa_passphrase"):
+            result = subprocess.run(["wpa_passphrase", ssid, passphrase], capture_output=True, check=True, text=True)
+            self.assertEqual(result.stdout, expected)
+
+    def test_cache(self):
+        """Check a cached PSK is not derived again, also by a new process, and the cache is private."""
+        ssid, passphrase, psk = VECTORS[0]
+        wpa_psk.derive_psk(ssid, passphrase)
+        self.assertEqual(os.stat(self.cache_path).st_mode & 0o777, 0o600)
+        with open(self.cache_path) as fin:
+            self.assertNotIn(passphrase, fin.read())
+        with mock.patch.object(wpa_psk, "_derive") as derive:
+            self.assertEqual(wpa_psk.derive_psk(ssid, passphrase, wpa_psk.PskCache(self.cache_path)), psk)
+            derive.assert_not_called()
+
+    def test_cache_not_private(self):
+        """Check a cache file that others can read is ignored."""
+        with open(self.cache_path, "w") as fout:
+            json.dump({wpa_psk._cache_key("IEEE", "password"): "0" * 64}, fout)
+        os.chmod(self.cache_path, 0o644)
+        self.assertEqual(wpa_psk.derive_psk("IEEE", "password", wpa_psk.PskCache(self.cache_path)), VECTORS[0][2])
+
+    def test_make_networks(self):
+        """Check several networks, with and without passwords, keep their order and priority."""
+        networks = wpa_interface.make_networks(
+            [("IEEE", "password", 2), ("CSMwireless", None, None), ("ThisIsASSID", "ThisIsAPassword", None)]
+        )
+        self.assertEqual(networks[0], f'network={{\n\tssid="IEEE"\n\tpsk={VECTORS[0][2]}\n\tpriority=2\n}}')
+        self.assertEqual(networks[1], 'network={\n\tssid="CSMwireless"\n\tkey_mgmt=NONE\n}')
+        self.assertIn(f"psk={VECTORS[1][2]}", networks[2])
+        with self.assertRaises(wpa_interface.PasswordLengthError):
+            wpa_interface.make_network("IEEE", "short")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Compact binary encoding of status requests.
+
+The layout (network byte order) is:
+- header: format version (B), protocol version (B), event code (B), field flags (H)
+- device ID: 16 raw UUID bytes
+- hwid: 32 raw bytes, if FLAG_HWID
+- digest: 8 raw bytes, if FLAG_DIGEST
+- ip: length (B, 4 or 16) and packed address, if FLAG_IP
+- ssid: length (B) and UTF-8 bytes, if FLAG_SSID
+- reasons: bit mask (B) of event codes, if FLAG_REASONS
+
+SSH and VNC status are carried in the flags. The MAC address is not sent, as the server does not use it. The format
+must match web/api/compact.py.
+"""
+
+import struct
+from ipaddress import ip_address
+
+CONTENT_TYPE = "application/vnd.autopi.status"
+FORMAT_VERSION = 1
+EVENTS = ("general", "start", "shutdown", "keepalive", "net_update", "ssh_change", "vnc_change")
+
+FLAG_HWID = 1 << 0
+FLAG_DIGEST = 1 << 1
+FLAG_IP = 1 << 2
+FLAG_SSID = 1 << 3
+FLAG_SSH = 1 << 4
+FLAG_SSH_UP = 1 << 5
+FLAG_VNC = 1 << 6
+FLAG_VNC_UP = 1 << 7
+FLAG_REASONS = 1 << 8
+
+_HEADER = struct.Struct("!BBBH")
+
+
+def _service_flags(status: str, present: int, up: int) -> int:
+    if status not in ("up", "down"):
+        raise ValueError(f"unknown service status: {status!r}")
+    return present | (up if status == "up" else 0)
+
+
+def encode_status(request: dict) -> bytes:
+    """Encode a status request.
+
+    Args:
+        request (dict): request as built by generate_request.
+
+    Returns:
+        bytes: the encoded request.
+
+    Raises:
+        ValueError: a field cannot be represented (e.g. an unknown event, or an IP address with a scope); send the
+            request as JSON instead.
+    """
+    flags = 0
+    devid = bytes.fromhex(request["devid"].replace("-", ""))
+    if len(devid) != 16:
+        raise ValueError("devid is not a UUID")
+    fields = [devid]
+    if "hwid" in request:
+        flags |= FLAG_HWID
+        hwid = bytes.fromhex(request["hwid"])
+        if len(hwid) != 32:
+            raise ValueError("hwid is not a SHA-256 digest")
+        fields.append(hwid)
+    if "digest" in request:
+        flags |= FLAG_DIGEST
+        digest = bytes.fromhex(request["digest"])
+        if len(digest) != 8:
+            raise ValueError("digest is not 8 bytes")
+        fields.append(digest)
+    if "ip" in request:
+        flags |= FLAG_IP
+        if "%" in request["ip"]:
+            raise ValueError("scoped IP addresses cannot be packed")
+        packed = ip_address(request["ip"]).packed
+        fields.append(bytes((len(packed),)) + packed)
+    if "ssid" in request:
+        flags |= FLAG_SSID
+        ssid = request["ssid"].encode("utf-8")
+        if len(ssid) > 255:
+            raise ValueError("ssid is too long")
+        fields.append(bytes((len(ssid),)) + ssid)
+    if "reasons" in request:
+        flags |= FLAG_REASONS
+        mask = 0
+        for reason in request["reasons"]:
+            if reason not in EVENTS:
+                raise ValueError(f"unknown reason: {reason!r}")
+            mask |= 1 << EVENTS.index(reason)
+        fields.append(bytes((mask,)))
+    if "ssh" in request:
+        flags |= _service_flags(request["ssh"], FLAG_SSH, FLAG_SSH_UP)
+    if "vnc" in request:
+        flags |= _service_flags(request["vnc"], FLAG_VNC, FLAG_VNC_UP)
+
+    try:
+        event = EVENTS.index(request["event"])
+    except ValueError:
+        raise ValueError(f"unknown event: {request['event']!r}") from None
+    return _HEADER.pack(FORMAT_VERSION, request.get("version", 1), event, flags) + b"".join(fields)
@@ -9,10 +9,27 @@ class Config(object):
     """Contains configuration settings."""
 
     API_URL: ClassVar[str] = "https://autopi.mines.edu/api/status"
+    API_BATCH_URL: ClassVar[str] = "https://autopi.mines.edu/api/status/batch"
+    API_PROFILE_URL: ClassVar[str] = "https://autopi.mines.edu/api/network_profile"
+    REQUEST_TIMEOUT: ClassVar[float] = 10.0
+    COMPACT_STATUS: ClassVar[bool] = True
+    PROBE_TIMEOUT: ClassVar[float] = 5.0
+    SERVICE_PROBE_TIMEOUT: ClassVar[float] = 3.0
     WPA_CONFIG_FILE: ClassVar[str] = "/etc/wpa_supplicant/wpa_supplicant.conf"
+    WPA_CTRL_DIR: ClassVar[str] = "/var/run/wpa_supplicant"
+    WPA_CTRL_TIMEOUT: ClassVar[float] = 3.0
     ROOT_DIR: ClassVar[str] = "/var/opt/autopi"
+    RUN_DIR: ClassVar[str] = "/run/autopi"
+    TRIGGER_DEBOUNCE: ClassVar[float] = 1.0
+    HEARTBEAT_TICK: ClassVar[float] = 60.0
+    HEARTBEAT_MIN_INTERVAL: ClassVar[float] = 60.0
+    HEARTBEAT_MAX_INTERVAL: ClassVar[float] = 90.0
+    SPOOL_MAX_BYTES: ClassVar[int] = 256 * 1024
+    SPOOL_BACKOFF_BASE: ClassVar[float] = 15.0
+    SPOOL_BACKOFF_CAP: ClassVar[float] = 300.0
     NEW_NETWORK_FILE: ClassVar[str] = "/boot/CSM_new_network.txt"
     DEV_ID_FILE: ClassVar[str] = "/boot/CSM_device_id.txt"
+    BOOT_ID_FILE: ClassVar[str] = "/proc/sys/kernel/random/boot_id"
     HW_ID_SOURCE_FILE: ClassVar[str] = "/proc/cpuinfo"
     HW_ID_START_LINE: ClassVar[Optional[int]] = -4
     HW_ID_STOP_LINE: ClassVar[Optional[int]] = None
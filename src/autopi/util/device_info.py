@@ -1,10 +1,20 @@
 """Utilities to retrieve device information."""
 
+import json
+import os
 import subprocess
+import threading
+from functools import lru_cache
 from hashlib import sha256
+from typing import Tuple
 
 from util.config import Config
 
+_SYSTEMD_BUS_NAME = "org.freedesktop.systemd1"
+_DBUS_TIMEOUT = 2.0
+_ACTIVE_STATES = ("active", "reloading")
+_BUS_LOCK = threading.Lock()  # the shared blocking connection must not be used by two threads at once
+
 
 def get_dev_id() -> str:
     """Get device ID from boot drive.
@@ -34,10 +44,121 @@ def get_hw_id() -> str:
     return sha256(raw).hexdigest()
 
 
+def _identity_key() -> list:
+    """Return what the cached identity depends on: the boot ID, and the device ID file's modification time and size.
+
+    Raises:
+        OSError: either file could not be read
+    """
+    with open(Config.BOOT_ID_FILE) as f:
+        boot_id = f.read().strip()
+    dev_id_stat = os.stat(Config.DEV_ID_FILE)
+    return [boot_id, dev_id_stat.st_mtime_ns, dev_id_stat.st_size]
+
+
+def get_identity() -> Tuple[str, str]:
+    """Get the hardware ID and device ID, computed once per boot.
+
+    The IDs are cached in RUN_DIR, which is RAM-backed, so neither /proc/cpuinfo nor the boot partition is read again
+    until the next boot, or until the device ID file is modified. If the cache cannot be used, the IDs are read directly.
+
+    Returns:
+        str: hardware ID, as from get_hw_id
+        str: device ID, as from get_dev_id
+
+    Raises:
+        OSError: device ID or hardware info could not be read
+    """
+    cache_path = os.path.join(Config.RUN_DIR, "identity.json")
+    try:
+        key = _identity_key()
+    except OSError:
+        return get_hw_id(), get_dev_id()
+
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if cached["key"] == key:
+            return cached["hwid"], cached["devid"]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass  # missing, corrupt or stale cache
+
+    # if the device ID file changes after the key was taken, the next run sees a different key and reads it again
+    hwid, devid = get_hw_id(), get_dev_id()
+    try:
+        os.makedirs(Config.RUN_DIR, exist_ok=True)
+        tmp_path = cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"key": key, "hwid": hwid, "devid": devid}, f)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        pass  # not critical; the IDs are read again next time
+    return hwid, devid
+
+
+def _is_service_up_subprocess(service: str) -> bool:
+    """Return bool representing whether service is up, using 'service SERVICE_STR status' return code."""
+    result = subprocess.run(["service", service, "status"], capture_output=True, check=False)
+    return result.returncode == 0
+
+
+@lru_cache(maxsize=None)
+def _system_bus():
+    """Open a connection to the system bus, shared by all queries in this process.
+
+    Raises:
+        OSError: the system bus socket could not be opened.
+        jeepney.AuthenticationError: the bus rejected the connection.
+    """
+    from jeepney.io.blocking import open_dbus_connection
+
+    return open_dbus_connection(bus="SYSTEM")
+
+
+def get_unit_active_state(service: str) -> str:
+    """Get the systemd ActiveState of a service over D-Bus.
+
+    Args:
+        service (str): service name, with or without the '.service' suffix. Aliases (e.g. sshd) are resolved by systemd.
+
+    Returns:
+        str: the unit's ActiveState, e.g. 'active', 'inactive' or 'failed'.
+
+    Raises:
+        RuntimeError: jeepney is not installed, the bus rejected the connection, or systemd rejected the query.
+        OSError: the system bus could not be reached or did not reply in time.
+    """
+    # jeepney is optional, and imported on first use since most runs find the services in the same state as before
+    try:
+        from jeepney import AuthenticationError, DBusAddress, DBusErrorResponse, Properties, new_method_call
+        from jeepney.wrappers import unwrap_msg
+    except ImportError as e:
+        raise RuntimeError("jeepney is not installed") from e
+
+    unit = service if "." in service else service + ".service"
+    try:
+        with _BUS_LOCK:
+            bus = _system_bus()
+            manager = DBusAddress(
+                "/org/freedesktop/systemd1", bus_name=_SYSTEMD_BUS_NAME, interface="org.freedesktop.systemd1.Manager"
+            )
+            unit_path = unwrap_msg(
+                bus.send_and_get_reply(new_method_call(manager, "LoadUnit", "s", (unit,)), timeout=_DBUS_TIMEOUT)
+            )[0]
+            unit_address = DBusAddress(unit_path, bus_name=_SYSTEMD_BUS_NAME, interface="org.freedesktop.systemd1.Unit")
+            reply = bus.send_and_get_reply(Properties(unit_address).get("ActiveState"), timeout=_DBUS_TIMEOUT)
+        _, state = unwrap_msg(reply)[0]
+    except (AuthenticationError, DBusErrorResponse) as e:
+        raise RuntimeError(f"systemd query for {unit} failed: {e}") from e
+    return state
+
+
 def is_service_up(service: str) -> bool:
     """Return bool representing whether service is up.
 
-    Obtains status from 'service SERVICE_STR status' return code. The return codes are different per-service, but 0 should always imply UP. 0 => UP, not 0 => DOWN.
+    Reads the unit's ActiveState from systemd over D-Bus, which avoids spawning a process. If D-Bus is unavailable (jeepney
+    is not installed, or there is no system bus), obtains status from 'service SERVICE_STR status' return code instead. The
+    return codes are different per-service, but 0 should always imply UP. 0 => UP, not 0 => DOWN.
 
     Args:
         service (str): service name as in linux command 'service SERVICE_STR status'
@@ -45,5 +166,7 @@ def is_service_up(service: str) -> bool:
     Returns:
         bool: service is up
     """
-    result = subprocess.run(["service", service, "status"], capture_output=True, check=False)
-    return result.returncode == 0
+    try:
+        return get_unit_active_state(service) in _ACTIVE_STATES
+    except (RuntimeError, OSError):
+        return _is_service_up_subprocess(service)
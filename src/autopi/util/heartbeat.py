@@ -0,0 +1,108 @@
+"""Heartbeat scheduling from the hints in the server's status responses."""
+
+import json
+import os
+import time
+from typing import Optional
+
+from util.config import Config
+
+
+def next_due(sent_at: float, interval: float, phase: float) -> float:
+    """Compute when the next heartbeat is due.
+
+    Heartbeats are aligned to the device's phase: the next one is sent at the time closest to sent_at + interval that
+    is phase seconds past a multiple of HEARTBEAT_MIN_INTERVAL. The hints are clamped to safe bounds first, so a
+    misbehaving server cannot silence a device.
+
+    Args:
+        sent_at (float): time the last request was sent, in seconds since the epoch.
+        interval (float): requested interval until the next heartbeat.
+        phase (float): requested phase offset.
+
+    Returns:
+        float: time the next heartbeat is due, in seconds since the epoch.
+    """
+    slot = Config.HEARTBEAT_MIN_INTERVAL
+    interval = min(Config.HEARTBEAT_MAX_INTERVAL, max(Config.HEARTBEAT_MIN_INTERVAL, interval))
+    phase = phase % slot
+    return phase + round((sent_at + interval - phase) / slot) * slot
+
+
+class HeartbeatSchedule:
+    """Time of the next heartbeat, kept in RUN_DIR so that every sender reschedules it."""
+
+    def __init__(self, path: str = os.path.join(Config.RUN_DIR, "heartbeat.json")):
+        """Open a schedule.
+
+        Args:
+            path (str, optional): schedule file. Defaults to RUN_DIR/heartbeat.json.
+        """
+        self._path = path
+
+    def until_due(self, now: Optional[float] = None) -> float:
+        """Get how long until the next heartbeat is due.
+
+        Args:
+            now (float | None, optional): current time. Defaults to time.time().
+
+        Returns:
+            float: seconds until the heartbeat is due. 0 if it is overdue, if there is no schedule, or if it is not
+            plausible (e.g. after the clock was set back).
+        """
+        now = time.time() if now is None else now
+        try:
+            with open(self._path) as fin:
+                due = float(json.load(fin)["next_due"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return 0.0
+        wait = due - now
+        if wait > Config.HEARTBEAT_MAX_INTERVAL + Config.HEARTBEAT_MIN_INTERVAL:
+            return 0.0
+        return max(0.0, wait)
+
+    def delay(self, now: Optional[float] = None) -> Optional[float]:
+        """Get how long to wait before sending a heartbeat on this tick, for a keepalive run once per tick.
+
+        Args:
+            now (float | None, optional): current time. Defaults to time.time().
+
+        Returns:
+            float | None: seconds to wait, or None if the heartbeat is not due before the next tick. 0 if there is no
+            schedule, or it is not plausible (e.g. after the clock was set back).
+        """
+        wait = self.until_due(now)
+        if wait >= Config.HEARTBEAT_TICK:
+            return None
+        return wait
+
+    def update(self, body: dict, sent_at: float):
+        """Schedule the next heartbeat from a status response.
+
+        If the response has no hints (e.g. an older server), the schedule is removed and a heartbeat is sent on every
+        tick.
+
+        Args:
+            body (dict): decoded response body.
+            sent_at (float): time the request was sent, in seconds since the epoch.
+        """
+        try:
+            due = next_due(sent_at, float(body["next_interval"]), float(body["phase_offset"]))
+        except (KeyError, TypeError, ValueError):
+            self.clear()
+            return
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            tmp_path = self._path + ".tmp"
+            with open(tmp_path, "w") as fout:
+                json.dump({"next_due": due}, fout)
+            os.replace(tmp_path, self._path)
+        except OSError:
+            pass  # not critical; the heartbeat is sent on the next tick
+
+    def clear(self):
+        """Remove the schedule."""
+        try:
+            os.remove(self._path)
+        except OSError:
+            pass
@@ -0,0 +1,182 @@
+"""A minimal JSON-over-HTTPS sender built on the standard library.
+
+The client sends a few hundred bytes per run, so the import and memory cost of a full-featured HTTP library is not
+worth paying on every start. Certificates are verified against the system trust store.
+
+TLS sessions are cached per host and port for the life of the process, so that later connections resume the session
+instead of paying for a full handshake. network_monitor.py sends the keepalives and net_update requests from one
+long-running process, so each of them resumes the session of the one before.
+"""
+
+import json
+import ssl
+from http.client import HTTPConnection, HTTPSConnection
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+_default_context: Optional[ssl.SSLContext] = None
+# (host, port) -> (context, session); a session can only be resumed with the context that created it
+_sessions: Dict[Tuple[str, Optional[int]], Tuple[ssl.SSLContext, ssl.SSLSession]] = {}
+
+
+class Response:
+    """The status and body of an HTTP response."""
+
+    def __init__(
+        self,
+        status_code: int,
+        content: bytes,
+        resumed: Optional[bool] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        """Create a response.
+
+        Args:
+            status_code (int): HTTP status code.
+            content (bytes): raw response body.
+            resumed (bool | None, optional): the TLS session of an earlier connection in this process was resumed;
+                None for plain HTTP. Defaults to None.
+            headers (dict[str, str] | None, optional): response headers, with lowercase names. Defaults to none.
+        """
+        self.status_code = status_code
+        self.content = content
+        self.resumed = resumed
+        self.headers = headers or {}
+
+    @property
+    def ok(self) -> bool:
+        """Check if the status code is not an error (below 400)."""
+        return self.status_code < 400
+
+    def json(self):
+        """Decode the body as JSON.
+
+        Raises:
+            ValueError: the body is not valid JSON.
+        """
+        return json.loads(self.content)
+
+
+class _ResumingHTTPSConnection(HTTPSConnection):
+    """An HTTPS connection that offers a previous TLS session for resumption."""
+
+    def __init__(self, host: str, port: Optional[int], timeout: float, context: ssl.SSLContext, session):
+        super().__init__(host, port, timeout=timeout, context=context)
+        self.tls_context = context
+        self.session = session
+        self.tls_sock: Optional[ssl.SSLSocket] = None
+
+    def connect(self):
+        # tunnels (proxies) are not used, so the server name is always the host
+        HTTPConnection.connect(self)
+        self.sock = self.tls_context.wrap_socket(self.sock, server_hostname=self.host, session=self.session)
+        self.tls_sock = self.sock  # kept after close, which the connection does itself for a one-off response
+
+
+def default_context() -> ssl.SSLContext:
+    """Get the TLS settings used when none are given, verifying certificates against the system trust store.
+
+    The context is created once per process, as loading the trust store is slow and cached sessions are tied to it.
+    """
+    global _default_context
+    if _default_context is None:
+        _default_context = ssl.create_default_context()
+    return _default_context
+
+
+def _request(
+    method: str,
+    url: str,
+    body: Optional[bytes],
+    headers: Dict[str, str],
+    timeout: float,
+    context: Optional[ssl.SSLContext],
+) -> Response:
+    parts = urlsplit(url)
+    key = (parts.hostname, parts.port)
+    if parts.scheme == "https":
+        context = context or default_context()
+        cached = _sessions.get(key)
+        session = cached[1] if cached is not None and cached[0] is context else None
+        conn = _ResumingHTTPSConnection(parts.hostname, parts.port, timeout, context, session)
+    else:
+        conn = HTTPConnection(parts.hostname, parts.port, timeout=timeout)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    try:
+        conn.request(method, path, body=body, headers=headers)
+        resp = conn.getresponse()
+        resumed = None
+        if isinstance(conn, _ResumingHTTPSConnection):
+            # TLS 1.3 tickets arrive after the handshake, so the session is taken once the response has started
+            resumed = conn.tls_sock.session_reused
+            if conn.tls_sock.session is not None:
+                _sessions[key] = (context, conn.tls_sock.session)
+        response_headers = {name.lower(): value for name, value in resp.getheaders()}
+        return Response(resp.status, resp.read(), resumed, response_headers)
+    finally:
+        conn.close()
+
+
+def get(
+    url: str, timeout: float, headers: Optional[Dict[str, str]] = None, context: Optional[ssl.SSLContext] = None
+) -> Response:
+    """Send a GET request.
+
+    Args:
+        url (str): http or https url to get.
+        timeout (float): timeout in seconds for connecting and for each read.
+        headers (dict[str, str] | None, optional): request headers, e.g. If-None-Match. Defaults to none.
+        context (ssl.SSLContext | None, optional): TLS settings for https urls. Defaults to the system trust store.
+
+    Returns:
+        Response: the response from the server, with resumed set for https urls.
+
+    Raises:
+        OSError: on connection failure, TLS failure or timeout.
+        http.client.HTTPException: the server's response is not valid HTTP.
+    """
+    return _request("GET", url, None, headers or {}, timeout, context)
+
+
+def post(
+    url: str, body: bytes, content_type: str, timeout: float, context: Optional[ssl.SSLContext] = None
+) -> Response:
+    """Send a POST request.
+
+    Args:
+        url (str): http or https url to post to.
+        body (bytes): request body.
+        content_type (str): media type of the body.
+        timeout (float): timeout in seconds for connecting and for each read.
+        context (ssl.SSLContext | None, optional): TLS settings for https urls. Defaults to verifying certificates
+            against the system trust store.
+
+    Returns:
+        Response: the response from the server, with resumed set for https urls.
+
+    Raises:
+        OSError: on connection failure, TLS failure or timeout.
+        http.client.HTTPException: the server's response is not valid HTTP.
+    """
+    return _request("POST", url, body, {"Content-Type": content_type}, timeout, context)
+
+
+def post_json(url: str, data, timeout: float, context: Optional[ssl.SSLContext] = None) -> Response:
+    """Send a POST request with a JSON body.
+
+    Args:
+        url (str): http or https url to post to.
+        data: anything that json.dumps can convert to a JSON string.
+        timeout (float): timeout in seconds for connecting and for each read.
+        context (ssl.SSLContext | None, optional): TLS settings for https urls. Defaults to the system trust store.
+
+    Returns:
+        Response: the response from the server, with resumed set for https urls.
+
+    Raises:
+        OSError: on connection failure, TLS failure or timeout.
+        http.client.HTTPException: the server's response is not valid HTTP.
+    """
+    return post(url, json.dumps(data).encode("utf-8"), "application/json", timeout, context)
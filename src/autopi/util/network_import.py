@@ -0,0 +1,169 @@
+"""Bulk import of networks from a list, applied to the wpa config in one edit session.
+
+Two formats are accepted, told apart by the first line that is not blank or a comment:
+- blocks of `ssid=`, `password=` and `priority=` lines (the CSM_new_network.txt format), separated by blank lines or
+  by the next `ssid=` line;
+- CSV with a header line starting with `ssid`, and `password` and `priority` columns.
+"""
+
+import csv
+import itertools
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from util import wpa_interface as wpa
+from util.config import Config
+
+ADDED = "added"
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+SUPERSEDED = "superseded"
+INVALID = "invalid"
+
+
+@dataclass
+class NetworkEntry:
+    """A network read from a list."""
+
+    line: int
+    ssid: Optional[str]
+    password: Optional[str] = None
+    priority: Optional[str] = None
+
+
+@dataclass
+class ImportResult:
+    """What importing an entry did."""
+
+    entry: NetworkEntry
+    status: str
+    message: str = ""
+
+
+def _setting(line: str) -> Optional[tuple]:
+    """Split a `key=value` line, or None for comments, blank lines and empty values."""
+    if line.lstrip().startswith("#") or "=" not in line:
+        return None
+    key, value = line.strip().split("=", 1)
+    return (key.strip(), value) if value else None
+
+
+def _entry(line: int, fields: Dict[str, str]) -> NetworkEntry:
+    return NetworkEntry(
+        line, fields.get("ssid") or None, fields.get("password") or None, fields.get("priority") or None
+    )
+
+
+def _parse_blocks(lines: Iterator[str], first_line: int) -> Iterator[NetworkEntry]:
+    fields: Dict[str, str] = {}
+    start = first_line
+    for number, line in enumerate(lines, start=first_line):
+        setting = _setting(line)
+        if setting is None:
+            if not line.strip() and fields:
+                yield _entry(start, fields)
+                fields = {}
+            continue
+        if setting[0] == "ssid" and "ssid" in fields:
+            yield _entry(start, fields)
+            fields = {}
+        if not fields:
+            start = number
+        fields[setting[0]] = setting[1]
+    if fields:
+        yield _entry(start, fields)
+
+
+def _parse_csv(lines: Iterator[str], first_line: int) -> Iterator[NetworkEntry]:
+    reader = csv.DictReader(lines, skipinitialspace=True)
+    for row in reader:
+        fields = {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+        if any(fields.values()):
+            yield _entry(first_line + reader.line_num - 1, fields)
+
+
+def parse_entries(lines: Iterable[str]) -> Iterator[NetworkEntry]:
+    """Read networks from a list, one at a time.
+
+    Args:
+        lines (Iterable[str]): lines of the list, e.g. an open file.
+
+    Returns:
+        Iterator[NetworkEntry]: the networks, with the line each starts on. Entries are not validated.
+    """
+    lines = iter(lines)
+    skipped = 0
+    for line in lines:
+        skipped += 1
+        if line.strip() and not line.lstrip().startswith("#"):
+            rest = itertools.chain([line], lines)
+            if line.strip().lower().startswith("ssid,"):
+                return _parse_csv(rest, skipped)
+            return _parse_blocks(rest, skipped)
+    return iter(())
+
+
+def import_networks(
+    entries: Iterable[NetworkEntry],
+    config_file: str = Config.WPA_CONFIG_FILE,
+    interface: Optional[str] = Config.DEFAULT_WIRELESS_INTERFACE,
+    dry_run: bool = False,
+) -> List[ImportResult]:
+    """Add or update networks in a wpa config file with one write and at most one reconfigure.
+
+    A network whose SSID is not configured is added. A configured SSID with different settings (e.g. a new password)
+    is replaced, and one with the same settings is left alone. If an SSID is listed more than once, the last entry
+    wins.
+
+    Args:
+        entries (Iterable[NetworkEntry]): the networks to import.
+        config_file (str, optional): filename of wpa config file. Defaults to Config.WPA_CONFIG_FILE.
+        interface (str | None, optional): interface to apply the changes to. Defaults to
+            Config.DEFAULT_WIRELESS_INTERFACE.
+        dry_run (bool, optional): report what would change without writing the config or the PSK cache. Defaults to
+            False.
+
+    Returns:
+        list[ImportResult]: the result of each entry, in order.
+
+    Raises:
+        OSError: config_file could not be read or written.
+        subprocess.CalledProcessError: wpa_cli's reconfigure failed.
+    """
+    results: List[ImportResult] = []
+    latest: Dict[str, ImportResult] = {}
+    for entry in entries:
+        try:
+            if entry.ssid is None:
+                raise ValueError("no ssid")
+            if entry.priority is not None and not entry.priority.lstrip("-").isdigit():
+                raise ValueError(f"priority is not a number: {entry.priority}")
+            wpa.check_network(entry.ssid, entry.password)
+        except (ValueError, RuntimeError) as e:
+            results.append(ImportResult(entry, INVALID, str(e)))
+            continue
+        result = ImportResult(entry, UNCHANGED)
+        if entry.ssid in latest:
+            latest[entry.ssid].status = SUPERSEDED
+            latest[entry.ssid].message = f"replaced by line {entry.line}"
+        latest[entry.ssid] = result
+        results.append(result)
+
+    pending = list(latest.values())
+    networks = wpa.make_networks(
+        ((r.entry.ssid, r.entry.password, r.entry.priority) for r in pending), save_psks=not dry_run
+    )
+    with wpa.EditSession(config_file, interface, reconfigure=True) as session:
+        for result, network in zip(pending, networks):
+            existing = session.config.find(result.entry.ssid)
+            if existing and len(existing) == 1 and session.config.has_network(network):
+                continue
+            if existing:
+                session.delete_ssid(result.entry.ssid, all_matches=True)
+                result.status = UPDATED
+            else:
+                result.status = ADDED
+            session.add_network(network)
+        if dry_run:
+            session.discard()
+    return results
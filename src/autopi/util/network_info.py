@@ -1,19 +1,83 @@
 """Utilities to retrieve network information."""
 
-import subprocess
+import array
+import errno
+import fcntl
+import os
+import select
+import socket
+import struct
+import time
+from dataclasses import dataclass
 from ipaddress import ip_address
-from typing import List, Optional, Tuple
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import netifaces
 
+# rtnetlink constants; see linux/netlink.h, linux/rtnetlink.h and linux/if_link.h
+_NETLINK_ROUTE = 0
+_RTMGRP_LINK = 0x1
+_RTMGRP_IPV4_IFADDR = 0x10
+_RTMGRP_IPV4_ROUTE = 0x40
+_NLMSG_ERROR = 2
+_NLMSG_DONE = 3
+_NLM_F_REQUEST = 0x1
+_NLM_F_DUMP = 0x300
+_RTM_NEWLINK = 16
+_RTM_DELLINK = 17
+_RTM_GETLINK = 18
+_RTM_NEWADDR = 20
+_RTM_DELADDR = 21
+_RTM_GETADDR = 22
+_RTM_NEWROUTE = 24
+_RTM_DELROUTE = 25
+_RTM_GETROUTE = 26
+_IFLA_ADDRESS = 1
+_IFLA_IFNAME = 3
+_IFA_ADDRESS = 1
+_IFA_LOCAL = 2
+_RTA_OIF = 4
+_RTA_GATEWAY = 5
+_RTA_PRIORITY = 6
+_RTA_TABLE = 15
+_RT_TABLE_MAIN = 254
+_RTN_UNICAST = 1
+_IFF_UP = 0x1
+
+_NLMSGHDR = struct.Struct("=LHHLL")
+_RTATTR = struct.Struct("=HH")
+_IFINFOMSG = struct.Struct("=BxHiII")
+_IFADDRMSG = struct.Struct("=BBBBI")
+_RTMSG = struct.Struct("=BBBBBBBBI")
+_RTGENMSG = struct.Struct("=Bxxx")
+# receive buffer of the notification socket; the kernel caps it at net.core.rmem_max
+_NETLINK_RCVBUF = 1024 * 1024
+
+# wireless-extensions constants; see linux/wireless.h
+PROC_NET_WIRELESS = "/proc/net/wireless"
+_SIOCGIWNAME = 0x8B01
+_SIOCGIWAP = 0x8B15
+_SIOCGIWESSID = 0x8B1B
+_IFNAMSIZ = 16
+_IWREQ_DATA_SIZE = 16
+_IW_ESSID_MAX_SIZE = 32
+_IW_POINT = struct.Struct("PHH")
+_NO_ACCESS_POINT = (b"\0" * 6, b"\xff" * 6, b"\x44" * 6)
+
 
 def get_default_gateway() -> Tuple[str, str]:
     """Get the default IPv4 gateway (ip, interface) of the device.
 
     Returns:
         tuple[str, str]: tuple containing the ip and interface of the default gateway
+
+    Raises:
+        KeyError: there is no default IPv4 gateway
     """
-    return netifaces.gateways()["default"][netifaces.AF_INET]
+    gateway = NetworkSnapshot.capture(wireless=False).default_gateway
+    if gateway is None:
+        raise KeyError("no default gateway")
+    return gateway
 
 
 def get_default_interface() -> str:
@@ -21,8 +85,11 @@ def get_default_interface() -> str:
 
     Returns:
         str: the interface of the default gateway
+
+    Raises:
+        KeyError: there is no default IPv4 gateway
     """
-    return get_default_gateway()[0]
+    return get_default_gateway()[1]
 
 
 def get_interfaces(exclude_loopback: bool = True) -> List[str]:
@@ -34,11 +101,7 @@ def get_interfaces(exclude_loopback: bool = True) -> List[str]:
     Returns:
         list[str]: list of interface name strings
     """
-    ref_ifaces = netifaces.interfaces()
-    up_ifaces = (x for x in ref_ifaces if get_interface_ip(x) is not None)
-    if not exclude_loopback:
-        return list(up_ifaces)
-    return [x for x in up_ifaces if not ip_address(get_interface_ip(x)).is_loopback]
+    return NetworkSnapshot.capture(wireless=False).get_interfaces(exclude_loopback)
 
 
 def get_mac(interface: str) -> str:
@@ -50,10 +113,7 @@ def get_mac(interface: str) -> str:
     Returns:
         str: MAC address.
     """
-    try:
-        return netifaces.ifaddresses(interface)[netifaces.AF_LINK][0]["addr"]
-    except Exception as e:
-        raise RuntimeError("MAC address could not be found") from e
+    return NetworkSnapshot.capture(wireless=False).get_mac(interface)
 
 
 def is_interface(interface: str) -> bool:
@@ -68,32 +128,120 @@ def is_interface_connected(interface: str) -> bool:
 
 def get_interface_ip(interface: str) -> Optional[str]:
     """Get the IP address linked to an interface."""
-    if interface not in netifaces.interfaces():
-        return None
-    addrs = netifaces.ifaddresses(interface)
-    if netifaces.AF_INET in addrs:
-        ipinfo = addrs[netifaces.AF_INET][0]  # TODO account for multiple addresses
-        return ipinfo["addr"]
-    return None
+    return NetworkSnapshot.capture(wireless=False).get_interface_ip(interface)
+
+
+@dataclass(frozen=True)
+class WirelessInfo:
+    """Wireless state of an interface."""
+
+    interface: str
+    is_wireless: bool
+    is_associated: bool = False
+    ssid: Optional[str] = None
+    link_quality: Optional[float] = None
+    signal_level: Optional[float] = None
+
+
+def parse_proc_net_wireless(contents: str) -> Dict[str, Tuple[int, float, float]]:
+    """Parse the contents of /proc/net/wireless.
+
+    Args:
+        contents (str): file contents.
+
+    Returns:
+        dict[str, tuple[int, float, float]]: (status, link quality, signal level) keyed by interface name.
+    """
+    stats = {}
+    for line in contents.splitlines()[2:]:  # skip the two header lines
+        name, sep, fields = line.partition(":")
+        values = fields.split()
+        if not sep or len(values) < 3:
+            continue
+        try:
+            stats[name.strip()] = (int(values[0], 16), float(values[1].rstrip(".")), float(values[2].rstrip(".")))
+        except ValueError:
+            continue
+    return stats
+
+
+def _read_proc_net_wireless() -> Dict[str, Tuple[int, float, float]]:
+    try:
+        with open(PROC_NET_WIRELESS) as f:
+            return parse_proc_net_wireless(f.read())
+    except OSError:
+        return {}
+
+
+def _iwreq(interface: str, data: bytes = b"") -> bytearray:
+    """Build a struct iwreq for interface with data in the request union."""
+    return bytearray(
+        interface.encode("utf-8")[: _IFNAMSIZ - 1].ljust(_IFNAMSIZ, b"\0") + data.ljust(_IWREQ_DATA_SIZE, b"\0")
+    )
+
+
+def _ioctl_wireless(interface: str) -> Tuple[Optional[str], bool]:
+    """Query the SSID and association state with wireless-extensions ioctls.
+
+    Returns:
+        tuple[str | None, bool]: ssid (None if not associated) and whether an access point is associated.
+
+    Raises:
+        OSError: the interface is not wireless or does not exist.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        fcntl.ioctl(sock.fileno(), _SIOCGIWNAME, _iwreq(interface))
+
+        essid = array.array("B", bytes(_IW_ESSID_MAX_SIZE + 1))
+        request = _iwreq(interface, _IW_POINT.pack(essid.buffer_info()[0], len(essid), 0))
+        fcntl.ioctl(sock.fileno(), _SIOCGIWESSID, request)
+        _, length, _ = _IW_POINT.unpack_from(request, _IFNAMSIZ)
+        ssid = essid.tobytes()[:length].decode("utf-8", "replace") if length > 0 else None
+
+        request = _iwreq(interface)
+        fcntl.ioctl(sock.fileno(), _SIOCGIWAP, request)
+        access_point = bytes(request[_IFNAMSIZ + 2 : _IFNAMSIZ + 8])  # sockaddr.sa_data
+    return ssid, access_point not in _NO_ACCESS_POINT
+
+
+def probe_wireless(interface: str, proc_stats: Optional[Dict[str, Tuple[int, float, float]]] = None) -> WirelessInfo:
+    """Get the wireless state of an interface without external tools.
+
+    Uses wireless-extensions ioctls (the interface iwgetid/iwconfig use) for the SSID and association state, with
+    /proc/net/wireless for link statistics. If the ioctls are unavailable, /proc/net/wireless alone decides whether the
+    interface is wireless and associated, and the SSID is unknown.
+
+    Args:
+        interface (str): the name of an interface.
+        proc_stats (dict | None, optional): parsed /proc/net/wireless, to share one read between interfaces. Defaults
+            to reading it.
+
+    Returns:
+        WirelessInfo: wireless state. is_wireless is False for wired or missing interfaces.
+    """
+    if proc_stats is None:
+        proc_stats = _read_proc_net_wireless()
+    stats = proc_stats.get(interface)
+    quality, level = (stats[1], stats[2]) if stats is not None else (None, None)
+    try:
+        ssid, associated = _ioctl_wireless(interface)
+    except OSError:
+        if stats is None:
+            return WirelessInfo(interface, is_wireless=False)
+        return WirelessInfo(interface, True, quality > 0, None, quality, level)
+    return WirelessInfo(interface, True, associated, ssid, quality, level)
 
 
 def is_wireless_active(interface: str) -> bool:
     """Check if the interface is an active wireless interface.
 
-    Internally uses iwconfig return code to determine if the interface is wireless.
-
     Args:
         interface (str): the name of an interface.
 
     Returns:
         bool: Interface is wireless and active.
     """
-    try:
-        result = subprocess.run(["iwconfig", interface], capture_output=True, check=False)
-    except FileNotFoundError:
-        # TODO Probably log this
-        return "", False  # iwconfig not present
-    return result.returncode == 0
+    return probe_wireless(interface).is_wireless
 
 
 def get_ssid(interface: str) -> Optional[str]:
@@ -104,12 +252,355 @@ def get_ssid(interface: str) -> Optional[str]:
         interface (str): the name of an interface.
 
     Returns:
-        str | None: ssid of the network interface. If the interface cannot be obtained, False
+        str | None: ssid of the network interface. None if the interface is not wireless or not associated.
     """
-    try:
-        result = subprocess.run(["iwgetid", interface, "-r"], capture_output=True, check=True)
-    except (FileNotFoundError, subprocess.CalledProcessError):
-        # TODO Log this
-        return None
-    output = result.stdout.decode("utf-8").strip()
-    return output if len(output) > 0 else None
+    info = probe_wireless(interface)
+    return info.ssid if info.is_associated else None
+
+
+@dataclass(frozen=True)
+class InterfaceAddresses:
+    """Link and IPv4 addresses of a single interface."""
+
+    name: str
+    mac: Optional[str]
+    ipv4: Tuple[str, ...]
+
+    @property
+    def ip(self) -> Optional[str]:
+        """Get the first IPv4 address, or None if there is none."""
+        return self.ipv4[0] if self.ipv4 else None  # TODO account for multiple addresses
+
+
+@dataclass(frozen=True)
+class NetworkSnapshot:
+    """Interfaces, addresses, default gateway and wireless state of the device, captured in one pass.
+
+    Request generation reads every network field from one snapshot instead of querying the system once per field.
+    """
+
+    interfaces: Dict[str, InterfaceAddresses]
+    default_gateway: Optional[Tuple[str, str]]
+    wireless: Dict[str, WirelessInfo]
+
+    @classmethod
+    def capture(cls, wireless: bool = True) -> "NetworkSnapshot":
+        """Capture the current network state.
+
+        Args:
+            wireless (bool, optional): also probe the wireless state of every interface. Defaults to True.
+
+        Returns:
+            NetworkSnapshot: the captured state.
+        """
+        interfaces = {}
+        for name in netifaces.interfaces():
+            addrs = netifaces.ifaddresses(name)
+            link = addrs.get(netifaces.AF_LINK, [])
+            interfaces[name] = InterfaceAddresses(
+                name,
+                link[0].get("addr") if link else None,
+                tuple(info["addr"] for info in addrs.get(netifaces.AF_INET, []) if "addr" in info),
+            )
+        default_gateway = netifaces.gateways().get("default", {}).get(netifaces.AF_INET)
+
+        probes = {}
+        if wireless:
+            proc_stats = _read_proc_net_wireless()
+            probes = {name: probe_wireless(name, proc_stats) for name in interfaces}
+        return cls(interfaces, tuple(default_gateway[:2]) if default_gateway else None, probes)
+
+    @property
+    def default_interface(self) -> Optional[str]:
+        """Get the interface of the default IPv4 gateway, or None if there is none."""
+        return self.default_gateway[1] if self.default_gateway else None
+
+    def get_interface_ip(self, interface: str) -> Optional[str]:
+        """Get the IP address linked to an interface, or None if it has none or does not exist."""
+        iface = self.interfaces.get(interface)
+        return iface.ip if iface is not None else None
+
+    def get_mac(self, interface: str) -> str:
+        """Get the MAC address of an interface.
+
+        Raises:
+            RuntimeError: the interface does not exist or has no MAC address.
+        """
+        iface = self.interfaces.get(interface)
+        if iface is None or iface.mac is None:
+            raise RuntimeError("MAC address could not be found")
+        return iface.mac
+
+    def get_interfaces(self, exclude_loopback: bool = True) -> List[str]:
+        """List the interfaces with an IPv4 address.
+
+        Args:
+            exclude_loopback (bool, optional): exclude interfaces whose address is a loopback address. Defaults to True.
+        """
+        return [
+            name
+            for name, iface in self.interfaces.items()
+            if iface.ip is not None and not (exclude_loopback and ip_address(iface.ip).is_loopback)
+        ]
+
+    def get_wireless(self, interface: str) -> WirelessInfo:
+        """Get the wireless state of an interface, probing it if it was not captured."""
+        info = self.wireless.get(interface)
+        return info if info is not None else probe_wireless(interface)
+
+    def get_ssid(self, interface: str) -> Optional[str]:
+        """Get the SSID of an interface, or None if it is not wireless or not associated."""
+        info = self.get_wireless(interface)
+        return info.ssid if info.is_associated else None
+
+
+@dataclass(frozen=True)
+class InterfaceState:
+    """Link-level and IPv4 state of a single interface, as reported by rtnetlink."""
+
+    name: str
+    mac: Optional[str]
+    is_up: bool
+    addresses: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class NetlinkSnapshot:
+    """Point-in-time view of the interfaces and default route tracked by a NetlinkMonitor."""
+
+    interfaces: Tuple[InterfaceState, ...]
+    default_gateway: Optional[Tuple[str, str]]
+
+    @property
+    def is_connected(self) -> bool:
+        """Check if any non-loopback interface has an IPv4 address."""
+        return any(not ip_address(addr).is_loopback for iface in self.interfaces for addr in iface.addresses)
+
+
+def _align(length: int) -> int:
+    return (length + 3) & ~3
+
+
+def _parse_attributes(data: bytes, offset: int) -> Dict[int, bytes]:
+    """Parse a run of rtattr structures starting at offset.
+
+    Args:
+        data (bytes): netlink message payload.
+        offset (int): position of the first attribute.
+
+    Returns:
+        dict[int, bytes]: attribute payloads keyed by attribute type.
+    """
+    attrs = {}
+    while offset + _RTATTR.size <= len(data):
+        length, kind = _RTATTR.unpack_from(data, offset)
+        if length < _RTATTR.size:
+            break
+        attrs[kind] = data[offset + _RTATTR.size : offset + length]
+        offset += _align(length)
+    return attrs
+
+
+def _parse_messages(data: bytes) -> Iterator[Tuple[int, int, bytes]]:
+    """Split a netlink datagram into (type, sequence, payload) tuples."""
+    offset = 0
+    while offset + _NLMSGHDR.size <= len(data):
+        length, kind, _, seq, _ = _NLMSGHDR.unpack_from(data, offset)
+        if length < _NLMSGHDR.size:
+            break
+        yield kind, seq, data[offset + _NLMSGHDR.size : offset + length]
+        offset += _align(length)
+
+
+class NetlinkMonitor:
+    """Track interfaces, IPv4 addresses and the default route from rtnetlink notifications.
+
+    The kernel pushes link, address and route changes to the monitor's socket, so the in-memory snapshot stays current
+    without polling. Linux only.
+    """
+
+    def __init__(self):
+        """Open and bind the rtnetlink socket, then load the current state.
+
+        Raises:
+            OSError: the netlink socket could not be opened.
+        """
+        self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, _NETLINK_ROUTE)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, _NETLINK_RCVBUF)
+        self._socket.bind((0, _RTMGRP_LINK | _RTMGRP_IPV4_IFADDR | _RTMGRP_IPV4_ROUTE))
+        self._seq = 0
+        self._links: Dict[int, Tuple[str, Optional[str], bool]] = {}
+        self._addresses: Dict[int, List[str]] = {}
+        self._routes: Dict[Tuple[int, str], int] = {}
+        self.refresh()
+        self._reported = self.snapshot()
+
+    def __enter__(self) -> "NetlinkMonitor":
+        """Use the monitor as a context manager."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the socket when leaving the context."""
+        self.close()
+
+    def close(self):
+        """Close the netlink socket."""
+        self._socket.close()
+
+    def fileno(self) -> int:
+        """Return the socket file descriptor, allowing the monitor to be used with select."""
+        return self._socket.fileno()
+
+    def refresh(self):
+        """Discard the tracked state and reload it with link, address and route dumps.
+
+        The dumps are started again if notifications overflow the socket buffer while they are read.
+        """
+        while True:
+            self._links.clear()
+            self._addresses.clear()
+            self._routes.clear()
+            try:
+                for kind in (_RTM_GETLINK, _RTM_GETADDR, _RTM_GETROUTE):
+                    self._dump(kind)
+                return
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+
+    def snapshot(self) -> NetlinkSnapshot:
+        """Build an immutable snapshot of the tracked state.
+
+        Returns:
+            NetlinkSnapshot: interfaces sorted by name and the default gateway (ip, interface), if any.
+        """
+        interfaces = tuple(
+            sorted(
+                (
+                    InterfaceState(name, mac, is_up, tuple(sorted(self._addresses.get(index, []))))
+                    for index, (name, mac, is_up) in self._links.items()
+                ),
+                key=lambda iface: iface.name,
+            )
+        )
+        gateway = None
+        if len(self._routes) > 0:
+            (index, gateway_ip), _ = min(self._routes.items(), key=lambda item: item[1])
+            if index in self._links:
+                gateway = (gateway_ip, self._links[index][0])
+        return NetlinkSnapshot(interfaces, gateway)
+
+    def poll(self, timeout: Optional[float] = None) -> bool:
+        """Apply any pending notifications.
+
+        Args:
+            timeout (float | None, optional): seconds to wait for the first notification. Waits forever if None.
+
+        If notifications were dropped because the socket buffer overflowed (e.g. a burst of route changes while a long
+        send was running), the state is reloaded with dumps instead.
+
+        Returns:
+            bool: at least one notification was applied, or the state was reloaded.
+        """
+        readable, _, _ = select.select([self._socket], [], [], timeout)
+        if len(readable) == 0:
+            return False
+        while True:
+            try:
+                data = self._socket.recv(65536, socket.MSG_DONTWAIT)
+            except BlockingIOError:
+                return True
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                # the tracked state missed the dropped notifications; next_change() compares the reloaded state with
+                # the last snapshot it returned, so a change made meanwhile is still reported
+                self.refresh()
+                return True
+            for kind, _, payload in _parse_messages(data):
+                self._apply(kind, payload)
+
+    def next_change(self, timeout: Optional[float] = None, settle: float = 0.25) -> Optional[NetlinkSnapshot]:
+        """Wait until the tracked state differs from the last snapshot returned.
+
+        A single reconfiguration (e.g. a DHCP lease) produces a burst of notifications; they are collected for `settle`
+        seconds after the first one so that the burst is reported once.
+
+        Args:
+            timeout (float | None, optional): seconds to wait for a change. Waits forever if None.
+            settle (float, optional): seconds to keep collecting notifications after the first. Defaults to 0.25.
+
+        Returns:
+            NetlinkSnapshot | None: the state after the change, or None if there was none within timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            if not self.poll(None if deadline is None else max(0.0, deadline - time.monotonic())):
+                return None
+            settled = time.monotonic() + settle
+            while time.monotonic() < settled:
+                self.poll(settled - time.monotonic())
+            current = self.snapshot()
+            if current != self._reported:
+                self._reported = current
+                return current
+
+    def _dump(self, kind: int):
+        """Request a dump of one object type and apply every reply."""
+        self._seq += 1
+        header = _NLMSGHDR.pack(
+            _NLMSGHDR.size + _RTGENMSG.size, kind, _NLM_F_REQUEST | _NLM_F_DUMP, self._seq, os.getpid()
+        )
+        self._socket.send(header + _RTGENMSG.pack(socket.AF_INET if kind != _RTM_GETLINK else socket.AF_UNSPEC))
+        while True:
+            data = self._socket.recv(65536)
+            for msg_kind, seq, payload in _parse_messages(data):
+                if seq == self._seq and msg_kind == _NLMSG_DONE:
+                    return
+                if seq == self._seq and msg_kind == _NLMSG_ERROR:
+                    raise OSError("rtnetlink dump failed")
+                self._apply(msg_kind, payload)
+
+    def _apply(self, kind: int, payload: bytes):
+        """Update the tracked state with a single rtnetlink message."""
+        if kind in (_RTM_NEWLINK, _RTM_DELLINK):
+            _, _, index, flags, _ = _IFINFOMSG.unpack_from(payload)
+            if kind == _RTM_DELLINK:
+                self._links.pop(index, None)
+                self._addresses.pop(index, None)
+                self._routes = {key: value for key, value in self._routes.items() if key[0] != index}
+                return
+            attrs = _parse_attributes(payload, _IFINFOMSG.size)
+            name = attrs.get(_IFLA_IFNAME, b"").rstrip(b"\0").decode("utf-8", "replace")
+            mac = attrs.get(_IFLA_ADDRESS)
+            mac_str = ":".join(f"{b:02x}" for b in mac) if mac else None
+            self._links[index] = (name, mac_str, bool(flags & _IFF_UP))
+        elif kind in (_RTM_NEWADDR, _RTM_DELADDR):
+            family, _, _, _, index = _IFADDRMSG.unpack_from(payload)
+            if family != socket.AF_INET:
+                return
+            attrs = _parse_attributes(payload, _IFADDRMSG.size)
+            raw = attrs.get(_IFA_LOCAL, attrs.get(_IFA_ADDRESS))
+            if raw is None:
+                return
+            addr = socket.inet_ntoa(raw)
+            addresses = self._addresses.setdefault(index, [])
+            if kind == _RTM_NEWADDR and addr not in addresses:
+                addresses.append(addr)
+            elif kind == _RTM_DELADDR and addr in addresses:
+                addresses.remove(addr)
+        elif kind in (_RTM_NEWROUTE, _RTM_DELROUTE):
+            family, dst_len, _, _, table, _, _, route_type, _ = _RTMSG.unpack_from(payload)
+            if family != socket.AF_INET or dst_len != 0 or route_type != _RTN_UNICAST:
+                return
+            attrs = _parse_attributes(payload, _RTMSG.size)
+            if _RTA_TABLE in attrs:
+                table = struct.unpack("=I", attrs[_RTA_TABLE])[0]
+            if table != _RT_TABLE_MAIN or _RTA_GATEWAY not in attrs or _RTA_OIF not in attrs:
+                return
+            key = (struct.unpack("=i", attrs[_RTA_OIF])[0], socket.inet_ntoa(attrs[_RTA_GATEWAY]))
+            if kind == _RTM_DELROUTE:
+                self._routes.pop(key, None)
+            else:
+                metric = struct.unpack("=I", attrs[_RTA_PRIORITY])[0] if _RTA_PRIORITY in attrs else 0
+                self._routes[key] = metric
@@ -0,0 +1,97 @@
+"""The network profile pushed by the server: fetched when the hash in a status response changes, and applied."""
+
+import hashlib
+import os
+from typing import TYPE_CHECKING, List, Optional
+
+from util.config import Config
+from util.http_sender import get
+
+if TYPE_CHECKING:
+    from util.network_import import ImportResult
+
+
+class NetworkProfile:
+    """The hash of the last applied network profile, kept in ROOT_DIR.
+
+    A status response names the current profile by its content hash. The profile is only fetched when that hash
+    differs from the applied one, with the applied hash as If-None-Match, so a device that is up to date sends no
+    extra request, and one that saw a stale hash gets a bodiless 304.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Open the profile state; the file is read on use.
+
+        Args:
+            path (str | None, optional): file holding the applied hash. Defaults to ROOT_DIR/network_profile.etag.
+        """
+        self._path = path
+
+    @property
+    def path(self) -> str:
+        """Get the file holding the applied hash."""
+        return self._path if self._path is not None else os.path.join(Config.ROOT_DIR, "network_profile.etag")
+
+    def applied_hash(self) -> Optional[str]:
+        """Get the hash of the last applied profile, or None if none has been applied."""
+        try:
+            with open(self.path) as fin:
+                return fin.read().strip() or None
+        except OSError:
+            return None
+
+    def _record(self, profile_hash: str):
+        tmp_path = self.path + ".tmp"
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(tmp_path, "w") as fout:
+            fout.write(profile_hash + "\n")
+            fout.flush()
+            os.fsync(fout.fileno())
+        os.replace(tmp_path, self.path)
+
+    def sync(
+        self, profile_hash: Optional[str], devid: str, url: Optional[str] = None
+    ) -> Optional[List["ImportResult"]]:
+        """Fetch and apply the current profile if it differs from the applied one.
+
+        The networks of the profile are added, or updated if their settings changed, with network_import. Networks
+        that are not in the profile (e.g. home networks) are left alone.
+
+        Args:
+            profile_hash (str | None): hash from a status response; None if the server has no profile.
+            devid (str): device ID, which authorizes the request.
+            url (str | None, optional): profile url. Defaults to Config.API_PROFILE_URL.
+
+        Returns:
+            list[ImportResult] | None: the result of each network, or None if nothing was applied.
+
+        Raises:
+            OSError: on connection failure, or the wpa config or the applied hash could not be written.
+            http.client.HTTPException: the server's response is not valid HTTP.
+            ValueError: the server refused the request, or the profile does not match its hash.
+            subprocess.CalledProcessError: wpa_cli's reconfigure failed.
+        """
+        if profile_hash is None:
+            return None
+        applied = self.applied_hash()
+        if profile_hash == applied:
+            return None
+        headers = {"devid": devid}
+        if applied is not None:
+            headers["If-None-Match"] = f'"{applied}"'
+        resp = get(url or Config.API_PROFILE_URL, Config.REQUEST_TIMEOUT, headers)
+        if resp.status_code == 304:
+            return None  # the profile changed back before it was fetched
+        if not resp.ok:
+            raise ValueError(f"network profile request failed with status {resp.status_code}")
+        fetched_hash = hashlib.sha256(resp.content).hexdigest()
+        tag = resp.headers.get("etag", "")
+        if (tag[2:] if tag.startswith("W/") else tag).strip('"') != fetched_hash:
+            raise ValueError("network profile does not match its hash")
+        # deferred: network_import loads the wpa modules, which only a changed profile needs
+        from util import network_import
+
+        lines = resp.content.decode("utf-8").splitlines(keepends=True)
+        results = network_import.import_networks(network_import.parse_entries(lines))
+        self._record(fetched_hash)
+        return results
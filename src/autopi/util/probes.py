@@ -0,0 +1,136 @@
+"""Concurrent probes of device state, each with its own timeout and a cached last-known value."""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional
+
+from util.config import Config
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    """Outcome of running one probe."""
+
+    name: str
+    value: object
+    latency: float
+    timed_out: bool = False
+    stale: bool = False
+    error: Optional[BaseException] = None
+
+
+@dataclass(frozen=True)
+class _Probe:
+    name: str
+    func: Callable[[], object]
+    timeout: float
+
+
+class ProbeRegistry:
+    """Named probes, run concurrently.
+
+    Each probe runs in its own daemon thread, so a hung probe (e.g. a wedged subprocess) neither delays the other probes
+    beyond their own timeout nor keeps the process from exiting. A probe that times out reports the last value it
+    returned, kept in RUN_DIR between runs.
+    """
+
+    def __init__(self, cache_path: Optional[str] = None):
+        """Create an empty registry.
+
+        Args:
+            cache_path (str | None, optional): file for the last-known values. Defaults to RUN_DIR/probes.json.
+        """
+        self._cache_path = cache_path
+        self._probes: Dict[str, _Probe] = {}
+
+    def register(self, name: str, timeout: float = Config.PROBE_TIMEOUT) -> Callable:
+        """Register a probe; use as a decorator on a function without arguments.
+
+        Args:
+            name (str): name of the probe, usually the request field it produces.
+            timeout (float, optional): seconds to wait for the probe. Defaults to Config.PROBE_TIMEOUT.
+        """
+
+        def decorator(func: Callable[[], object]) -> Callable[[], object]:
+            self._probes[name] = _Probe(name, func, timeout)
+            return func
+
+        return decorator
+
+    def run(self, names: Optional[Iterable[str]] = None) -> Dict[str, ProbeResult]:
+        """Run probes concurrently.
+
+        Waiting ends when every probe has finished or reached its timeout, so the run takes as long as the slowest probe,
+        at most the largest timeout.
+
+        Args:
+            names (Iterable[str] | None, optional): probes to run. Defaults to all registered probes.
+
+        Returns:
+            dict[str, ProbeResult]: result of each probe, keyed by name. A probe that raised carries the exception in
+            error; a probe that timed out carries its last-known value (None if there is none) and is marked stale.
+        """
+        probes = [self._probes[name] for name in (self._probes if names is None else names)]
+        outcomes: Dict[str, tuple] = {}
+
+        def target(probe: _Probe):
+            start = time.perf_counter()
+            try:
+                outcomes[probe.name] = (probe.func(), None, time.perf_counter() - start)
+            except Exception as e:
+                outcomes[probe.name] = (None, e, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        threads = []
+        for probe in probes:
+            thread = threading.Thread(target=target, args=(probe,), name=f"probe-{probe.name}", daemon=True)
+            thread.start()
+            threads.append((probe, thread))
+
+        results = {}
+        cache = None
+        for probe, thread in sorted(threads, key=lambda item: item[0].timeout):
+            thread.join(max(0.0, start + probe.timeout - time.perf_counter()))
+            outcome = outcomes.get(probe.name)
+            if outcome is None:
+                if cache is None:
+                    cache = self._load_cache()
+                latency = time.perf_counter() - start
+                results[probe.name] = ProbeResult(
+                    probe.name, cache.get(probe.name), latency, timed_out=True, stale=True
+                )
+            else:
+                value, error, latency = outcome
+                results[probe.name] = ProbeResult(probe.name, value, latency, error=error)
+        self._save_cache(results)
+        return results
+
+    @property
+    def cache_path(self) -> str:
+        """Get the file for the last-known values."""
+        return self._cache_path if self._cache_path is not None else os.path.join(Config.RUN_DIR, "probes.json")
+
+    def _load_cache(self) -> dict:
+        try:
+            with open(self.cache_path) as fin:
+                return json.load(fin)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, results: Dict[str, ProbeResult]):
+        """Remember the values of probes that succeeded, if any of them changed."""
+        fresh = {name: r.value for name, r in results.items() if not r.stale and r.error is None}
+        cache = self._load_cache()
+        if all(cache.get(name) == value for name, value in fresh.items()):
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = self.cache_path + ".tmp"
+            with open(tmp_path, "w") as fout:
+                json.dump({**cache, **fresh}, fout)
+            os.replace(tmp_path, self.cache_path)
+        except (OSError, TypeError, ValueError):
+            pass  # not critical; timed out probes report no value instead
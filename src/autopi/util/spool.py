@@ -0,0 +1,127 @@
+"""A durable, size-capped queue of requests that could not be sent."""
+
+import json
+import os
+import random
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from util.config import Config
+
+
+def _write_atomic(path: Path, contents: str):
+    """Replace a file's contents so that a power loss leaves either the old or the new version."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w") as fout:
+        fout.write(contents)
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(tmp_path, path)
+
+
+class Spool:
+    """Requests waiting to be replayed, oldest first.
+
+    Each request is stored as a JSON line with the time it was spooled. Only the latest keepalive is kept, since older
+    keepalives carry no information the latest does not. When the spool exceeds its size cap, the oldest requests are
+    dropped. Replay attempts are spaced with exponential backoff and full jitter, persisted between runs.
+    """
+
+    def __init__(
+        self,
+        path: Path = Path(Config.ROOT_DIR) / "spool.jsonl",
+        max_bytes: int = Config.SPOOL_MAX_BYTES,
+    ):
+        """Open a spool.
+
+        Args:
+            path (Path, optional): spool file. The backoff state is kept next to it. Defaults to ROOT_DIR/spool.jsonl.
+            max_bytes (int, optional): size cap of the spool file. Defaults to Config.SPOOL_MAX_BYTES.
+        """
+        self._path = Path(path)
+        self._state_path = self._path.with_name(self._path.stem + "_backoff.json")
+        self._max_bytes = max_bytes
+
+    def requests(self) -> List[dict]:
+        """Load the spooled requests.
+
+        Returns:
+            list[dict]: requests in the order they were spooled. Corrupt lines are skipped.
+        """
+        try:
+            with open(self._path) as fin:
+                lines = fin.readlines()
+        except FileNotFoundError:
+            return []
+        requests = []
+        for line in lines:
+            try:
+                requests.append(json.loads(line))
+            except ValueError:
+                continue  # partially written line
+        return requests
+
+    def is_empty(self) -> bool:
+        """Check if there are no spooled requests."""
+        return not self._path.exists() or self._path.stat().st_size == 0
+
+    def append(self, request: dict):
+        """Spool a request, collapsing stale keepalives and enforcing the size cap.
+
+        Args:
+            request (dict): request to spool. A 'timestamp' field (seconds since the epoch) is added if missing.
+
+        Raises:
+            OSError: spool could not be written.
+        """
+        request = {"timestamp": time.time(), **request}
+        requests = self.requests()
+        if request.get("event") == "keepalive":
+            requests = [r for r in requests if r.get("event") != "keepalive"]
+        lines = [json.dumps(r, separators=(",", ":")) + "\n" for r in requests + [request]]
+
+        size = sum(len(line) for line in lines)
+        while size > self._max_bytes and len(lines) > 1:
+            size -= len(lines.pop(0))
+
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(self._path, "".join(lines))
+
+    def is_ready(self, now: Optional[float] = None) -> bool:
+        """Check if the backoff delay since the last failed replay has elapsed.
+
+        Args:
+            now (float | None, optional): current time. Defaults to time.time().
+        """
+        now = time.time() if now is None else now
+        return now >= self._load_state().get("next_attempt", 0)
+
+    def record_failure(self, now: Optional[float] = None):
+        """Schedule the next replay attempt after a failure.
+
+        The delay is drawn uniformly from [0, min(cap, base * 2**failures)).
+
+        Args:
+            now (float | None, optional): current time. Defaults to time.time().
+        """
+        now = time.time() if now is None else now
+        failures = self._load_state().get("failures", 0) + 1
+        delay = min(Config.SPOOL_BACKOFF_CAP, Config.SPOOL_BACKOFF_BASE * 2**failures)
+        state = {"failures": failures, "next_attempt": now + random.uniform(0, delay)}
+        _write_atomic(self._state_path, json.dumps(state))
+
+    def clear(self):
+        """Remove all spooled requests and reset the backoff after a successful replay."""
+        for path in (self._path, self._state_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self._state_path) as fin:
+                return json.load(fin)
+        except (OSError, ValueError):
+            return {}
@@ -0,0 +1,124 @@
+"""Last-request state kept in RAM, persisted to the SD card only when it changes."""
+
+import json
+import os
+from hashlib import sha256
+from typing import Optional
+
+from util.config import Config
+
+
+def state_digest(state: dict) -> str:
+    """Compute the SHA-256 hex digest of a state, independent of field order."""
+    canonical = json.dumps(state, sort_keys=True, separators=(",", ":"))
+    return sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path: str, contents: str, sync: bool):
+    """Replace a file's contents with a rename, so readers see either the old or the new version."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as fout:
+        fout.write(contents)
+        if sync:
+            fout.flush()
+            os.fsync(fout.fileno())
+    os.replace(tmp_path, path)
+
+
+class StateStore:
+    """The state sent in the last request.
+
+    The working copy lives in RUN_DIR (tmpfs): its first line is the digest of the state and its second line the state
+    as JSON, so checking for a change reads one short line. The copy in ROOT_DIR (SD card) is only rewritten when the
+    state changes, or by persist at shutdown if it is out of date. After a reboot, the working copy is seeded from the
+    SD card copy.
+    """
+
+    def __init__(
+        self, name: str = "old_request.json", run_dir: Optional[str] = None, persist_dir: Optional[str] = None
+    ):
+        """Open a store.
+
+        Args:
+            name (str, optional): file name of the SD card copy. Defaults to old_request.json.
+            run_dir (str | None, optional): directory of the working copy. Defaults to Config.RUN_DIR.
+            persist_dir (str | None, optional): directory of the SD card copy. Defaults to Config.ROOT_DIR.
+        """
+        self._name = name
+        self._run_dir = run_dir
+        self._persist_dir = persist_dir
+
+    @property
+    def path(self) -> str:
+        """Get the path of the working copy."""
+        return os.path.join(self._run_dir or Config.RUN_DIR, self._name + ".state")
+
+    @property
+    def persist_path(self) -> str:
+        """Get the path of the SD card copy."""
+        return os.path.join(self._persist_dir or Config.ROOT_DIR, self._name)
+
+    def update(self, state: dict, force: bool = False) -> bool:
+        """Record the state of a new request.
+
+        Args:
+            state (dict): the request state.
+            force (bool, optional): record the state without reporting it as unchanged. Defaults to False.
+
+        Returns:
+            bool: the state is the same as the last recorded one (always False if force is set).
+
+        Raises:
+            OSError: the working copy or the SD card copy could not be written.
+        """
+        digest = state_digest(state)
+        unchanged = self._read_digest() == digest
+        if not unchanged:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            contents = json.dumps(state)
+            _write_atomic(self.path, digest + "\n" + contents + "\n", sync=False)
+            os.makedirs(os.path.dirname(self.persist_path), exist_ok=True)
+            _write_atomic(self.persist_path, contents, sync=True)
+        return unchanged and not force
+
+    def persist(self):
+        """Write the working copy to the SD card if the SD card copy differs, e.g. at shutdown.
+
+        Raises:
+            OSError: the SD card copy could not be written.
+        """
+        try:
+            with open(self.path) as fin:
+                digest = fin.readline().strip()
+                contents = fin.readline().strip()
+        except FileNotFoundError:
+            return
+        if contents and digest != self._read_persisted_digest():
+            _write_atomic(self.persist_path, contents, sync=True)
+
+    def _read_digest(self) -> Optional[str]:
+        """Read the digest of the working copy, seeding it from the SD card copy after a reboot."""
+        try:
+            with open(self.path) as fin:
+                return fin.readline().strip() or None
+        except FileNotFoundError:
+            pass
+        try:
+            with open(self.persist_path) as fin:
+                state = json.load(fin)
+        except (OSError, ValueError):
+            return None
+        digest = state_digest(state)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            _write_atomic(self.path, digest + "\n" + json.dumps(state) + "\n", sync=False)
+        except OSError:
+            pass  # compared again from the SD card copy next time
+        return digest
+
+    def _read_persisted_digest(self) -> Optional[str]:
+        try:
+            with open(self.persist_path) as fin:
+                return state_digest(json.load(fin))
+        except (OSError, ValueError):
+            return None
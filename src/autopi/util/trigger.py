@@ -0,0 +1,104 @@
+"""Event triggers from hooks, coalesced into one request by a single sender."""
+
+import fcntl
+import os
+from typing import List, Optional
+
+from util.config import Config
+
+
+def _trigger_dir() -> str:
+    return os.path.join(Config.RUN_DIR, "triggers")
+
+
+def drop(event: str):
+    """Record that an event happened, for the running or next sender to report.
+
+    A trigger is an empty file named after the event, so dropping the same event twice leaves one trigger.
+
+    Raises:
+        OSError: the trigger could not be created.
+    """
+    os.makedirs(_trigger_dir(), exist_ok=True)
+    with open(os.path.join(_trigger_dir(), event), "a"):
+        pass
+
+
+def pending() -> bool:
+    """Check if any trigger is waiting to be reported."""
+    try:
+        return bool(os.listdir(_trigger_dir()))
+    except FileNotFoundError:
+        return False
+
+
+def collect() -> List[str]:
+    """Take the pending triggers.
+
+    Returns:
+        list[str]: the events, sorted; each is removed, so it is reported once.
+    """
+    try:
+        names = os.listdir(_trigger_dir())
+    except FileNotFoundError:
+        return []
+    events = []
+    for name in names:
+        try:
+            os.remove(os.path.join(_trigger_dir(), name))
+        except FileNotFoundError:
+            continue  # taken by another process
+        events.append(name)
+    return sorted(events)
+
+
+class SenderLock:
+    """An exclusive lock held while sending requests, so that only one sender runs at a time.
+
+    The lock is an flock on a file in RUN_DIR, released by the kernel if the holder dies.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Create an unlocked lock.
+
+        Args:
+            path (str | None, optional): lock file. Defaults to RUN_DIR/sender.lock.
+        """
+        self._path = path
+        self._fd: Optional[int] = None
+
+    @property
+    def path(self) -> str:
+        """Get the lock file."""
+        return self._path if self._path is not None else os.path.join(Config.RUN_DIR, "sender.lock")
+
+    def acquire(self, blocking: bool = True) -> bool:
+        """Take the lock.
+
+        Args:
+            blocking (bool, optional): wait for the current holder to release it. Defaults to True.
+
+        Returns:
+            bool: the lock was taken; False only if not blocking and another sender holds it.
+
+        Raises:
+            OSError: the lock file could not be opened.
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        except BaseException:
+            os.close(fd)
+            raise
+        self._fd = fd
+        return True
+
+    def release(self):
+        """Release the lock, if held."""
+        if self._fd is not None:
+            os.close(self._fd)  # closing the only descriptor releases the flock
+            self._fd = None
@@ -0,0 +1,290 @@
+"""A parsed model of a wpa_supplicant config file that serializes back to the same text."""
+
+import os
+import tempfile
+from typing import Dict, List, Optional, Union
+
+_NETWORK_START = "network={"
+_NETWORK_END = "}"
+
+
+def _is_blank(line: str) -> bool:
+    return len(line) == 0 or line.isspace()
+
+
+def _is_comment(line: str) -> bool:
+    return line.strip().startswith("#")
+
+
+def _split_setting(line: str) -> Optional[tuple]:
+    """Split a `key=value` line into its stripped key and raw value, or None if it is not a setting."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#") or "=" not in stripped:
+        return None
+    key, value = stripped.split("=", 1)
+    return key.strip(), value
+
+
+def _decode_ssid(value: str) -> str:
+    """Decode an ssid value: a quoted string, or hex-encoded bytes."""
+    if len(value) >= 2 and value.startswith('"') and value.endswith('"'):
+        return value[1:-1]
+    try:
+        return bytes.fromhex(value).decode("utf-8", errors="replace")
+    except ValueError:
+        return value
+
+
+class NetworkBlock:
+    """A `network={...}` block, kept as its original lines."""
+
+    def __init__(self, lines: List[str]):
+        """Create a block.
+
+        Args:
+            lines (list[str]): lines from `network={` to `}`, with their line endings.
+        """
+        self.lines = lines
+
+    def get(self, key: str) -> Optional[str]:
+        """Get the raw value of a setting (e.g. `"name"` with its quotes), or None if it is not set."""
+        for line in self.lines[1:]:
+            setting = _split_setting(line)
+            if setting is not None and setting[0] == key:
+                return setting[1]
+        return None
+
+    def set(self, key: str, value: str):
+        """Set the raw value of a setting, replacing it or adding it before the closing brace."""
+        for i, line in enumerate(self.lines[1:], start=1):
+            setting = _split_setting(line)
+            if setting is not None and setting[0] == key:
+                indent = line[: len(line) - len(line.lstrip())]
+                self.lines[i] = f"{indent}{key}={value}\n"
+                return
+        end = len(self.lines)
+        if end > 1 and self.lines[-1].strip() == _NETWORK_END:
+            end -= 1
+            if not self.lines[end - 1].endswith("\n"):
+                self.lines[end - 1] += "\n"
+        self.lines.insert(end, f"\t{key}={value}\n")
+
+    def settings(self) -> List[tuple]:
+        """Get the (key, raw value) pairs of the block, in order, without comments."""
+        return [setting for setting in map(_split_setting, self.lines[1:]) if setting is not None]
+
+    @property
+    def ssid(self) -> Optional[str]:
+        """Get the decoded SSID, or None if the block has none."""
+        value = self.get("ssid")
+        return None if value is None else _decode_ssid(value)
+
+    def normalized(self, ignore_comments: bool = True, ignore_empty_lines: bool = True) -> List[str]:
+        """Get the stripped lines of the block, for comparing blocks regardless of formatting."""
+        lines = [line.strip() for line in self.lines]
+        if ignore_comments:
+            lines = [line for line in lines if not line.startswith("#")]
+        if ignore_empty_lines:
+            lines = [line for line in lines if line]
+        return lines
+
+    @property
+    def text(self) -> str:
+        """Get the block as text."""
+        return "".join(self.lines)
+
+
+class WpaConfig:
+    """A wpa_supplicant config: a header of global settings followed by network blocks.
+
+    The file is kept as a sequence of raw lines and network blocks, so dumps gives back the parsed text exactly; only
+    the parts that are changed are rewritten. Blocks are indexed by SSID.
+    """
+
+    def __init__(self, segments: List[Union[str, NetworkBlock]]):
+        """Create a config from its parsed parts; see parse."""
+        self._segments = segments
+        self._index: Optional[Dict[str, List[NetworkBlock]]] = None
+
+    @classmethod
+    def parse(cls, text: str) -> "WpaConfig":
+        """Parse the text of a config.
+
+        Blocks are line based, as in wpa_supplicant: a block starts at a `network={` line and ends at a line that is
+        only `}`, so quotes and braces inside values do not matter. A block that is not closed ends at the end of the
+        text.
+        """
+        segments: List[Union[str, NetworkBlock]] = []
+        block: Optional[List[str]] = None
+        for line in text.splitlines(keepends=True):
+            if block is None:
+                if line.strip() == _NETWORK_START:
+                    block = [line]
+                else:
+                    segments.append(line)
+            else:
+                block.append(line)
+                if line.strip() == _NETWORK_END:
+                    segments.append(NetworkBlock(block))
+                    block = None
+        if block is not None:
+            segments.append(NetworkBlock(block))
+        return cls(segments)
+
+    @classmethod
+    def load(cls, config_file: str) -> "WpaConfig":
+        """Read and parse a config file.
+
+        Raises:
+            OSError: config_file could not be read.
+        """
+        with open(config_file, "r") as fin:
+            return cls.parse(fin.read())
+
+    def dumps(self) -> str:
+        """Serialize the config to text."""
+        return "".join(s.text if isinstance(s, NetworkBlock) else s for s in self._segments)
+
+    def save(self, config_file: str):
+        """Write the config to a file atomically.
+
+        The text is written to a temporary file in the same directory, flushed to disk and renamed over config_file, so
+        a crash or power loss leaves either the old or the new config. The mode and owner of an existing file are kept.
+
+        Raises:
+            OSError: config_file could not be written.
+        """
+        directory = os.path.dirname(os.path.abspath(config_file))
+        fd, tmp_path = tempfile.mkstemp(prefix=".wpa_config.", dir=directory)
+        try:
+            with os.fdopen(fd, "w") as fout:
+                fout.write(self.dumps())
+                fout.flush()
+                try:
+                    stat = os.stat(config_file)
+                except FileNotFoundError:
+                    os.fchmod(fout.fileno(), 0o600)  # may hold network passwords
+                else:
+                    os.fchmod(fout.fileno(), stat.st_mode & 0o7777)
+                    if os.geteuid() == 0:
+                        os.fchown(fout.fileno(), stat.st_uid, stat.st_gid)
+                os.fsync(fout.fileno())
+            os.replace(tmp_path, config_file)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)  # make the rename durable
+        finally:
+            os.close(dir_fd)
+
+    @property
+    def networks(self) -> List[NetworkBlock]:
+        """Get the network blocks, in file order."""
+        return [s for s in self._segments if isinstance(s, NetworkBlock)]
+
+    def _header_end(self) -> int:
+        return next((i for i, s in enumerate(self._segments) if isinstance(s, NetworkBlock)), len(self._segments))
+
+    @property
+    def header(self) -> List[str]:
+        """Get the lines before the first network block."""
+        return self._segments[: self._header_end()]
+
+    def find(self, ssid: str) -> List[NetworkBlock]:
+        """Get the network blocks with an SSID, in file order."""
+        if self._index is None:
+            self._index = {}
+            for network in self.networks:
+                if network.ssid is not None:
+                    self._index.setdefault(network.ssid, []).append(network)
+        return list(self._index.get(ssid, []))
+
+    def has_network(self, network_config: str, ignore_comments: bool = True, ignore_empty_lines: bool = True) -> bool:
+        """Check if every block of a network config is already in the config, ignoring indentation.
+
+        Args:
+            network_config (str): one or more network blocks.
+            ignore_comments (bool, optional): exclude lines starting with '#' from the check. Defaults to True.
+            ignore_empty_lines (bool, optional): exclude empty lines from the check. Defaults to True.
+        """
+        existing = [network.normalized(ignore_comments, ignore_empty_lines) for network in self.networks]
+        wanted = WpaConfig.parse(network_config).networks
+        return bool(wanted) and all(w.normalized(ignore_comments, ignore_empty_lines) in existing for w in wanted)
+
+    def add(self, network_config: str, drop_comments: bool = True):
+        """Append a network config (one or more blocks) after a blank line.
+
+        Args:
+            network_config (str): network config to add.
+            drop_comments (bool, optional): leave out lines starting with '#'. Defaults to True.
+        """
+        if self._segments and not self.dumps().endswith("\n"):
+            self._segments.append("\n")
+        self._segments.append("\n")
+        added = WpaConfig.parse(network_config.rstrip("\n") + "\n")._segments
+        for segment in added:
+            if isinstance(segment, NetworkBlock):
+                if drop_comments:
+                    segment.lines = [line for line in segment.lines if not _is_comment(line)]
+                self._segments.append(segment)
+            elif not (drop_comments and _is_comment(segment)):
+                self._segments.append(segment)
+        self._index = None
+
+    def remove(self, network: NetworkBlock):
+        """Remove a network block, together with the blank lines just before it.
+
+        Raises:
+            ValueError: the block is not in the config.
+        """
+        i = next((i for i, s in enumerate(self._segments) if s is network), None)
+        if i is None:
+            raise ValueError("network is not in the config")
+        start = i
+        while start > 0 and isinstance(self._segments[start - 1], str) and _is_blank(self._segments[start - 1]):
+            start -= 1
+        del self._segments[start : i + 1]
+        self._index = None
+
+    def remove_ssid(self, ssid: str, all_matches: bool = False) -> int:
+        """Remove the first, or every, network block with an SSID.
+
+        Returns:
+            int: the number of blocks removed.
+        """
+        matches = self.find(ssid)
+        if not all_matches:
+            matches = matches[:1]
+        for network in matches:
+            self.remove(network)
+        return len(matches)
+
+    @property
+    def country(self) -> Optional[str]:
+        """Get the country code, or None if it is not set."""
+        for line in self.header:
+            setting = _split_setting(line)
+            if setting is not None and setting[0] == "country":
+                return setting[1].strip()
+        return None
+
+    @country.setter
+    def country(self, country: str):
+        """Replace the country code, or add it at the end of the header, followed by a blank line."""
+        end = self._header_end()
+        for i in range(end):
+            setting = _split_setting(self._segments[i])
+            if setting is not None and setting[0] == "country":
+                self._segments[i] = f"country={country}\n"
+                return
+        start = end
+        while start > 0 and _is_blank(self._segments[start - 1]):
+            start -= 1
+        if start > 0 and not self._segments[start - 1].endswith("\n"):
+            self._segments[start - 1] += "\n"
+        self._segments[start:end] = [f"country={country}\n", "\n"]
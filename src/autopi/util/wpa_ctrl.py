@@ -0,0 +1,205 @@
+"""A client for the wpa_supplicant control interface, the Unix socket that wpa_cli talks to."""
+
+import itertools
+import os
+import socket
+import tempfile
+from typing import List, Optional, Tuple
+
+from util.config import Config
+
+_counter = itertools.count()
+
+
+class WpaCtrlError(RuntimeError):
+    """wpa_supplicant rejected a command or did not answer."""
+
+
+class WpaCtrl:
+    """A connection to the control socket of one interface.
+
+    Each command is one datagram and the reply is one datagram, as with wpa_cli. The client binds its own socket
+    (in the temporary directory) so that wpa_supplicant can address the reply. Unsolicited event messages, which
+    start with "<", are skipped.
+
+    Example:
+        with WpaCtrl("wlan0") as ctrl:
+            ctrl.reconfigure()
+    """
+
+    def __init__(self, interface: str = Config.DEFAULT_WIRELESS_INTERFACE, ctrl_dir: Optional[str] = None):
+        """Create a client; the socket is opened on entry or by open.
+
+        Args:
+            interface (str, optional): interface to control. Defaults to Config.DEFAULT_WIRELESS_INTERFACE.
+            ctrl_dir (str | None, optional): directory of the control sockets. Defaults to Config.WPA_CTRL_DIR.
+        """
+        self.interface = interface
+        self.path = os.path.join(ctrl_dir or Config.WPA_CTRL_DIR, interface)
+        self._sock: Optional[socket.socket] = None
+        self._local_path: Optional[str] = None
+
+    def open(self):
+        """Connect to the control socket.
+
+        Raises:
+            OSError: the socket does not exist (wpa_supplicant is not running for the interface) or is not accessible.
+        """
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        local_path = os.path.join(tempfile.gettempdir(), f"autopi_wpa_ctrl_{os.getpid()}-{next(_counter)}")
+        try:
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            sock.bind(local_path)
+            sock.settimeout(Config.WPA_CTRL_TIMEOUT)
+            sock.connect(self.path)
+        except BaseException:
+            sock.close()
+            if os.path.exists(local_path):
+                os.remove(local_path)
+            raise
+        self._sock, self._local_path = sock, local_path
+
+    def close(self):
+        """Close the connection and remove the client socket."""
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+        if self._local_path is not None:
+            try:
+                os.remove(self._local_path)
+            except FileNotFoundError:
+                pass
+            self._local_path = None
+
+    def __enter__(self) -> "WpaCtrl":
+        """Connect to the control socket."""
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        """Close the connection."""
+        self.close()
+
+    def request(self, command: str) -> str:
+        """Send a command and return its reply.
+
+        After a timeout, the client socket is closed and the next command binds a new one, so that a late reply is not
+        read as the reply to the next command.
+
+        Raises:
+            OSError: the command could not be sent.
+            WpaCtrlError: no reply came within Config.WPA_CTRL_TIMEOUT.
+        """
+        if self._sock is None:
+            self.open()
+        self._sock.send(command.encode("utf-8"))
+        while True:
+            try:
+                reply = self._sock.recv(4096).decode("utf-8", errors="replace")
+            except socket.timeout:
+                self.close()
+                raise WpaCtrlError(f"no reply to {command.split(' ', 1)[0]}") from None
+            if not reply.startswith("<"):
+                return reply
+
+    def _request_ok(self, command: str):
+        reply = self.request(command)
+        if reply.strip() != "OK":
+            raise WpaCtrlError(f"{command.split(' ', 1)[0]} failed: {reply.strip()}")
+
+    def reconfigure(self):
+        """Make wpa_supplicant re-read its config file, which re-associates the interface.
+
+        Raises:
+            WpaCtrlError: the command failed.
+        """
+        self._request_ok("RECONFIGURE")
+
+    def add_network(self) -> int:
+        """Create an empty, disabled network.
+
+        Returns:
+            int: the network ID.
+
+        Raises:
+            WpaCtrlError: the command failed.
+        """
+        reply = self.request("ADD_NETWORK").strip()
+        if not reply.isdigit():
+            raise WpaCtrlError(f"ADD_NETWORK failed: {reply}")
+        return int(reply)
+
+    def set_network(self, network_id: int, key: str, value: str):
+        """Set a network setting, with the value written as in the config file (e.g. `"name"` for an SSID).
+
+        Raises:
+            WpaCtrlError: the command failed, e.g. the value is invalid.
+        """
+        self._request_ok(f"SET_NETWORK {network_id} {key} {value}")
+
+    def enable_network(self, network_id: int):
+        """Enable a network; this does not disturb the current association.
+
+        Raises:
+            WpaCtrlError: the command failed.
+        """
+        self._request_ok(f"ENABLE_NETWORK {network_id}")
+
+    def remove_network(self, network_id: int):
+        """Remove a network.
+
+        Raises:
+            WpaCtrlError: the command failed.
+        """
+        self._request_ok(f"REMOVE_NETWORK {network_id}")
+
+    def save_config(self):
+        """Make wpa_supplicant write its current networks to its config file (needs update_config=1).
+
+        Raises:
+            WpaCtrlError: the command failed.
+        """
+        self._request_ok("SAVE_CONFIG")
+
+    def add_network_settings(self, settings: List[Tuple[str, str]], save: bool = False) -> int:
+        """Add and enable a network without reconfiguring, so the current association is kept.
+
+        A network that cannot be fully set up is removed again.
+
+        Args:
+            settings (list[tuple[str, str]]): (key, value) pairs, with values written as in the config file.
+            save (bool, optional): also write the config file from wpa_supplicant (see save_config). Defaults to False.
+
+        Returns:
+            int: the network ID.
+
+        Raises:
+            WpaCtrlError: a command failed.
+        """
+        network_id = self.add_network()
+        try:
+            for key, value in settings:
+                self.set_network(network_id, key, value)
+            self.enable_network(network_id)
+        except WpaCtrlError:
+            self.remove_network(network_id)
+            raise
+        if save:
+            self.save_config()
+        return network_id
+
+
+def default_interface(ctrl_dir: Optional[str] = None) -> Optional[str]:
+    """Get the interface wpa_cli uses when none is given: the first with a control socket that is not a P2P device.
+
+    Returns:
+        str | None: the interface, or None if there is no control socket.
+
+    Raises:
+        OSError: the control socket directory does not exist (wpa_supplicant is not running).
+    """
+    for name in sorted(os.listdir(ctrl_dir or Config.WPA_CTRL_DIR)):
+        if not name.startswith("p2p-dev-"):
+            return name
+    return None
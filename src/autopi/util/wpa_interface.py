@@ -1,10 +1,11 @@
 """An interface with wpa config files and commands."""
 
-import itertools
 import subprocess
-from typing import Iterable, List, Optional
+from typing import Iterable, List, Optional, Tuple
 
+from util import wpa_ctrl, wpa_psk
 from util.config import Config
+from util.wpa_config import WpaConfig
 
 
 class PasswordLengthError(RuntimeError):
@@ -49,71 +50,49 @@ def is_valid_passwd(passwd: str) -> bool:
     return 8 <= n <= 63
 
 
+def _format_network(
+    ssid: str, passphrase: Optional[str], psk: Optional[str], priority: Optional[int], drop_comments: bool
+) -> str:
+    """Format a network block like wpa_passphrase, without a trailing newline."""
+    lines = ["network={", f'\tssid="{ssid}"']
+    if psk is None:
+        lines.append("\tkey_mgmt=NONE")
+    else:
+        if not drop_comments:
+            lines.append(f'\t#psk="{passphrase}"')
+        lines.append(f"\tpsk={psk}")
+    if priority is not None:
+        lines.append(f"\tpriority={priority}")
+    lines.append("}")
+    return "\n".join(lines)
+
+
 def _make_network_with_passwd(ssid: str, passphrase: str) -> str:
     """Create an encrypted network config information for an ssid/passphrase pair.
 
+    The output is the same as that of `wpa_passphrase ssid passphrase`.
+
     Args:
         ssid (str): ssid name of the network.
         passphrase (str): password of the network.
 
-    Raises:
-        SSIDLengthError: ssid is too long.
-        PasswordLengthError: password does not meet wpa length requirements.
-        subprocess.CalledProcessError: wpa_passphrase failed.
-
     Returns:
         str: wpa network configuration.
     """
-    result = subprocess.run(["wpa_passphrase", ssid, passphrase], capture_output=True, check=True)
-    return str(result.stdout, encoding="utf8")
+    return _format_network(ssid, passphrase, wpa_psk.derive_psk(ssid, passphrase), None, False) + "\n"
 
 
-def _make_network_without_passwd(ssid: str) -> str:
-    """Generate a wpa network config for an unprotected network.
+def check_network(ssid: str, passwd: Optional[str]):
+    """Check an ssid and password (None for an unprotected network) against the wpa length requirements.
 
-    Args:
-        ssid (str): ssid of the network.
-
-    Returns:
-        str: generated network config.
-    """
-    config = "network={\n"
-    config += f'\tssid="{ssid}"\n'
-    config += "\tkey_mgmt=NONE\n"
-    config += "}\n"
-    return config
-
-
-def _add_priority(network_config: str, priority: int) -> str:
-    """Add a priority level to a wpa network config.
-
-    Args:
-        network_config (str): wpa network config to modify.
-        priority (int): priority level.
-
-    Returns:
-        str: modified wpa network config.
-    """
-    lines = network_config.splitlines()
-    for i, line in enumerate(lines):
-        if line.strip() == "}":
-            closing_index = i
-    lines.insert(closing_index, f"\tpriority={priority}")
-    return "\n".join(lines)
-
-
-def _strip_comment_lines(network_config: str) -> str:
-    """Remove any lines starting with '#'.
-
-    Args:
-        network_config (str): config to remove comments from.
-
-    Returns:
-        str: config with commented lines removed.
+    Raises:
+        SSIDLengthError: ssid is too long.
+        PasswordLengthError: password does not meet wpa length requirements.
     """
-    lines = network_config.splitlines()
-    commentless_lines = [line for line in lines if not line.strip().startswith("#")]
-    return "\n".join(commentless_lines)
+    if not is_valid_ssid(ssid):
+        raise SSIDLengthError()
+    if passwd is not None and not is_valid_passwd(passwd):
+        raise PasswordLengthError()
 
 
 def network_exists(
@@ -136,22 +115,7 @@ def network_exists(
     Returns:
         bool: network already exists in the config
     """
-    with open(config_file, "r") as fin:
-        current_contents = fin.read()
-
-    if ignore_comments:
-        current_contents = _strip_comment_lines(current_contents)
-        network_config = _strip_comment_lines(network_config)
-
-    if ignore_empty_lines:
-        current_contents = "\n".join(
-            [line for line in current_contents.splitlines() if len(line) > 0 and not line.isspace()]
-        )
-        network_config = "\n".join(
-            [line for line in network_config.splitlines() if len(line) > 0 and not line.isspace()]
-        )
-
-    return network_config in current_contents
+    return WpaConfig.load(config_file).has_network(network_config, ignore_comments, ignore_empty_lines)
 
 
 def make_network(
@@ -166,23 +130,46 @@ def make_network(
         ssid (str): ssid of the network
         passwd (str | None, optional): password of the network. If None, network without password protection is assumed. Defaults to None.
         priority (int | None, optional): priority of the network. Defaults to None.
-        drop_comments (bool, optional): do not include comments generated by wpa_passphrase. Defaults to True.
+        drop_comments (bool, optional): do not include the plain-text password comment, as wpa_passphrase does.
+            Defaults to True.
 
     Returns:
         str: new wpa network string
+
+    Raises:
+        SSIDLengthError: ssid is too long.
+        PasswordLengthError: password does not meet wpa length requirements.
     """
-    if not is_valid_ssid(ssid):
-        raise SSIDLengthError()
-    if passwd is not None and not is_valid_passwd(passwd):
-        raise PasswordLengthError()
+    return make_networks([(ssid, passwd, priority)], drop_comments)[0]
 
-    network_str = _make_network_with_passwd(ssid, passwd) if passwd is not None else _make_network_without_passwd(ssid)
-    if drop_comments:
-        network_str = _strip_comment_lines(network_str)
-    if priority is not None:
-        network_str = _add_priority(network_str, priority)
 
-    return network_str
+def make_networks(
+    networks: Iterable[Tuple[str, Optional[str], Optional[int]]], drop_comments: bool = True, save_psks: bool = True
+) -> List[str]:
+    """Create several wpa network strings, deriving their PSKs in parallel.
+
+    Args:
+        networks (Iterable[tuple[str, str | None, int | None]]): (ssid, password, priority) of each network, with
+            password and priority as in make_network.
+        drop_comments (bool, optional): do not include the plain-text password comment. Defaults to True.
+        save_psks (bool, optional): add the derived PSKs to the PSK cache file. Defaults to True.
+
+    Returns:
+        list[str]: the network strings, in the order of networks.
+
+    Raises:
+        SSIDLengthError: an ssid is too long.
+        PasswordLengthError: a password does not meet wpa length requirements.
+    """
+    networks = list(networks)
+    for ssid, passwd, _ in networks:
+        check_network(ssid, passwd)
+    protected = [(ssid, passwd) for ssid, passwd, _ in networks if passwd is not None]
+    psks = dict(zip(protected, wpa_psk.derive_psks(protected, save=save_psks)))
+    return [
+        _format_network(ssid, passwd, psks.get((ssid, passwd)), priority, drop_comments)
+        for ssid, passwd, priority in networks
+    ]
 
 
 def add_network(
@@ -203,22 +190,18 @@ def add_network(
     Returns:
         bool: config was succesfully added. Returns False if network config already exists.
     """
-    if network_exists(network_config, config_file):
-        return False
-
-    if drop_comments:
-        network_config = _strip_comment_lines(network_config)
-
-    with open(config_file, "a") as fout:
-        fout.write("\n\n" + network_config + "\n")
-    return True
+    with EditSession(config_file) as session:
+        return session.add_network(network_config, drop_comments)
 
 
 def run_reconfigure(interface: Optional[str]) -> bool:
-    """Use wpa_cli to force wpa_supplicant to re-read its config file.
+    """Force wpa_supplicant to re-read its config file.
+
+    The command is sent on wpa_supplicant's control socket; if that is not available, wpa_cli is used.
 
     Args:
-        interface (str | None): interface to reconfigure. Reconfigures all interfaces if None.
+        interface (str | None): interface to reconfigure. If None, the interface wpa_cli uses by default (see
+            wpa_ctrl.default_interface).
 
     Returns:
         bool: wpa_supplicant was successfully reconfigured.
@@ -226,6 +209,17 @@ def run_reconfigure(interface: Optional[str]) -> bool:
     Raises:
         subprocess.CalledProcessError: wpa_cli's reconfigure failed.
     """
+    try:
+        name = interface if interface is not None else wpa_ctrl.default_interface()
+        if name is not None:
+            with wpa_ctrl.WpaCtrl(name) as ctrl:
+                ctrl.reconfigure()
+            return True
+    except wpa_ctrl.WpaCtrlError:
+        return False
+    except OSError:
+        pass  # no control socket; try wpa_cli
+
     command = ["wpa_cli"]
     if interface is not None:
         command.extend(["-i", interface])
@@ -234,6 +228,25 @@ def run_reconfigure(interface: Optional[str]) -> bool:
     return response.stdout == b"OK\n"
 
 
+def add_running_networks(network_configs: List[str], interface: str):
+    """Add networks to the running wpa_supplicant without reconfiguring, so the current connection is kept.
+
+    The networks are not saved by wpa_supplicant; add them to the config file as well.
+
+    Args:
+        network_configs (list[str]): network configs to add.
+        interface (str): interface to add them to.
+
+    Raises:
+        OSError: the control socket is not available.
+        WpaCtrlError: wpa_supplicant rejected a network.
+    """
+    with wpa_ctrl.WpaCtrl(interface) as ctrl:
+        for network_config in network_configs:
+            for network in WpaConfig.parse(network_config).networks:
+                ctrl.add_network_settings(network.settings())
+
+
 def get_country(config_file: str = Config.WPA_CONFIG_FILE) -> Optional[str]:
     """Get the country code from a wpa config file.
 
@@ -246,46 +259,12 @@ def get_country(config_file: str = Config.WPA_CONFIG_FILE) -> Optional[str]:
     Returns:
         str | None: country code from util.config_file or None if it does not exist
     """
-    with open(config_file, "r") as fin:
-        # get country
-        for line in (line.strip() for line in fin.readlines()):
-            if line.startswith("country="):
-                return line.split("=")[1]
-
-    # country was not found
-    return None
-
-
-def _split_config_file(config_file) -> (List[str], List[str]):
-    with open(config_file, "r") as fin:
-        lines = fin.readlines()
-
-    def _not_network_line(line: str) -> bool:
-        return not line.strip().startswith("network={")
-
-    header = list(itertools.takewhile(_not_network_line, lines))
-    contents = list(itertools.dropwhile(_not_network_line, lines))
-
-    return header, contents
-
-
-def _without_trailing_empty_lines(lines: List[str]) -> Iterable[str]:
-    bad_indices = []
-    last_index = len(lines) - 1
-    for i, line in enumerate(reversed(lines)):
-        if len(line) == 0 or line.isspace():
-            bad_indices.append(last_index - i)
-        else:
-            break
-    print(bad_indices)
-    return (line for i, line in enumerate(lines) if i not in bad_indices)
+    return WpaConfig.load(config_file).country
 
 
 def update_country(country: str, config_file: str = Config.WPA_CONFIG_FILE):
     """Add or replace country code in a wpa config file.
 
-    Undefined behavior may occur with a broken wpa config file.
-
     Args:
         country (str): country code to add or update to
         config_file (str, optional): filename of wpa config file. Defaults to Config.WPA_CONFIG_FILE.
@@ -293,21 +272,8 @@ def update_country(country: str, config_file: str = Config.WPA_CONFIG_FILE):
     Raises:
         OSError: config_file is not a valid file
     """
-    header, contents = _split_config_file(config_file)
-    header = list(_without_trailing_empty_lines(header))
-
-    country_code_index = next(
-        (index for index, line in enumerate(header) if line.strip().startswith("country=")),
-        None,
-    )
-    if country_code_index is not None:
-        header[country_code_index] = f"country={country}\n"
-    else:
-        header.append(f"country={country}\n")
-    header.append("\n")
-
-    with open(config_file, "w") as fout:
-        fout.writelines(header + contents)
+    with EditSession(config_file) as session:
+        session.set_country(country)
 
 
 def get_new_config_after_del(ssid: str, config_file: str = Config.WPA_CONFIG_FILE) -> str:
@@ -318,15 +284,11 @@ def get_new_config_after_del(ssid: str, config_file: str = Config.WPA_CONFIG_FIL
         config_file (str): File path of network configuration. Defaults to Config.WPA_CONFIG_FILE.
 
     Returns:
-        str: Text of new configuration file
+        str: Text of new configuration file, without the first network with the SSID
     """
-    with open(config_file, "r") as fin:
-        current_contents = fin.read()
-        position = current_contents.find('ssid="' + ssid + '"')
-        start = current_contents.rfind("\n\nnetwork={", 0, position)
-        end = current_contents.find("}", position) + 1
-        new_config = current_contents[0:start] + current_contents[end:]
-        return new_config
+    config = WpaConfig.load(config_file)
+    config.remove_ssid(ssid)
+    return config.dumps()
 
 
 def check_duplicate_ssid(ssid: str, config_file: str = Config.WPA_CONFIG_FILE) -> bool:
@@ -339,8 +301,7 @@ def check_duplicate_ssid(ssid: str, config_file: str = Config.WPA_CONFIG_FILE) -
     Returns:
         bool: Multiple networks with same SSID
     """
-    with open(config_file, "r") as fin:
-        return fin.read().count('ssid="' + ssid + '"') > 1
+    return len(WpaConfig.load(config_file).find(ssid)) > 1
 
 
 def ssid_exists(ssid: str, config_file: str = Config.WPA_CONFIG_FILE) -> bool:
@@ -353,23 +314,147 @@ def ssid_exists(ssid: str, config_file: str = Config.WPA_CONFIG_FILE) -> bool:
     Returns:
         bool: Exists
     """
-    with open(config_file, "r") as fin:
-        return f'ssid="{ssid}"' in fin.read()
+    return len(WpaConfig.load(config_file).find(ssid)) > 0
 
 
-def delete_ssid(ssid: str, config_file=Config.WPA_CONFIG_FILE) -> bool:
+def delete_ssid(ssid: str, config_file=Config.WPA_CONFIG_FILE, all_matches: bool = False) -> bool:
     """Delete network after check if exists.
 
     Args:
         ssid (str): SSID to be deleted.
         config_file (str, optional): File path of network configuration. Defaults to Config.WPA_CONFIG_FILE.
+        all_matches (bool, optional): delete every network with the SSID, not just the first. Defaults to False.
 
     Returns:
         bool: Deletion successful.
     """
-    if ssid_exists(ssid, config_file):
-        new_text = get_new_config_after_del(ssid, config_file)
-        with open(config_file, "wt") as fin:
-            fin.write(new_text)
-            return True
-    return False
+    with EditSession(config_file) as session:
+        return session.delete_ssid(ssid, all_matches)
+
+
+class EditSession:
+    """A batch of edits to a wpa config file, applied with a single write.
+
+    Use as a context manager: the file is parsed once on entry, the edits are made in memory, and on a clean exit they
+    are committed with one atomic write. A session that did not change the text does not write the file.
+
+    Example:
+        with EditSession(interface="wlan0") as session:
+            session.set_country("US")
+            session.add_network(make_network("CSMwireless", priority=2))
+    """
+
+    def __init__(
+        self, config_file: str = Config.WPA_CONFIG_FILE, interface: Optional[str] = None, reconfigure: bool = False
+    ):
+        """Create a session; the file is read on entry.
+
+        Args:
+            config_file (str, optional): filename of wpa config file. Defaults to Config.WPA_CONFIG_FILE.
+            interface (str | None, optional): interface to reconfigure. Defaults to all interfaces.
+            reconfigure (bool, optional): make wpa_supplicant re-read the config after a commit that changed it.
+                Defaults to False.
+        """
+        self.config_file = config_file
+        self.interface = interface
+        self.reconfigure = reconfigure
+        self.config: Optional[WpaConfig] = None
+        self._committed = ""
+        self._added: List[str] = []
+        self._edited = False
+
+    def __enter__(self) -> "EditSession":
+        """Parse the config file.
+
+        Raises:
+            OSError: config_file could not be opened.
+        """
+        self.config = WpaConfig.load(self.config_file)
+        self._committed = self.config.dumps()
+        self._added, self._edited = [], False
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Commit the edits, unless the block raised."""
+        if exc_type is None:
+            self.commit()
+
+    @property
+    def changed(self) -> bool:
+        """Check if the edits changed the text since it was read or last committed."""
+        return self.config.dumps() != self._committed
+
+    def add_network(self, network_config: str, drop_comments: bool = True) -> bool:
+        """Add a network config, unless it is already in the file.
+
+        Returns:
+            bool: the network was added.
+        """
+        if self.config.has_network(network_config):
+            return False
+        self.config.add(network_config, drop_comments)
+        self._added.append(network_config)
+        return True
+
+    def delete_ssid(self, ssid: str, all_matches: bool = False) -> bool:
+        """Delete the first, or every, network with an SSID.
+
+        Returns:
+            bool: a network was deleted.
+        """
+        deleted = self.config.remove_ssid(ssid, all_matches) > 0
+        self._edited = self._edited or deleted
+        return deleted
+
+    def set_priority(self, ssid: str, priority: int) -> int:
+        """Set the priority of every network with an SSID.
+
+        Returns:
+            int: the number of networks updated.
+        """
+        networks = self.config.find(ssid)
+        for network in networks:
+            network.set("priority", str(priority))
+        self._edited = self._edited or len(networks) > 0
+        return len(networks)
+
+    def set_country(self, country: str):
+        """Add or replace the country code; setting the current one is not an edit."""
+        if self.config.country != country:
+            self.config.country = country
+            self._edited = True
+
+    def discard(self):
+        """Drop the edits made since the file was read or last committed."""
+        self.config = WpaConfig.parse(self._committed)
+        self._added, self._edited = [], False
+
+    def commit(self) -> bool:
+        """Write the edits, if they changed the text, and reconfigure wpa_supplicant once if enabled.
+
+        If the session only added networks and has an interface, they are added to the running wpa_supplicant on its
+        control socket instead of reconfiguring, which would drop the current connection.
+
+        Returns:
+            bool: the file was written.
+
+        Raises:
+            OSError: config_file could not be written.
+            subprocess.CalledProcessError: wpa_cli's reconfigure failed.
+        """
+        if not self.changed:
+            return False
+        text = self.config.dumps()
+        self.config.save(self.config_file)
+        self._committed = text
+        added, self._added = self._added, []
+        edited, self._edited = self._edited, False
+        if self.reconfigure:
+            if added and not edited and self.interface is not None:
+                try:
+                    add_running_networks(added, self.interface)
+                    return True
+                except (OSError, wpa_ctrl.WpaCtrlError):
+                    pass  # reconfigure from the file instead
+            run_reconfigure(self.interface)
+        return True
@@ -0,0 +1,123 @@
+"""WPA pre-shared key derivation, as done by wpa_passphrase, with a root-only cache of derived keys."""
+
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from util.config import Config
+
+
+def _derive(ssid: str, passphrase: str) -> str:
+    """Derive the 256-bit PSK: PBKDF2-HMAC-SHA1 of the passphrase, salted with the SSID, 4096 iterations."""
+    return hashlib.pbkdf2_hmac("sha1", passphrase.encode("utf-8"), ssid.encode("utf-8"), 4096, 32).hex()
+
+
+def _cache_key(ssid: str, passphrase: str) -> str:
+    return hashlib.sha256(ssid.encode("utf-8") + b"\0" + passphrase.encode("utf-8")).hexdigest()
+
+
+class PskCache:
+    """Derived PSKs, kept in a file that only its owner can read.
+
+    A PSK is as good as the passphrase for joining its network, so the file is created with mode 600, and a file
+    that is owned by another user or readable by others is ignored.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Create a cache; the file is read on first use.
+
+        Args:
+            path (str | None, optional): cache file. Defaults to ROOT_DIR/psk_cache.json.
+        """
+        self._path = path
+        self._entries: Optional[Dict[str, str]] = None
+
+    @property
+    def path(self) -> str:
+        """Get the cache file."""
+        return self._path if self._path is not None else os.path.join(Config.ROOT_DIR, "psk_cache.json")
+
+    def _load(self) -> Dict[str, str]:
+        if self._entries is None:
+            self._entries = {}
+            try:
+                with open(self.path) as fin:
+                    stat = os.fstat(fin.fileno())
+                    if stat.st_uid == os.geteuid() and not stat.st_mode & 0o077:
+                        self._entries = json.load(fin)
+            except (OSError, ValueError):
+                pass
+        return self._entries
+
+    def get(self, ssid: str, passphrase: str) -> Optional[str]:
+        """Get the cached PSK for a network, or None."""
+        return self._load().get(_cache_key(ssid, passphrase))
+
+    def update(self, psks: Dict[Tuple[str, str], str]):
+        """Add PSKs, keyed by (ssid, passphrase), and write the file if any is new.
+
+        The file is not critical; failing to write it only makes the next derivation slower.
+        """
+        entries = self._load()
+        new = {_cache_key(*network): psk for network, psk in psks.items()}
+        if all(entries.get(key) == psk for key, psk in new.items()):
+            return
+        entries.update(new)
+        tmp_path = self.path + ".tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+            with os.fdopen(fd, "w") as fout:
+                json.dump(entries, fout)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+_cache = PskCache()
+
+
+def derive_psks(networks: Iterable[Tuple[str, str]], cache: Optional[PskCache] = None, save: bool = True) -> List[str]:
+    """Derive the PSKs of several networks, in parallel.
+
+    Keys missing from the cache are derived on a thread per core; hashlib releases the GIL while deriving.
+
+    Args:
+        networks (Iterable[tuple[str, str]]): (ssid, passphrase) pairs.
+        cache (PskCache | None, optional): cache to use. Defaults to the one in ROOT_DIR.
+        save (bool, optional): add the derived keys to the cache, e.g. False for a dry run, which should leave no
+            files behind. Defaults to True.
+
+    Returns:
+        list[str]: the PSKs as 64 hex characters, in the order of networks.
+    """
+    cache = cache or _cache
+    networks = list(networks)
+    psks = {network: cache.get(*network) for network in networks}
+    missing = [network for network, psk in psks.items() if psk is None]
+    if len(missing) == 1:
+        psks[missing[0]] = _derive(*missing[0])
+    elif missing:
+        with ThreadPoolExecutor(min(len(missing), os.cpu_count() or 1)) as executor:
+            psks.update(zip(missing, executor.map(lambda network: _derive(*network), missing)))
+    if missing and save:
+        cache.update({network: psks[network] for network in missing})
+    return [psks[network] for network in networks]
+
+
+def derive_psk(ssid: str, passphrase: str, cache: Optional[PskCache] = None) -> str:
+    """Derive the PSK of a network, as wpa_passphrase does.
+
+    Args:
+        ssid (str): ssid of the network.
+        passphrase (str): password of the network.
+        cache (PskCache | None, optional): cache to use. Defaults to the one in ROOT_DIR.
+
+    Returns:
+        str: the PSK as 64 hex characters.
+    """
+    return derive_psks([(ssid, passphrase)], cache)[0]
@@ -0,0 +1,154 @@
+"""Bulk status ingestion: stream parsing and per-device folding of status events."""
+
+import codecs
+import json
+import uuid
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterable, Optional
+
+from pydantic import ValidationError
+
+from .core import HW_CHANGE_WARNING, SEND_FULL_STATE, StatusModel
+
+# Upper bound on the size of a single buffered event, so a malformed stream cannot grow the buffer without limit
+MAX_EVENT_BYTES = 64 * 1024
+
+
+@dataclass
+class DeviceState:
+    """Database state of a device, updated as its events are applied in order."""
+
+    hardware_id: Optional[str]
+    state_digest: Optional[str]
+    power: Optional[str] = None
+    ip_addr: Optional[str] = None
+    ssid: Optional[str] = None
+    ssh: Optional[str] = None
+    vnc: Optional[str] = None
+    touched: bool = False
+    warnings: set = field(default_factory=set)
+
+
+async def iter_json_values(chunks: AsyncIterator[bytes], ndjson: bool = False) -> AsyncIterator[object]:
+    """Incrementally parse a JSON array or an NDJSON stream.
+
+    Only the current, incomplete element is buffered.
+
+    Args:
+        chunks (AsyncIterator[bytes]): request body chunks.
+        ndjson (bool, optional): parse one JSON value per line instead of a single array. Defaults to False.
+
+    Yields:
+        object: each decoded element.
+
+    Raises:
+        ValueError: the stream is not a valid JSON array or NDJSON document.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    in_array = False
+    closed = False
+    async for chunk in chunks:
+        buffer += utf8.decode(chunk)
+        pos = 0
+        while True:
+            while pos < len(buffer) and (buffer[pos].isspace() or (in_array and buffer[pos] == ",")):
+                pos += 1
+            if pos == len(buffer):
+                break
+            if closed:
+                raise ValueError("unexpected data after the end of the array")
+            if not ndjson and not in_array:
+                if buffer[pos] != "[":
+                    raise ValueError("expected a JSON array")
+                in_array = True
+                pos += 1
+                continue
+            if in_array and buffer[pos] == "]":
+                closed = True
+                pos += 1
+                continue
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # incomplete element; wait for more data
+            pos = end
+            yield value
+        buffer = buffer[pos:]
+        if len(buffer) > MAX_EVENT_BYTES:
+            raise ValueError("event exceeds the maximum size")
+    buffer += utf8.decode(b"", final=True)
+    if buffer.strip():
+        raise ValueError("malformed JSON")
+    if not ndjson and not closed:
+        raise ValueError("unterminated JSON array")
+
+
+def validate_status(raw: object) -> Optional[StatusModel]:
+    """Validate a single event, returning None if it is not a valid status with a well-formed device ID.
+
+    The device ID is normalized to the form PostgreSQL returns for a uuid.
+    """
+    if not isinstance(raw, dict):
+        return None
+    try:
+        status = StatusModel(**raw)
+        status.devid = str(uuid.UUID(status.devid))
+    except (ValidationError, ValueError):
+        return None
+    return status
+
+
+def apply_events(events: Iterable[tuple], devices: dict) -> dict:
+    """Apply validated events to their devices' states, in order per device.
+
+    The semantics match update_status: unknown devices are rejected, a hardware ID that differs from the previous one
+    adds a warning, compact heartbeats are only accepted when their digest matches, and shutdowns turn the device off.
+
+    Args:
+        events (Iterable[tuple[int, StatusModel]]): (index in the batch, event) pairs. Events of a device are ordered by
+            timestamp, then by index; events without a timestamp keep their position after the timestamped ones.
+        devices (dict[str, DeviceState]): current state of every known device in the batch, keyed by device ID. Updated
+            in place.
+
+    Returns:
+        dict[int, dict]: result for each event, keyed by index.
+    """
+    results = {}
+    ordered = sorted(events, key=lambda e: (e[1].devid, e[1].timestamp is None, e[1].timestamp or 0, e[0]))
+    for index, status in ordered:
+        device = devices.get(status.devid)
+        if device is None:
+            results[index] = {"index": index, "status": "forbidden"}
+            continue
+
+        if status.is_heartbeat:
+            if status.digest is None or status.digest != device.state_digest:
+                results[index] = {"index": index, "status": "ok", "action": SEND_FULL_STATE}
+                continue
+            device.power = "on"
+            device.touched = True
+            results[index] = {"index": index, "status": "ok"}
+            continue
+
+        if device.hardware_id and device.hardware_id != status.hwid:
+            device.warnings.add(HW_CHANGE_WARNING)
+        device.hardware_id = status.hwid
+        device.touched = True
+        if status.event == "shutdown":
+            device.power = "off"
+        else:
+            device.power = "on"
+            for name, value in (
+                ("ip_addr", status.ip),
+                ("ssid", status.ssid),
+                ("ssh", status.ssh),
+                ("vnc", status.vnc),
+            ):
+                if value is not None:
+                    setattr(device, name, value)
+            if status.digest is not None:
+                device.state_digest = status.digest
+        results[index] = {"index": index, "status": "ok"}
+    return results
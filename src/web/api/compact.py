@@ -0,0 +1,104 @@
+"""Decoder for the compact binary encoding of status updates.
+
+See autopi/util/compact_status.py for the layout. Decoding only unpacks fixed-size fields and builds the status from
+values that already have the right types, which pydantic validates faster than it parses and validates JSON.
+"""
+
+import socket
+import struct
+from typing import Optional
+
+from .core import StatusModel
+
+CONTENT_TYPE = "application/vnd.autopi.status"
+FORMAT_VERSION = 1
+EVENTS = ("general", "start", "shutdown", "keepalive", "net_update", "ssh_change", "vnc_change")
+
+FLAG_HWID = 1 << 0
+FLAG_DIGEST = 1 << 1
+FLAG_IP = 1 << 2
+FLAG_SSID = 1 << 3
+FLAG_SSH = 1 << 4
+FLAG_SSH_UP = 1 << 5
+FLAG_VNC = 1 << 6
+FLAG_VNC_UP = 1 << 7
+FLAG_REASONS = 1 << 8
+
+_HEADER = struct.Struct("!BBBH16s")
+
+
+def _read(data: bytes, pos: int, size: int) -> tuple[bytes, int]:
+    end = pos + size
+    if end > len(data):
+        raise ValueError("truncated status")
+    return data[pos:end], end
+
+
+def _service(flags: int, present: int, up: int) -> Optional[str]:
+    if not flags & present:
+        return None
+    return "up" if flags & up else "down"
+
+
+def decode_status(data: bytes) -> StatusModel:
+    """Decode a status update.
+
+    Args:
+        data (bytes): request body.
+
+    Returns:
+        StatusModel: the status, equal to the one the same request would give as JSON (without the MAC address).
+
+    Raises:
+        ValueError: the body is not a valid encoded status.
+    """
+    if len(data) < _HEADER.size:
+        raise ValueError("truncated status")
+    format_version, version, event, flags, devid = _HEADER.unpack_from(data)
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"unsupported format version {format_version}")
+    if event >= len(EVENTS):
+        raise ValueError(f"unknown event code {event}")
+
+    pos = _HEADER.size
+    hwid = digest = ip = ssid = reasons = None
+    if flags & FLAG_HWID:
+        raw, pos = _read(data, pos, 32)
+        hwid = raw.hex()
+    if flags & FLAG_DIGEST:
+        raw, pos = _read(data, pos, 8)
+        digest = raw.hex()
+    if flags & FLAG_IP:
+        size, pos = _read(data, pos, 1)
+        if size[0] not in (4, 16):
+            raise ValueError("invalid IP address length")
+        raw, pos = _read(data, pos, size[0])
+        ip = socket.inet_ntop(socket.AF_INET if size[0] == 4 else socket.AF_INET6, raw)
+    if flags & FLAG_SSID:
+        size, pos = _read(data, pos, 1)
+        raw, pos = _read(data, pos, size[0])
+        ssid = raw.decode("utf-8")  # UnicodeDecodeError is a ValueError
+    if flags & FLAG_REASONS:
+        raw, pos = _read(data, pos, 1)
+        if raw[0] >> len(EVENTS):
+            raise ValueError("unknown reason code")
+        reasons = sorted(name for code, name in enumerate(EVENTS) if raw[0] & 1 << code)
+    if pos != len(data):
+        raise ValueError("unexpected data after the status")
+
+    devid = devid.hex()
+    # model_validate on a dict of plain values is faster than model_construct in pydantic 2
+    return StatusModel.model_validate(
+        {
+            "hwid": hwid,
+            "devid": f"{devid[:8]}-{devid[8:12]}-{devid[12:16]}-{devid[16:20]}-{devid[20:]}",
+            "event": EVENTS[event],
+            "ip": ip,
+            "ssid": ssid,
+            "ssh": _service(flags, FLAG_SSH, FLAG_SSH_UP),
+            "vnc": _service(flags, FLAG_VNC, FLAG_VNC_UP),
+            "version": version,
+            "digest": digest,
+            "reasons": reasons,
+        }
+    )
@@ -1,4 +1,5 @@
 """API configuration."""
+import os
 from dataclasses import dataclass
 
 
@@ -6,5 +7,20 @@ from dataclasses import dataclass
 class Config:
     """Frozen API configuation."""
 
+    # Directory holding help.html, style.css and the alias dictionaries (the API package in the container)
+    appDir: str = os.environ.get("AUTOPI_APP_DIR", "/app")
     homepageAutoRefresh: bool = True
     homepageAutoRefreshTime: int = 30
+    statusBatchChunkSize: int = 500
+    # Devices send heartbeats every heartbeatMinInterval to heartbeatMaxInterval seconds, at a per-device phase within
+    # the minimum interval. A heartbeat can therefore come up to heartbeatMaxInterval + heartbeatMinInterval / 2 seconds
+    # after the previous one, which must stay below rowStaleAfter.
+    heartbeatMinInterval: int = 60
+    heartbeatMaxInterval: int = 90
+    heartbeatStableAfter: int = 600
+    heartbeatTargetRate: float = 5.0
+    rowStaleAfter: int = 150
+    rowDeadAfter: int = 300
+    # The current network profile hash is cached for this many seconds, so a newly published profile reaches devices
+    # with their next status update after at most this delay.
+    networkProfileCacheTime: int = 30
@@ -2,19 +2,47 @@
 
 from typing import Optional
 
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
+
+# Reply telling a client that sent a compact heartbeat to send its full state
+SEND_FULL_STATE = "send_full_state"
+
+# TODO message should maybe not be defined in code??
+HW_CHANGE_WARNING = "The hardware of this device has changed. If this was not you, contact your instructor."
 
 
 class StatusModel(BaseModel):
-    """Base class for status JSON."""
+    """Base class for status JSON.
+
+    Version 1 requests always carry hwid. Version 2 requests add a digest of the device state; when the state is unchanged,
+    the client sends a compact heartbeat with only devid, event, version and digest. Replayed events carry the time
+    (seconds since the epoch) they were generated. Requests coalesced from several events on the device list them in
+    reasons.
+    """
 
-    hwid: str
+    hwid: Optional[str] = None
     devid: str
     event: str
-    ip: Optional[str]
-    ssid: Optional[str]
-    ssh: Optional[str]
-    vnc: Optional[str]
+    ip: Optional[str] = None
+    ssid: Optional[str] = None
+    ssh: Optional[str] = None
+    vnc: Optional[str] = None
+    version: int = 1
+    digest: Optional[str] = None
+    timestamp: Optional[float] = None
+    reasons: Optional[list[str]] = None
+
+    @model_validator(mode="after")
+    def _require_hwid(self) -> "StatusModel":
+        """Require hwid, except in a version 2 heartbeat, which carries the digest of the state instead."""
+        if self.hwid is None and (self.version < 2 or self.digest is None):
+            raise ValueError("hwid is required unless the request is a version 2 heartbeat with a digest")
+        return self
+
+    @property
+    def is_heartbeat(self) -> bool:
+        """Check if the request is a compact heartbeat without the device state."""
+        return self.version >= 2 and self.hwid is None
 
 
 class UserModel(BaseModel):
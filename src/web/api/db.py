@@ -1,17 +1,21 @@
 """API-Database interface."""
 
+import functools
 import os
 import random
 from contextlib import contextmanager
-from typing import Optional
+from typing import Iterable, Optional
 
 import psycopg2
+from psycopg2.extras import execute_values
 
+from .config import Config
 from .core import StatusModel
 
 
+@functools.lru_cache(maxsize=None)
 def get_db_credentials() -> dict:
-    """Get db credentials from environment."""
+    """Get db credentials from environment, reading them on first use."""
     with open(os.environ["POSTGRES_PASSWORD_FILE"], "r") as fin:
         password = fin.read().strip()
     return {
@@ -25,11 +29,12 @@ def get_db_credentials() -> dict:
 class PiDBConnection:
     """An object representing a single connection with the database, providing needed database queries."""
 
-    def __init__(self, credentials: dict = get_db_credentials()):
+    def __init__(self, credentials: Optional[dict] = None):
         """Initialize members and opens database connection.
 
         Args:
-            credentials (dict): dictionary with database credentials for opening connection.
+            credentials (dict | None, optional): dictionary with database credentials for opening connection. Defaults
+                to get_db_credentials().
         """
         self._connection = None
         self.connect(credentials)
@@ -39,12 +44,15 @@ class PiDBConnection:
         if self._connection is not None and not self._connection.closed:
             self.close()
 
-    def connect(self, credentials: dict = get_db_credentials()):
+    def connect(self, credentials: Optional[dict] = None):
         """Open a new connection, closing the previouus connection if applicable.
 
         Args:
-            credentials (dict): dictionary with database credentials for opening connection.
+            credentials (dict | None, optional): dictionary with database credentials for opening connection. Defaults
+                to get_db_credentials().
         """
+        if credentials is None:
+            credentials = get_db_credentials()
         self._credentials = credentials
 
         if self._connection is not None and not self._connection.closed:
@@ -186,9 +194,9 @@ class PiDBConnection:
         """
         query = """SELECT alias FROM raspi WHERE username=%s;"""
         aliases = [row[0] for row in self._fetchall(query, (username,))]
-        with open("/app/dictionaries/animals", "r") as fin:
+        with open(os.path.join(Config.appDir, "dictionaries", "animals"), "r") as fin:
             animals = [line.strip() for line in fin.readlines()]
-        with open("/app/dictionaries/adjectives", "r") as fin:
+        with open(os.path.join(Config.appDir, "dictionaries", "adjectives"), "r") as fin:
             adjectives = [line.strip() for line in fin.readlines()]
 
         for i in range(1000):  # unlikely to fail this many times
@@ -329,11 +337,55 @@ class PiDBConnection:
         if status.ssid is not None:
             query += ", ssid=%s"
             data.append(status.ssid)
+        if status.digest is not None:
+            query += ", state_digest=%s"
+            data.append(status.digest)
         query += " WHERE device_id=%s;"
         data.append(status.devid)
 
         self._commit(query, tuple(data))
 
+    def get_state_digest(self, devid: str) -> Optional[str]:
+        """Get the digest of the last full state reported by a device.
+
+        Args:
+            devid (str): the device ID.
+
+        Returns:
+            str | None: the state digest, or None if the device has not reported one.
+        """
+        query = """
+            SELECT state_digest FROM autopi.raspi WHERE device_id=%s LIMIT 1;
+        """
+        return self._fetch_first_cell(query, (devid,))
+
+    def get_state_age(self, devid: str) -> Optional[float]:
+        """Get the number of seconds since a device's reported state last changed.
+
+        Args:
+            devid (str): the device ID.
+
+        Returns:
+            float | None: seconds since the state digest changed, or None if the device does not exist.
+        """
+        query = """
+            SELECT EXTRACT(EPOCH FROM NOW() - state_changed_at)::float FROM autopi.raspi WHERE device_id=%s LIMIT 1;
+        """
+        return self._fetch_first_cell(query, (devid,))
+
+    def update_status_heartbeat(self, devid: str):
+        """Mark a device as on without changing its state.
+
+        Args:
+            devid (str): the device ID.
+        """
+        query = """
+            UPDATE autopi.raspi
+            SET power='on'
+            WHERE device_id=%s;
+        """
+        self._commit(query, (devid,))
+
     def update_status_shutdown(self, status: StatusModel):
         """Update device row in database with device shutdown.
 
@@ -347,6 +399,55 @@ class PiDBConnection:
         """
         self._commit(query, (status.hwid, status.devid))
 
+    def get_device_states(self, devids: Iterable[str]) -> list[tuple]:
+        """Get the hardware ID and state digest of several devices in one query.
+
+        Args:
+            devids (Iterable[str]): device IDs. Must be valid UUIDs.
+
+        Returns:
+            list: rows (device_id: str, hardware_id: str, state_digest: str) for the devices that exist.
+        """
+        query = """
+            SELECT device_id::text, hardware_id, state_digest FROM autopi.raspi WHERE device_id = ANY(%s::uuid[]);
+        """
+        return self._fetchall(query, (list(devids),))
+
+    def apply_status_batch(self, updates: list[tuple], warnings: list[tuple]):
+        """Update many devices and add their warnings in one transaction.
+
+        None values leave the current column value unchanged, except for power.
+
+        Args:
+            updates (list[tuple]): rows (device_id, hardware_id, power, ip_addr, ssid, ssh, vnc, state_digest).
+            warnings (list[tuple]): rows (device_id, warning). Must not contain duplicates.
+        """
+        update_query = """
+            UPDATE autopi.raspi AS r
+            SET hardware_id=COALESCE(v.hardware_id, r.hardware_id),
+                power=v.power,
+                ip_addr=COALESCE(v.ip_addr, r.ip_addr),
+                ssid=COALESCE(v.ssid, r.ssid),
+                ssh=COALESCE(v.ssh, r.ssh),
+                vnc=COALESCE(v.vnc, r.vnc),
+                state_digest=COALESCE(v.state_digest, r.state_digest)
+            FROM (VALUES %s) AS v(device_id, hardware_id, power, ip_addr, ssid, ssh, vnc, state_digest)
+            WHERE r.device_id = v.device_id;
+        """
+        warning_query = """
+            INSERT INTO autopi.raspi_warning (device_id, warning)
+            VALUES %s
+            ON CONFLICT (device_id, warning) DO UPDATE SET added_at=NOW();
+        """
+        with self._connection:
+            with self._connection.cursor() as cur:
+                if len(updates) > 0:
+                    execute_values(
+                        cur, update_query, updates, template="(%s::uuid, %s, %s, %s, %s, %s, %s, %s)", page_size=1000
+                    )
+                if len(warnings) > 0:
+                    execute_values(cur, warning_query, warnings, template="(%s::uuid, %s)", page_size=1000)
+
     def add_raspi_warning(self, devid: str, warning: str):
         """Add warning for specific device.
 
@@ -390,9 +491,35 @@ class PiDBConnection:
             self._commit(remove_query, (username,))
         return warnings
 
+    def get_network_profile_hash(self) -> Optional[str]:
+        """Get the content hash of the current (newest) network profile.
+
+        Returns:
+            str | None: the SHA-256 hex digest of the profile, or None if no profile has been published.
+        """
+        query = """
+            SELECT profile_hash FROM autopi.network_profile_version ORDER BY version DESC LIMIT 1;
+        """
+        return self._fetch_first_cell(query)
+
+    def get_network_profile(self) -> Optional[tuple]:
+        """Get the current (newest) network profile.
+
+        Returns:
+            tuple | None: (profile_hash: str, networks: str), or None if no profile has been published.
+        """
+        query = """
+            SELECT p.profile_hash, p.networks
+            FROM autopi.network_profile_version AS v, autopi.network_profile AS p
+            WHERE v.profile_hash = p.profile_hash
+            ORDER BY v.version DESC LIMIT 1;
+        """
+        results = self._fetchall(query)
+        return results[0] if len(results) > 0 else None
+
 
 @contextmanager
-def connect(credentials: list = get_db_credentials()) -> PiDBConnection:
+def connect(credentials: Optional[dict] = None) -> PiDBConnection:
     """Create PIDBConnection instance for 'with' statement."""
     db = PiDBConnection(credentials)
     try:
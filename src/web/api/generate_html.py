@@ -6,6 +6,8 @@ from typing import Iterable, List, Optional, Union
 
 from airium import Airium, Tag
 
+from .config import Config
+
 Tag.ATTRIBUTE_NAME_SUBSTITUTES.update({"http_equiv": "http-equiv"})
 
 
@@ -91,13 +93,13 @@ def construct_row(items: tuple[tuple[str]], device_id: str, hw_warning: bool = F
             row_items.append(RowItem(key, value, Klass.GOOD if value == "up" else Klass.BAD))
         elif key == "Last Updated":
             age = _seconds_since_iso(value)
-            row_items.append(
-                RowItem(
-                    key,
-                    _pretty_datetime(value),
-                    Klass.NEUTRAL if age < 2.5 * 60 else Klass.BAD if age < 5 * 60 else Klass.DEAD,
-                )
-            )  # TODO get delta from config
+            if age < Config.rowStaleAfter:
+                klass = Klass.NEUTRAL
+            elif age < Config.rowDeadAfter:
+                klass = Klass.BAD
+            else:
+                klass = Klass.DEAD
+            row_items.append(RowItem(key, _pretty_datetime(value), klass))
         elif key == "Username":
             row_items.append(RowItem(key, value, Klass.NEUTRAL))
         elif key == "Power":
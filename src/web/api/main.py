@@ -1,17 +1,30 @@
 """API server."""
 
+import os
 from typing import Optional
 
-from fastapi import FastAPI, Header, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response
+from pydantic import ValidationError
 
+from . import compact
+from .batch import DeviceState, apply_events, iter_json_values, validate_status
 from .config import Config
-from .core import StatusModel
+from .core import HW_CHANGE_WARNING, SEND_FULL_STATE, StatusModel
 from .db import PiDBConnection, connect
 from .generate_html import Klass, Row, RowItem, build_homepage_content, build_page, construct_row
+from .profile import CurrentProfile, etag, etag_matches
+from .schedule import ArrivalRate, schedule_hints
 
 app = FastAPI()
 
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+
+status_rate = ArrivalRate()
+current_profile = CurrentProfile()
+
 
 def user_login(db: PiDBConnection, username: str):
     """Perform user login tasks."""
@@ -69,21 +82,23 @@ def root(uid: Optional[str] = Header(None)):
         content = build_page(
             title="Autopi",
             body_content=str(body),
-            style_file="/app/style.css",
+            style_file=os.path.join(Config.appDir, "style.css"),
             refresh_after=Config.homepageAutoRefreshTime,
         )
     else:
-        content = build_page(title="Autopi", body_content=str(body), style_file="/app/style.css")
+        content = build_page(
+            title="Autopi", body_content=str(body), style_file=os.path.join(Config.appDir, "style.css")
+        )
     return HTMLResponse(content=content, status_code=200)
 
 
 @app.get("/help", response_class=HTMLResponse)
 def help():
     """Serve help page."""
-    with open("/app/help.html") as f:
+    with open(os.path.join(Config.appDir, "help.html")) as f:
         content = f.read()
 
-    content = build_page(title="Autopi Help", body_content=content, style_file="/app/style.css")
+    content = build_page(title="Autopi Help", body_content=content, style_file=os.path.join(Config.appDir, "style.css"))
     return HTMLResponse(content=content, status_code=200)
 
 
@@ -106,29 +121,146 @@ def register(uid: Optional[str] = Header(None)):
         <p>Enter the following ID in '{filename}'. Visit the <a href="help">help page</a> for more in-depth instructions.</p>
         <h1>{devid}</h1>
     """
-    content = build_page(title="Autopi Registration", body_content=content, style_file="/app/style.css")
+    content = build_page(
+        title="Autopi Registration", body_content=content, style_file=os.path.join(Config.appDir, "style.css")
+    )
 
     return HTMLResponse(content=content, status_code=200)
 
 
+async def read_status(request: Request) -> StatusModel:
+    """Read a status update as JSON, or in the compact binary encoding if its Content-Type says so.
+
+    Raises:
+        RequestValidationError: the body is not a valid status (422).
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    body = await request.body()
+    if content_type == compact.CONTENT_TYPE:
+        try:
+            return compact.decode_status(body)
+        except ValueError as e:
+            raise RequestValidationError([{"type": "value_error", "loc": ("body",), "msg": str(e), "input": None}])
+    try:
+        return StatusModel.model_validate_json(body)
+    except ValidationError as e:
+        errors = [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        raise RequestValidationError(errors, body=body)
+
+
+def status_reply(db: PiDBConnection, devid: str, rate: float) -> dict:
+    """Build the reply to an applied status update: the device's heartbeat schedule and the current network profile."""
+    reply = schedule_hints(devid, db.get_state_age(devid), rate)
+    profile_hash = current_profile.get(db)
+    if profile_hash is not None:
+        reply["network_profile"] = profile_hash
+    return reply
+
+
 @app.post("/api/status")
-def update_status(status: StatusModel):
-    """Print status received."""
+def update_status(status: StatusModel = Depends(read_status)):
+    """Apply a status update, replying with the device's heartbeat schedule.
+
+    Returns:
+        dict: {"action": "send_full_state"} if a heartbeat's digest does not match the last full state, otherwise
+            {"next_interval": int, "phase_offset": int, "network_profile"?: str}
+    """
+    rate = status_rate.record()
     with connect() as db:
         if not db.devid_exists(status.devid):
             raise HTTPException(
                 status_code=403
             )  # TODO ascertain proper response to bad id; minimal information is preferable
 
+        if status.is_heartbeat:
+            if status.digest is None or status.digest != db.get_state_digest(status.devid):
+                return {"action": SEND_FULL_STATE}
+            db.update_status_heartbeat(status.devid)
+            return status_reply(db, status.devid, rate)
+
         prev_hwid = db.get_hardware_id(status.devid)
         if prev_hwid != status.hwid and prev_hwid:
-            # TODO message should maybe not be defined in code??
-            msg = "The hardware of this device has changed. If this was not you, contact your instructor."
-            db.add_raspi_warning(status.devid, msg)
+            db.add_raspi_warning(status.devid, HW_CHANGE_WARNING)
 
         if status.event == "shutdown":
             db.update_status_shutdown(status)
         else:
             db.update_status_general(status)
         print(status)  # TODO Maybe don't do this...
-        return {}
+        return status_reply(db, status.devid, rate)
+
+
+@app.get("/api/network_profile")
+def network_profile(devid: Optional[str] = Header(None), if_none_match: Optional[str] = Header(None)):
+    """Serve the current network profile to a device.
+
+    The profile holds network passwords, so the request must carry a known device ID in the devid header. The ETag is
+    the profile's content hash; a request whose If-None-Match matches it gets a 304 without the profile.
+
+    Returns:
+        PlainTextResponse: the network list, in the format read by add_network_from_txt.py.
+    """
+    with connect() as db:
+        if devid is None or not db.devid_exists(devid):
+            raise HTTPException(status_code=403)
+        profile = db.get_network_profile()
+    if profile is None:
+        raise HTTPException(status_code=404, detail="No network profile")
+    profile_hash, networks = profile
+    current_profile.set(profile_hash)
+    headers = {"ETag": etag(profile_hash), "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, profile_hash):
+        return Response(status_code=304, headers=headers)
+    return PlainTextResponse(networks, headers=headers)
+
+
+def _apply_status_chunk(db: PiDBConnection, events: list) -> list:
+    """Apply a chunk of validated (index, StatusModel) events with set-based queries, returning their results."""
+    rows = db.get_device_states({status.devid for _, status in events})
+    devices = {devid: DeviceState(hardware_id, state_digest) for devid, hardware_id, state_digest in rows}
+    results = apply_events(events, devices)
+    updates = [
+        (devid, d.hardware_id, d.power, d.ip_addr, d.ssid, d.ssh, d.vnc, d.state_digest)
+        for devid, d in devices.items()
+        if d.touched
+    ]
+    warnings = [(devid, warning) for devid, d in devices.items() for warning in d.warnings]
+    db.apply_status_batch(updates, warnings)
+    return list(results.values())
+
+
+@app.post("/api/status/batch")
+async def update_status_batch(request: Request):
+    """Apply a JSON array or NDJSON stream of status events.
+
+    Events are validated as they are read and applied in chunks, so the whole batch is never held in memory. Each chunk
+    is applied in one transaction, in order per device.
+
+    Returns:
+        dict: {"results": [{"index": int, "status": "ok" | "invalid" | "forbidden", "action"?: str}, ...]}
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    ndjson = content_type in NDJSON_CONTENT_TYPES
+    results = []
+    chunk = []
+    index = 0
+    with connect() as db:
+        try:
+            async for raw in iter_json_values(request.stream(), ndjson):
+                status = validate_status(raw)
+                if status is None:
+                    results.append({"index": index, "status": "invalid"})
+                else:
+                    chunk.append((index, status))
+                index += 1
+                if len(chunk) >= Config.statusBatchChunkSize:
+                    results.extend(await run_in_threadpool(_apply_status_chunk, db, chunk))
+                    chunk = []
+        except ValueError as e:
+            # events before the malformed part have already been applied
+            results.sort(key=lambda result: result["index"])
+            raise HTTPException(status_code=400, detail={"error": str(e), "results": results})
+        if len(chunk) > 0:
+            results.extend(await run_in_threadpool(_apply_status_chunk, db, chunk))
+    results.sort(key=lambda result: result["index"])
+    return {"results": results}
@@ -0,0 +1,68 @@
+"""Network profiles: network lists that devices fetch and apply when the profile hash in a status response changes."""
+
+import threading
+import time
+from typing import Callable, Optional
+
+from .config import Config
+
+
+def etag(profile_hash: str) -> str:
+    """Get the entity tag of a profile, which is its content hash."""
+    return f'"{profile_hash}"'
+
+
+def etag_matches(if_none_match: Optional[str], profile_hash: str) -> bool:
+    """Check if an If-None-Match header matches a profile, so that a 304 can be sent instead of the profile.
+
+    Args:
+        if_none_match (str | None): the header value: "*" or a comma-separated list of (possibly weak) entity tags.
+        profile_hash (str): hash of the current profile.
+    """
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # If-None-Match uses weak comparison
+    tags = [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+    return "*" in tags or etag(profile_hash) in tags
+
+
+class CurrentProfile:
+    """Hash of the current network profile, cached for networkProfileCacheTime seconds.
+
+    Every status response carries the hash, so caching it saves a query per status update.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        """Create an empty cache.
+
+        Args:
+            clock (Callable[[], float], optional): source of the current time. Defaults to time.monotonic.
+        """
+        self._clock = clock
+        self._hash: Optional[str] = None
+        self._fetched_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def get(self, db) -> Optional[str]:
+        """Get the hash, querying the database if the cached one has expired.
+
+        Args:
+            db (PiDBConnection): connection to query.
+
+        Returns:
+            str | None: the hash, or None if no profile has been published.
+        """
+        now = self._clock()
+        with self._lock:
+            if self._fetched_at is not None and now - self._fetched_at < Config.networkProfileCacheTime:
+                return self._hash
+        profile_hash = db.get_network_profile_hash()
+        with self._lock:
+            self._hash, self._fetched_at = profile_hash, now
+        return profile_hash
+
+    def set(self, profile_hash: Optional[str]):
+        """Record a hash just read from the database, e.g. with the profile itself."""
+        with self._lock:
+            self._hash, self._fetched_at = profile_hash, self._clock()
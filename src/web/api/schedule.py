@@ -0,0 +1,85 @@
+"""Heartbeat scheduling hints returned to devices with each status update."""
+
+import math
+import threading
+import time
+from hashlib import sha256
+from typing import Optional
+
+from .config import Config
+
+
+class ArrivalRate:
+    """Exponentially weighted rate of status requests received by this process."""
+
+    def __init__(self, time_constant: float = 60.0):
+        """Create an estimator.
+
+        Args:
+            time_constant (float, optional): seconds over which past arrivals are averaged. Defaults to 60.
+        """
+        self._time_constant = time_constant
+        self._rate = 0.0
+        self._last: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record(self, now: Optional[float] = None) -> float:
+        """Record an arrival.
+
+        Args:
+            now (float | None, optional): time of the arrival. Defaults to time.monotonic().
+
+        Returns:
+            float: estimated arrivals per second, including this one.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self._last is not None:
+                self._rate *= math.exp(-max(0.0, now - self._last) / self._time_constant)
+            self._rate += 1 / self._time_constant
+            self._last = now
+            return self._rate
+
+
+def phase_offset(devid: str) -> int:
+    """Get a device's deterministic phase offset.
+
+    Offsets are spread uniformly over the minimum interval, so that devices booted together do not send in lockstep.
+
+    Args:
+        devid (str): the device ID.
+
+    Returns:
+        int: offset in seconds, in [0, heartbeatMinInterval).
+    """
+    return int(sha256(devid.encode("utf-8")).hexdigest()[:8], 16) % Config.heartbeatMinInterval
+
+
+def next_interval(stable_for: Optional[float], rate: float) -> int:
+    """Choose the interval until a device's next heartbeat.
+
+    The interval grows from the minimum to the maximum as the device's state stays unchanged for heartbeatStableAfter
+    seconds, and as the request rate rises beyond heartbeatTargetRate (reaching the maximum at twice that rate).
+    State changes are sent by the device as they happen, so a longer interval only delays noticing a device that went
+    offline.
+
+    Args:
+        stable_for (float | None): seconds since the device's state last changed, or None if unknown.
+        rate (float): current requests per second.
+
+    Returns:
+        int: interval in seconds, in [heartbeatMinInterval, heartbeatMaxInterval].
+    """
+    stability = 0.0 if stable_for is None else min(1.0, max(0.0, stable_for / Config.heartbeatStableAfter))
+    load = min(1.0, max(0.0, rate / Config.heartbeatTargetRate - 1))
+    stretch = max(stability, load)
+    return round(Config.heartbeatMinInterval + stretch * (Config.heartbeatMaxInterval - Config.heartbeatMinInterval))
+
+
+def schedule_hints(devid: str, stable_for: Optional[float], rate: float) -> dict:
+    """Build the scheduling hints of a status response.
+
+    Returns:
+        dict: {"next_interval": int, "phase_offset": int}
+    """
+    return {"next_interval": next_interval(stable_for, rate), "phase_offset": phase_offset(devid)}
@@ -20,6 +20,8 @@ CREATE TABLE autopi.raspi(
 	vnc text,
 	ssh text,
 	power text,
+	state_digest text,
+	state_changed_at timestamptz NOT NULL DEFAULT NOW(),
 	username text,
 	FOREIGN KEY(username) REFERENCES autopi.user(username) ON DELETE CASCADE
 );
@@ -32,14 +34,49 @@ CREATE TABLE autopi.raspi_warning(
 	FOREIGN KEY(device_id) REFERENCES autopi.raspi(device_id) ON DELETE CASCADE
 );
 
+-- Network profiles: network lists (in the format of add_network_from_txt.py) pushed to every device. Each distinct
+-- list is stored once, keyed by the SHA-256 of its text; publishing a list adds a version, and the newest version is
+-- the current profile.
 
--- Add trigger to automatically update 'updated_at' in raspi column whenever the row is UPDATE'd.
+CREATE TABLE autopi.network_profile(
+	profile_hash text PRIMARY KEY,
+	networks text NOT NULL,
+	added_at timestamptz NOT NULL DEFAULT NOW(),
+	CHECK (profile_hash = encode(sha256(convert_to(networks, 'UTF8')), 'hex'))
+);
+
+CREATE TABLE autopi.network_profile_version(
+	version serial PRIMARY KEY,
+	profile_hash text NOT NULL,
+	published_at timestamptz NOT NULL DEFAULT NOW(),
+	FOREIGN KEY(profile_hash) REFERENCES autopi.network_profile(profile_hash) ON DELETE CASCADE
+);
+
+CREATE OR REPLACE FUNCTION autopi.publish_network_profile(profile text) RETURNS text
+	AS
+	$BODY$
+	DECLARE
+		digest text := encode(sha256(convert_to(profile, 'UTF8')), 'hex');
+	BEGIN
+		INSERT INTO autopi.network_profile (profile_hash, networks) VALUES (digest, profile) ON CONFLICT DO NOTHING;
+		INSERT INTO autopi.network_profile_version (profile_hash) VALUES (digest);
+		RETURN digest;
+	END;
+	$BODY$
+	LANGUAGE plpgsql;
+
+
+-- Add trigger to automatically update 'updated_at' in raspi column whenever the row is UPDATE'd,
+-- and 'state_changed_at' whenever the reported state changes.
 
 CREATE OR REPLACE FUNCTION update_user_time() RETURNS TRIGGER
 	AS
 	$BODY$
 	BEGIN
 		new.updated_at := NOW();
+		IF new.state_digest IS DISTINCT FROM old.state_digest THEN
+			new.state_changed_at := NOW();
+		END IF;
 		RETURN new;
 	END;
 	$BODY$
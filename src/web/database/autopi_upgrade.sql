@@ -0,0 +1,54 @@
+-- Upgrade a database created from an older autopi_schema.sql to the current schema. autopi_schema.sql only runs when
+-- the database is first initialized; run this after updating a deployed server, before starting the new API. Every
+-- statement is idempotent, so it is safe to run more than once, and on a database that is already current.
+
+BEGIN;
+
+-- Compact heartbeats: the digest of the last full state, and when it last changed.
+
+ALTER TABLE autopi.raspi ADD COLUMN IF NOT EXISTS state_digest text;
+ALTER TABLE autopi.raspi ADD COLUMN IF NOT EXISTS state_changed_at timestamptz NOT NULL DEFAULT NOW();
+
+CREATE OR REPLACE FUNCTION update_user_time() RETURNS TRIGGER
+	AS
+	$BODY$
+	BEGIN
+		new.updated_at := NOW();
+		IF new.state_digest IS DISTINCT FROM old.state_digest THEN
+			new.state_changed_at := NOW();
+		END IF;
+		RETURN new;
+	END;
+	$BODY$
+	LANGUAGE plpgsql;
+
+-- Network profiles.
+
+CREATE TABLE IF NOT EXISTS autopi.network_profile(
+	profile_hash text PRIMARY KEY,
+	networks text NOT NULL,
+	added_at timestamptz NOT NULL DEFAULT NOW(),
+	CHECK (profile_hash = encode(sha256(convert_to(networks, 'UTF8')), 'hex'))
+);
+
+CREATE TABLE IF NOT EXISTS autopi.network_profile_version(
+	version serial PRIMARY KEY,
+	profile_hash text NOT NULL,
+	published_at timestamptz NOT NULL DEFAULT NOW(),
+	FOREIGN KEY(profile_hash) REFERENCES autopi.network_profile(profile_hash) ON DELETE CASCADE
+);
+
+CREATE OR REPLACE FUNCTION autopi.publish_network_profile(profile text) RETURNS text
+	AS
+	$BODY$
+	DECLARE
+		digest text := encode(sha256(convert_to(profile, 'UTF8')), 'hex');
+	BEGIN
+		INSERT INTO autopi.network_profile (profile_hash, networks) VALUES (digest, profile) ON CONFLICT DO NOTHING;
+		INSERT INTO autopi.network_profile_version (profile_hash) VALUES (digest);
+		RETURN digest;
+	END;
+	$BODY$
+	LANGUAGE plpgsql;
+
+COMMIT;
@@ -0,0 +1,119 @@
+"""Bulk status ingestion test script."""
+
+import asyncio
+import json
+import unittest
+
+from web.api import batch
+from web.api.core import HW_CHANGE_WARNING, SEND_FULL_STATE
+
+DEVID = "0b3f1c2e-0000-4000-8000-000000000001"
+OTHER_DEVID = "0b3f1c2e-0000-4000-8000-000000000002"
+
+
+def _parse(data: bytes, chunk_size: int, ndjson: bool = False) -> list:
+    async def chunks():
+        for i in range(0, len(data), chunk_size):
+            yield data[i : i + chunk_size]
+
+    async def collect():
+        return [value async for value in batch.iter_json_values(chunks(), ndjson)]
+
+    return asyncio.run(collect())
+
+
+def _event(index: int, **fields) -> tuple:
+    return index, batch.validate_status({"devid": DEVID, "event": "keepalive", "version": 2, **fields})
+
+
+class TestStreamParsing(unittest.TestCase):
+    """Tests for incremental JSON array and NDJSON parsing."""
+
+    events = [{"devid": DEVID, "event": "keepalive", "ssid": 'café [{\\"}]'}, {"devid": DEVID, "event": "start"}]
+
+    def test_array_any_chunking(self):
+        """Check an array is parsed identically regardless of how the body is split."""
+        data = json.dumps(self.events, ensure_ascii=False).encode("utf-8")
+        for chunk_size in (1, 2, 7, len(data)):
+            self.assertEqual(_parse(data, chunk_size), self.events)
+
+    def test_ndjson(self):
+        """Check one value per line is parsed."""
+        data = "\n".join(json.dumps(event) for event in self.events).encode("utf-8") + b"\n"
+        self.assertEqual(_parse(data, 5, ndjson=True), self.events)
+
+    def test_empty_array(self):
+        """Check an empty array yields nothing."""
+        self.assertEqual(_parse(b" [ ] ", 1), [])
+
+    def test_malformed(self):
+        """Check malformed bodies are rejected."""
+        for data in (b'{"devid": 1}', b'[{"devid": 1}', b'[{"devid": }]', b"[] []"):
+            with self.assertRaises(ValueError):
+                _parse(data, 4)
+
+
+class TestApplyEvents(unittest.TestCase):
+    """Tests for folding events into device state with update_status semantics."""
+
+    def setUp(self):
+        """Create one known device."""
+        self.devices = {DEVID: batch.DeviceState(hardware_id="hw1", state_digest="d1")}
+
+    def test_validation(self):
+        """Check invalid events and device IDs are rejected, and device IDs are normalized."""
+        self.assertIsNone(batch.validate_status({"devid": DEVID}))
+        self.assertIsNone(batch.validate_status({"devid": "not-a-uuid", "event": "start"}))
+        self.assertIsNone(batch.validate_status([1, 2]))
+        self.assertEqual(batch.validate_status({"devid": DEVID.upper(), "event": "start", "hwid": "hw1"}).devid, DEVID)
+
+    def test_hwid_required(self):
+        """Check hwid may only be left out of a version 2 heartbeat with a digest."""
+        self.assertIsNone(batch.validate_status({"devid": DEVID, "event": "start"}))
+        self.assertIsNone(batch.validate_status({"devid": DEVID, "event": "keepalive", "version": 2}))
+        self.assertIsNone(batch.validate_status({"devid": DEVID, "event": "keepalive", "digest": "d1"}))
+        self.assertTrue(batch.validate_status({"devid": DEVID, "event": "keepalive", "version": 2, "digest": "d1"}))
+
+    def test_order_by_timestamp(self):
+        """Check events of a device are applied by timestamp, not arrival order."""
+        events = [
+            _event(0, hwid="hw1", ip="10.0.0.2", digest="d3", timestamp=30.0),
+            _event(1, hwid="hw1", ip="10.0.0.1", digest="d2", timestamp=20.0),
+        ]
+        batch.apply_events(events, self.devices)
+        self.assertEqual(self.devices[DEVID].ip_addr, "10.0.0.2")
+        self.assertEqual(self.devices[DEVID].state_digest, "d3")
+
+    def test_hardware_change(self):
+        """Check a changed hardware ID adds the warning."""
+        results = batch.apply_events([_event(0, hwid="hw2", digest="d2")], self.devices)
+        self.assertEqual(results[0]["status"], "ok")
+        self.assertEqual(self.devices[DEVID].warnings, {HW_CHANGE_WARNING})
+        self.assertEqual(self.devices[DEVID].hardware_id, "hw2")
+
+    def test_heartbeats(self):
+        """Check heartbeats are accepted only with a matching digest."""
+        results = batch.apply_events([_event(0, digest="d1"), _event(1, digest="stale")], self.devices)
+        self.assertEqual(results[0], {"index": 0, "status": "ok"})
+        self.assertEqual(results[1]["action"], SEND_FULL_STATE)
+        self.assertEqual(self.devices[DEVID].power, "on")
+
+    def test_shutdown_then_start(self):
+        """Check the last event decides the power state."""
+        events = [_event(0, hwid="hw1", event="shutdown"), _event(1, hwid="hw1", event="start", digest="d2")]
+        batch.apply_events(events, self.devices)
+        self.assertEqual(self.devices[DEVID].power, "on")
+        events = [_event(2, hwid="hw1", event="shutdown", timestamp=2.0)]
+        batch.apply_events(events, self.devices)
+        self.assertEqual(self.devices[DEVID].power, "off")
+
+    def test_unknown_device(self):
+        """Check events for devices that do not exist are forbidden."""
+        _, status = _event(0, hwid="hw1")
+        status.devid = OTHER_DEVID
+        results = batch.apply_events([(0, status)], self.devices)
+        self.assertEqual(results[0]["status"], "forbidden")
+
+
+if __name__ == "__main__":
+    unittest.main()
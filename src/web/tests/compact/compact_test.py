@@ -0,0 +1,66 @@
+"""Compact status decoding test script."""
+
+import unittest
+
+from web.api import compact
+from web.api.core import StatusModel
+
+DEVID = "0b3f1c2e-0000-4000-8000-000000000001"
+
+# encoded by autopi/util/compact_status.py, see autopi/tests/compact_status/compact_status_test.py
+HEARTBEAT = bytes.fromhex("01020300020b3f1c2e0000400080000000000000010123456789abcdef")
+FULL = bytes.fromhex(
+    "010201007f0b3f1c2e000040008000000000000001abababababababababababababababababababababababababababababababab"
+    "0123456789abcdef040a0000050b43534d776972656c657373"
+)
+COALESCED = bytes.fromhex("01020001020b3f1c2e0000400080000000000000010123456789abcdef30")
+
+
+class TestDecodeStatus(unittest.TestCase):
+    """Tests for the compact status decoder."""
+
+    def test_heartbeat(self):
+        """Check a compact heartbeat decodes to the same status as its JSON form."""
+        expected = StatusModel(version=2, devid=DEVID, event="keepalive", digest="0123456789abcdef")
+        status = compact.decode_status(HEARTBEAT)
+        self.assertEqual(status.model_dump(), expected.model_dump())
+        self.assertTrue(status.is_heartbeat)
+
+    def test_full(self):
+        """Check a full status decodes to the same status as its JSON form."""
+        expected = StatusModel(
+            version=2,
+            devid=DEVID,
+            event="start",
+            digest="0123456789abcdef",
+            hwid="ab" * 32,
+            ip="10.0.0.5",
+            ssid="CSMwireless",
+            ssh="up",
+            vnc="down",
+        )
+        self.assertEqual(compact.decode_status(FULL).model_dump(), expected.model_dump())
+
+    def test_reasons(self):
+        """Check the reasons of a coalesced status decode in sorted order."""
+        status = compact.decode_status(COALESCED)
+        self.assertEqual(status.event, "general")
+        self.assertEqual(status.reasons, ["net_update", "ssh_change"])
+
+    def test_malformed(self):
+        """Check truncated, extended or unknown encodings raise ValueError."""
+        for data in (
+            b"",
+            HEARTBEAT[:-1],
+            HEARTBEAT + b"\x00",
+            FULL[:-3],
+            b"\x02" + HEARTBEAT[1:],
+            HEARTBEAT[:2] + b"\xff" + HEARTBEAT[3:],
+            COALESCED[:-1] + b"\x80",
+        ):
+            with self.assertRaises(ValueError):
+                compact.decode_status(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
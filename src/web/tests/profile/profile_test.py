@@ -0,0 +1,55 @@
+"""Network profile test script."""
+
+import unittest
+from unittest import mock
+
+from web.api import profile
+from web.api.config import Config
+
+PROFILE_HASH = "9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd15d6c15b0f00a08"
+
+
+class TestEtag(unittest.TestCase):
+    """Tests for matching If-None-Match against the current profile."""
+
+    def test_matches(self):
+        """Check strong, weak, listed and wildcard tags match."""
+        self.assertTrue(profile.etag_matches(f'"{PROFILE_HASH}"', PROFILE_HASH))
+        self.assertTrue(profile.etag_matches(f'W/"{PROFILE_HASH}"', PROFILE_HASH))
+        self.assertTrue(profile.etag_matches(f'"0000", "{PROFILE_HASH}"', PROFILE_HASH))
+        self.assertTrue(profile.etag_matches("*", PROFILE_HASH))
+
+    def test_no_match(self):
+        """Check a missing, different or unquoted tag does not match."""
+        self.assertFalse(profile.etag_matches(None, PROFILE_HASH))
+        self.assertFalse(profile.etag_matches("", PROFILE_HASH))
+        self.assertFalse(profile.etag_matches('"0000"', PROFILE_HASH))
+        self.assertFalse(profile.etag_matches(PROFILE_HASH, PROFILE_HASH))
+
+
+class TestCurrentProfile(unittest.TestCase):
+    """Tests for caching the current profile hash."""
+
+    def test_cache(self):
+        """Check the hash is queried once per networkProfileCacheTime, and set refreshes it."""
+        now = [0.0]
+        db = mock.Mock()
+        db.get_network_profile_hash.return_value = PROFILE_HASH
+        current = profile.CurrentProfile(clock=lambda: now[0])
+        self.assertEqual(current.get(db), PROFILE_HASH)
+        now[0] = Config.networkProfileCacheTime - 1
+        self.assertEqual(current.get(db), PROFILE_HASH)
+        self.assertEqual(db.get_network_profile_hash.call_count, 1)
+
+        now[0] = Config.networkProfileCacheTime
+        db.get_network_profile_hash.return_value = None
+        self.assertIsNone(current.get(db))
+        self.assertEqual(db.get_network_profile_hash.call_count, 2)
+
+        current.set("0" * 64)
+        self.assertEqual(current.get(db), "0" * 64)
+        self.assertEqual(db.get_network_profile_hash.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
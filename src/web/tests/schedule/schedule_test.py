@@ -0,0 +1,46 @@
+"""Heartbeat scheduling hints test script."""
+
+import unittest
+
+from web.api import schedule
+from web.api.config import Config
+
+DEVID = "0b3f1c2e-0000-4000-8000-000000000001"
+
+
+class TestScheduleHints(unittest.TestCase):
+    """Tests for heartbeat intervals and phase offsets."""
+
+    def test_phase_offset(self):
+        """Check phase offsets are deterministic and spread over the minimum interval."""
+        self.assertEqual(schedule.phase_offset(DEVID), schedule.phase_offset(DEVID))
+        offsets = {schedule.phase_offset(f"0b3f1c2e-0000-4000-8000-{i:012d}") for i in range(200)}
+        self.assertTrue(all(0 <= offset < Config.heartbeatMinInterval for offset in offsets))
+        self.assertGreater(len(offsets), Config.heartbeatMinInterval // 2)
+
+    def test_interval(self):
+        """Check the interval grows with stability and load, within bounds."""
+        self.assertEqual(schedule.next_interval(None, 0.0), Config.heartbeatMinInterval)
+        self.assertEqual(schedule.next_interval(0.0, 0.0), Config.heartbeatMinInterval)
+        self.assertEqual(schedule.next_interval(10 * Config.heartbeatStableAfter, 0.0), Config.heartbeatMaxInterval)
+        self.assertEqual(schedule.next_interval(0.0, 10 * Config.heartbeatTargetRate), Config.heartbeatMaxInterval)
+        middle = schedule.next_interval(Config.heartbeatStableAfter / 2, 0.0)
+        self.assertLess(Config.heartbeatMinInterval, middle)
+        self.assertLess(middle, Config.heartbeatMaxInterval)
+
+    def test_freshness(self):
+        """Check the longest gap between heartbeats keeps a live device from being shown as stale."""
+        longest_gap = Config.heartbeatMaxInterval + Config.heartbeatMinInterval / 2
+        self.assertLess(longest_gap, Config.rowStaleAfter)
+
+    def test_arrival_rate(self):
+        """Check the arrival rate converges to the steady-state rate."""
+        rate = schedule.ArrivalRate(time_constant=10.0)
+        for i in range(1000):
+            estimate = rate.record(now=i * 0.5)
+        self.assertAlmostEqual(estimate, 2.0, delta=0.1)
+        self.assertLess(rate.record(now=1000.0), 0.2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+"""Status endpoint validation test script."""
+
+import unittest
+from unittest import mock
+
+from fastapi.testclient import TestClient
+
+from web.api import main
+
+DEVID = "0b3f1c2e-0000-4000-8000-000000000001"
+
+
+class TestStatusValidation(unittest.TestCase):
+    """Tests for rejecting status updates without a hardware ID before they reach the database."""
+
+    def setUp(self):
+        """Replace the database with a mock that knows every device."""
+        self.db = mock.MagicMock()
+        self.db.get_device_states.return_value = [(DEVID, "hw1", "d1")]
+        connect = mock.patch.object(main, "connect")
+        connect.start().return_value.__enter__.return_value = self.db
+        self.addCleanup(connect.stop)
+        self.client = TestClient(main.app)
+
+    def test_v1_without_hwid(self):
+        """Check a version 1 update without hwid is rejected with 422, and no warning is added."""
+        resp = self.client.post("/api/status", json={"devid": DEVID, "event": "general", "ip": "10.0.0.1"})
+        self.assertEqual(resp.status_code, 422)
+        self.db.add_raspi_warning.assert_not_called()
+        self.db.update_status_general.assert_not_called()
+
+    def test_v2_without_hwid_or_digest(self):
+        """Check a version 2 update with neither hwid nor digest is rejected with 422."""
+        resp = self.client.post("/api/status", json={"devid": DEVID, "event": "keepalive", "version": 2})
+        self.assertEqual(resp.status_code, 422)
+
+    def test_batch_v1_without_hwid(self):
+        """Check a version 1 event without hwid is invalid in a batch, while the other events are applied."""
+        events = [
+            {"devid": DEVID, "event": "general", "ip": "10.0.0.1"},
+            {"devid": DEVID, "event": "keepalive", "version": 2, "digest": "d1"},
+        ]
+        resp = self.client.post("/api/status/batch", json=events)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["results"], [{"index": 0, "status": "invalid"}, {"index": 1, "status": "ok"}])
+        updates, warnings = self.db.apply_status_batch.call_args.args
+        self.assertEqual(warnings, [])
+        self.assertEqual([update[1] for update in updates], ["hw1"])
+
+
+if __name__ == "__main__":
+    unittest.main()
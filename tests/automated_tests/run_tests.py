@@ -1,14 +1,39 @@
 #!/usr/bin/env python3
 
-"""Run and display all automated tests in /tests/automated_tests."""
+"""Run and display all automated tests in /tests/automated_tests.
 
+Test modules are run in parallel by a pool of worker processes. Each worker has its own temporary directory and, with
+--dsn, its own database, so tests in different workers cannot see each other's files or rows.
+"""
+
+import argparse
+import contextlib
+import io
+import multiprocessing
 import os
+import shutil
 import sys
+import tempfile
+import time
+import traceback
 import unittest
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from importlib import import_module
 from pathlib import Path
+from typing import List, Optional
 from unittest import TestLoader, TestSuite
 
+# client settings pointing at system paths, redirected into the worker's temporary directory
+SANDBOXED_PATHS = {
+    "ROOT_DIR": "root",
+    "RUN_DIR": "run",
+    "WPA_CONFIG_FILE": "wpa_supplicant.conf",
+    "NEW_NETWORK_FILE": "CSM_new_network.txt",
+    "DEV_ID_FILE": "CSM_device_id.txt",
+}
+
+_worker = {}  # the state of a worker process, set by init_worker
+
 
 def get_test_directories(lst: Path, project_root: Path = Path(".")) -> list:
     """Get all listed directories from a file.
@@ -20,7 +45,7 @@ def get_test_directories(lst: Path, project_root: Path = Path(".")) -> list:
         list[Path]: list of directories.
     """
     with open(lst) as f:
-        dirs = [project_root / line.strip() for line in f.readlines()]
+        dirs = [project_root / line.strip() for line in f.readlines() if line.strip()]
         for d in dirs:
             assert d.is_dir()
             assert len(d.parts) >= 1
@@ -37,7 +62,7 @@ def get_dirs(p: Path) -> list:
     Returns:
         list[Path]: list of directories under p.
     """
-    return [x for x in p.iterdir() if x.is_dir() and x.name != "__pycache__"]
+    return sorted(x for x in p.iterdir() if x.is_dir() and x.name != "__pycache__")
 
 
 def get_test_files(p: Path) -> list:
@@ -51,7 +76,7 @@ def get_test_files(p: Path) -> list:
         list[Path]: list of test files under p.
     """
     flist = [x for x in p.iterdir() if x.is_file()]
-    return [x for x in flist if x.name.endswith("_test.py")]
+    return sorted(x for x in flist if x.name.endswith("_test.py"))
 
 
 def print_header(contents: str, character="="):
@@ -68,75 +93,262 @@ def print_header(contents: str, character="="):
     print(bracket)
 
 
-def main():
-    """Run all unit tests. Returns 0 if all succeed, non-zero otherwise.
+class TimedTestResult(unittest.TextTestResult):
+    """A test result that records how long each test took."""
+
+    def __init__(self, *args, **kwargs):
+        """Create a result; see unittest.TextTestResult."""
+        super().__init__(*args, **kwargs)
+        self.timings = []
+        self._started = 0.0
+
+    def startTest(self, test):
+        """Start the clock for a test."""
+        self._started = time.perf_counter()
+        super().startTest(test)
+
+    def stopTest(self, test):
+        """Record the time a test took."""
+        super().stopTest(test)
+        self.timings.append((test.id(), time.perf_counter() - self._started))
 
-    The framework must be run from the project root.
+
+def create_databases(dsn: str, count: int) -> List[str]:
+    """Create a database with the autopi schema for each worker.
+
+    The API's queries name the autopi schema, so workers are kept apart by database rather than by schema.
+
+    Args:
+        dsn (str): connection string of a role that may create databases.
+        count (int): number of databases.
+
+    Returns:
+        list[str]: the connection strings of the databases.
     """
-    abs_path = Path(sys.argv[0]).absolute().parent
-    test_folder_list = abs_path / Path("test_folder_list")
-    project_root = abs_path.parent.parent.absolute()
+    import psycopg2
+    from psycopg2.extensions import make_dsn
 
-    # require that this be run from project root
-    test_roots = get_test_directories(test_folder_list, project_root)
-    test_dirs = []
-    for root in test_roots:
-        dirs = get_dirs(root)
-        for dr in dirs:
-            test_dirs.append(dr)
-    runner = unittest.TextTestRunner()
-    nerrors = 0
-    nfailures = 0
-    nskipped = 0
-    for p in test_dirs:
-        # Load all scripts under directory p, run tests in them
-
-        print_header("Running tests for script: " + p.name)
-
-        testfiles = get_test_files(project_root / p)
-        if len(testfiles) == 0:
-            continue
-
-        # path is assumed to have at least two directories
-        relative = p.relative_to(project_root)
-        search_dir = project_root / relative.parts[0]
-        os.chdir(search_dir)
-        sys.path.append(str(search_dir))
-        parts = relative.parts[1:]
-        prefix = ".".join(parts)
-        if not prefix:
-            prefix = None
-        modules = [import_module("." + x.stem, prefix) for x in testfiles]
-        os.chdir(project_root / p)
-        for i, module in enumerate(modules):
-            # Run all unittest tests in each file
-
-            print_header("Running tests for script: " + testfiles[i].name, character="_")
-            t = TestLoader()
-            tests = t.loadTestsFromModule(module)
-            suite = TestSuite(tests)
-            result = runner.run(suite)
-            nerrors += len(result.errors)
-            nfailures += len(result.failures)
-            nskipped += len(result.skipped)
-            print()
-        sys.path[:-1]  # remove the added path item
-        print()
-        print()
+    sql = (Path(__file__).absolute().parents[2] / "src" / "web" / "database" / "autopi_schema.sql").read_text()
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    dsns = []
+    try:
+        for i in range(count):
+            name = f"autopi_test_{i}"
+            with admin.cursor() as cur:
+                cur.execute(f"DROP DATABASE IF EXISTS {name};")
+                cur.execute(f"CREATE DATABASE {name};")
+            dsns.append(make_dsn(dsn, dbname=name))
+            with contextlib.closing(psycopg2.connect(dsns[-1])) as conn, conn.cursor() as cur:
+                cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'uuid-ossp';")
+                if cur.fetchone() is None:
+                    # minimal builds lack the contrib extensions; gen_random_uuid is built in since PostgreSQL 13
+                    cur.execute(
+                        "CREATE FUNCTION uuid_generate_v4() RETURNS uuid AS 'SELECT gen_random_uuid()' LANGUAGE sql;"
+                    )
+                    cur.execute(sql.replace('CREATE EXTENSION IF NOT EXISTS "uuid-ossp";', ""))
+                else:
+                    cur.execute(sql)
+                conn.commit()
+    finally:
+        admin.close()
+    return dsns
+
+
+def drop_databases(dsn: str, count: int):
+    """Drop the databases made by create_databases."""
+    import psycopg2
+
+    admin = psycopg2.connect(dsn)
+    admin.autocommit = True
+    try:
+        with admin.cursor() as cur:
+            for i in range(count):
+                cur.execute(f"DROP DATABASE IF EXISTS autopi_test_{i};")
+    finally:
+        admin.close()
+
+
+def _use_database(dsn: str, tmp_dir: Path):
+    """Point the API's database settings (see web.api.db.get_db_credentials) at a database."""
+    from psycopg2.extensions import parse_dsn
+
+    params = parse_dsn(dsn)
+    password_file = tmp_dir / "postgres_password"
+    password_file.write_text(params.get("password", ""))
+    os.environ.update(
+        {
+            "POSTGRES_HOST": params.get("host", "localhost"),
+            "POSTGRES_DB": params["dbname"],
+            "POSTGRES_USER": params.get("user", ""),
+            "POSTGRES_PASSWORD_FILE": str(password_file),
+            # read by libpq; the production role is named after the schema, so unqualified names resolve to it
+            "PGOPTIONS": "-c search_path=autopi,public",
+        }
+    )
+    if "port" in params:
+        os.environ["PGPORT"] = params["port"]
+
+
+def init_worker(slots, project_root: Path, tmp_root: Path, dsns: List[str]):
+    """Set up a worker process: its temporary directory, its database and the import path.
+
+    Args:
+        slots (multiprocessing.Queue): worker numbers, one taken by each worker.
+        project_root (pathlib.Path): the project root.
+        tmp_root (pathlib.Path): directory holding the workers' temporary directories.
+        dsns (list[str]): the connection string of each worker's database, or empty for no databases.
+    """
+    slot = slots.get()
+    tmp_dir = tmp_root / f"worker{slot}"
+    tmp_dir.mkdir()
+    os.environ["TMPDIR"] = str(tmp_dir)
+    tempfile.tempdir = str(tmp_dir)
+    # the API's help page and dictionaries, where the container would have them (see web.api.config)
+    os.environ.setdefault("AUTOPI_APP_DIR", str(project_root / "src" / "web" / "api"))
+    if dsns:
+        _use_database(dsns[slot], tmp_dir)
+    _worker.update(project_root=project_root, tmp_dir=tmp_dir, sandboxed=False)
+
+
+def _sandbox_config(package_dir: Path):
+    """Redirect the client's system paths into the worker's temporary directory."""
+    if _worker["sandboxed"] or not (package_dir / "util" / "config.py").is_file():
+        return
+    from util.config import Config
+
+    for name, path in SANDBOXED_PATHS.items():
+        setattr(Config, name, str(_worker["tmp_dir"] / path))
+    for name in ("ROOT_DIR", "RUN_DIR"):
+        os.makedirs(getattr(Config, name), exist_ok=True)
+    _worker["sandboxed"] = True
+
+
+def run_test_file(test_file: Path) -> dict:
+    """Run the tests in a test file, in a worker process.
+
+    Args:
+        test_file (pathlib.Path): the test file.
+
+    Returns:
+        dict: the output of the run, its counts, and the time each test took.
+    """
+    project_root = _worker["project_root"]
+    # path is assumed to have at least two directories
+    relative = test_file.parent.relative_to(project_root)
+    search_dir = project_root / relative.parts[0]
+    # scripts import their package's modules as top-level modules (e.g. util), as when they are run
+    package_dir = search_dir / relative.parts[1]
+    for path in (str(search_dir), str(package_dir)):
+        if path not in sys.path:
+            sys.path.append(path)
+    prefix = ".".join(relative.parts[1:]) or None
 
-    # Print results
+    stream = io.StringIO()
+    summary = {"file": str(test_file.relative_to(project_root)), "run": 0, "errors": 0, "failures": 0, "skipped": 0}
+    started = time.perf_counter()
+    with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+        try:
+            _sandbox_config(package_dir)
+            os.chdir(search_dir)
+            module = import_module("." + test_file.stem, prefix)
+            os.chdir(test_file.parent)
+            suite = TestSuite(TestLoader().loadTestsFromModule(module))
+            result = unittest.TextTestRunner(stream=stream, resultclass=TimedTestResult).run(suite)
+        except Exception:
+            traceback.print_exc(file=stream)
+            summary.update(errors=1, timings=[])
+        else:
+            summary.update(
+                run=result.testsRun,
+                errors=len(result.errors),
+                failures=len(result.failures),
+                skipped=len(result.skipped),
+                timings=result.timings,
+            )
+    summary.update(output=stream.getvalue(), seconds=time.perf_counter() - started)
+    return summary
+
+
+def print_report(results: List[dict], elapsed: float, slowest: int):
+    """Print the totals of all test files and the slowest tests."""
+    total = {key: sum(r[key] for r in results) for key in ("run", "errors", "failures", "skipped", "seconds")}
     print("@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@@")
     print()
     print_header("Tests completed", character="^")
-    if nfailures > 0:
-        print(nfailures, "Failed Tests")
-    if nerrors > 0:
-        print(nerrors, "Tests with Errors")
-    if nskipped > 0:
-        print(nskipped, "Skipped Tests")
+    print(f"{total['run']} tests in {len(results)} files, {elapsed:.2f}s ({total['seconds']:.2f}s in workers)")
+    if total["failures"] > 0:
+        print(total["failures"], "Failed Tests")
+    if total["errors"] > 0:
+        print(total["errors"], "Tests with Errors")
+    if total["skipped"] > 0:
+        print(total["skipped"], "Skipped Tests")
+    for r in results:
+        if r["errors"] or r["failures"]:
+            print("  failed:", r["file"])
     print()
 
-    if nfailures > 0 or nerrors > 0:
+    timings = sorted((t for r in results for t in r["timings"]), key=lambda t: t[1], reverse=True)[:slowest]
+    if timings:
+        print_header(f"Slowest {len(timings)} tests", character="-")
+        for test_id, seconds in timings:
+            print(f"{seconds:8.3f}s  {test_id}")
+        print()
+
+
+def main(argv: Optional[List[str]] = None):
+    """Run all unit tests. Returns 0 if all succeed, non-zero otherwise.
+
+    The framework may be run from any directory.
+    """
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(), help="number of worker processes (default: CPU count)"
+    )
+    parser.add_argument("--slowest", type=int, default=10, metavar="N", help="list the N slowest tests (default: 10)")
+    parser.add_argument(
+        "--dsn", help="PostgreSQL connection string of a role that may create databases; each worker gets a database"
+    )
+    parser.add_argument("--keep-tmp", action="store_true", help="keep the workers' temporary directories")
+    args = parser.parse_args(argv)
+    jobs = max(1, args.jobs or 1)
+
+    abs_path = Path(__file__).absolute().parent
+    test_folder_list = abs_path / Path("test_folder_list")
+    project_root = abs_path.parent.parent.absolute()
+
+    test_roots = get_test_directories(test_folder_list, project_root)
+    test_files = [f for root in test_roots for d in get_dirs(root) for f in get_test_files(d)]
+    jobs = min(jobs, len(test_files)) or 1
+
+    tmp_root = Path(tempfile.mkdtemp(prefix="autopi-tests-"))
+    dsns = create_databases(args.dsn, jobs) if args.dsn else []
+    slots = multiprocessing.Manager().Queue()
+    for slot in range(jobs):
+        slots.put(slot)
+
+    started = time.perf_counter()
+    results = []
+    try:
+        with ProcessPoolExecutor(jobs, initializer=init_worker, initargs=(slots, project_root, tmp_root, dsns)) as pool:
+            futures = [pool.submit(run_test_file, f) for f in test_files]
+            for future in as_completed(futures):
+                result = future.result()
+                print_header(f"Running tests for script: {result['file']} ({result['seconds']:.2f}s)", character="_")
+                print(result["output"])
+                results.append(result)
+    finally:
+        if dsns:
+            drop_databases(args.dsn, jobs)
+        if not args.keep_tmp:
+            shutil.rmtree(tmp_root, ignore_errors=True)
+        else:
+            print("Temporary directories kept in", tmp_root)
+
+    results.sort(key=lambda r: r["file"])
+    print_report(results, time.perf_counter() - started, args.slowest)
+
+    if any(r["failures"] > 0 or r["errors"] > 0 for r in results):
         sys.exit(1)
 
 
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+
+"""Benchmark every API endpoint against a throwaway PostgreSQL database.
+
+Usage: `tests/benchmarks/api_bench.py [--users N] [--devices M] [--warnings W] [-n REQUESTS] [-c CONCURRENCY]
+[--endpoint NAME ...] [--dsn DSN | --docker IMAGE] [--json FILE] [--compare FILE]`. Run from the project root with the
+API dependencies (fastapi, httpx, psycopg2) installed.
+
+A temporary PostgreSQL cluster is started, with the binaries of the pgserver package if it is installed and otherwise
+with initdb and pg_ctl from PATH, or in a container with `--docker IMAGE` (e.g. `--docker postgres:16`). With `--dsn`,
+an existing empty database is used instead. autopi_schema.sql is applied, and N users (plus an admin), M registered
+devices, W warnings and a network profile are seeded.
+
+Each endpoint is driven through the ASGI app in this process, with CONCURRENCY requests in flight, after a short warm
+up. For each, the latency percentiles, the throughput and the database work per request are reported: connections
+opened, statements executed, and round trips (statements plus BEGIN and COMMIT). `--json` saves the results, and
+`--compare` prints the change from a saved run.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+from unittest import mock
+
+ROOT = Path(__file__).absolute().parent.parent.parent
+SCHEMA = ROOT / "src" / "web" / "database" / "autopi_schema.sql"
+sys.path.append(str(ROOT / "src"))
+os.environ.setdefault("AUTOPI_APP_DIR", str(ROOT / "src" / "web" / "api"))
+
+import httpx  # noqa: E402
+import psycopg2  # noqa: E402
+import psycopg2.extensions  # noqa: E402
+from psycopg2.extras import execute_values  # noqa: E402
+
+from web.api import db as api_db  # noqa: E402
+from web.api import main as api_main  # noqa: E402
+from web.api.core import HW_CHANGE_WARNING  # noqa: E402
+
+PROFILE = "ssid,password,priority\nCSMwireless,,2\nCSM-staff,staffpassword,3\n"
+BATCH_SIZE = 50
+ENDPOINTS = (
+    "root",
+    "root_admin",
+    "register",
+    "help",
+    "status_heartbeat",
+    "status_full",
+    "status_batch",
+    "network_profile",
+)
+
+
+class Counters:
+    """Database work done by the API, counted by the connection and cursor classes below."""
+
+    lock = threading.Lock()
+    connections = 0
+    statements = 0
+    transactions = 0
+
+    @classmethod
+    def add(cls, name: str):
+        """Count one connection, statement or transaction."""
+        with cls.lock:
+            setattr(cls, name, getattr(cls, name) + 1)
+
+    @classmethod
+    def take(cls) -> Dict[str, int]:
+        """Get the counts and reset them."""
+        with cls.lock:
+            counts = {"connections": cls.connections, "statements": cls.statements, "transactions": cls.transactions}
+            cls.connections = cls.statements = cls.transactions = 0
+        return counts
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """A cursor that counts the statements it executes (execute_values runs one per page)."""
+
+    def execute(self, query, vars=None):
+        """Count and execute a statement."""
+        Counters.add("statements")
+        return super().execute(query, vars)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+    """A connection that counts itself and the transactions ended by leaving a `with` block."""
+
+    def __init__(self, *args, **kwargs):
+        """Open and count a connection."""
+        super().__init__(*args, **kwargs)
+        Counters.add("connections")
+
+    def __exit__(self, *args):
+        """Count a transaction and commit or roll it back."""
+        Counters.add("transactions")
+        return super().__exit__(*args)
+
+
+def _wait_for(params: dict, timeout: float = 60.0):
+    """Wait until a server accepts connections."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            psycopg2.connect(**params).close()
+            return
+        except psycopg2.OperationalError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+
+@contextlib.contextmanager
+def local_postgres() -> Iterator[dict]:
+    """Run a throwaway cluster in a temporary directory, yielding its connection parameters."""
+    with tempfile.TemporaryDirectory(prefix="autopi_bench_") as tmp:
+        try:
+            import pgserver
+        except ImportError:
+            pgserver = None
+        if pgserver is not None:
+            # pgserver ships its own binaries and handles running as root
+            server = pgserver.get_server(tmp, cleanup_mode="stop")
+            try:
+                yield {"dsn": server.get_uri("postgres")}
+            finally:
+                server.cleanup()
+            return
+        initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+        if initdb is None or pg_ctl is None:
+            raise RuntimeError("no PostgreSQL found: install pgserver, put initdb and pg_ctl on PATH, or use --docker")
+        data = os.path.join(tmp, "data")
+        subprocess.run([initdb, "-D", data, "-U", "postgres", "--auth=trust"], check=True, stdout=subprocess.DEVNULL)
+        options = f"-k {tmp} -c listen_addresses=''"
+        log = os.path.join(tmp, "postgres.log")
+        subprocess.run(
+            [pg_ctl, "-D", data, "-o", options, "-l", log, "-w", "start"], check=True, stdout=subprocess.DEVNULL
+        )
+        try:
+            yield {"host": tmp, "dbname": "postgres", "user": "postgres"}
+        finally:
+            subprocess.run([pg_ctl, "-D", data, "-m", "fast", "-w", "stop"], stdout=subprocess.DEVNULL)
+
+
+@contextlib.contextmanager
+def docker_postgres(image: str) -> Iterator[dict]:
+    """Run a throwaway container from a PostgreSQL image, yielding its connection parameters."""
+    run = ["docker", "run", "-d", "--rm", "-e", "POSTGRES_PASSWORD=bench", "-p", "127.0.0.1::5432", image]
+    container = subprocess.run(run, check=True, capture_output=True, text=True).stdout.strip()
+    try:
+        mapping = subprocess.run(["docker", "port", container, "5432/tcp"], check=True, capture_output=True, text=True)
+        port = mapping.stdout.splitlines()[0].rsplit(":", 1)[1]
+        params = {"host": "127.0.0.1", "port": port, "dbname": "postgres", "user": "postgres", "password": "bench"}
+        _wait_for(params)
+        yield params
+    finally:
+        subprocess.run(["docker", "stop", container], stdout=subprocess.DEVNULL)
+
+
+def apply_schema(conn):
+    """Create the autopi schema, standing in for uuid-ossp where the server does not have it."""
+    sql = SCHEMA.read_text()
+    with conn.cursor() as cur:
+        cur.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'uuid-ossp';")
+        if cur.fetchone() is None:
+            # minimal builds lack the contrib extensions; gen_random_uuid is built in since PostgreSQL 13
+            sql = sql.replace(
+                'CREATE EXTENSION IF NOT EXISTS "uuid-ossp";',
+                "CREATE FUNCTION uuid_generate_v4() RETURNS uuid AS 'SELECT gen_random_uuid()' LANGUAGE sql;",
+            )
+        cur.execute(sql)
+    conn.commit()
+
+
+class Fleet:
+    """The seeded users and devices."""
+
+    def __init__(self, conn, users: int, devices: int, warnings: int):
+        """Seed the database.
+
+        Args:
+            conn: connection to the empty database, with the schema applied.
+            users (int): number of normal users; one admin is added.
+            devices (int): number of registered devices, spread evenly over the normal users.
+            warnings (int): number of devices with a hardware change warning.
+        """
+        self.users = [f"user{i:05d}" for i in range(users)]
+        self.admin = "admin"
+        with conn.cursor() as cur:
+            execute_values(cur, "INSERT INTO autopi.user (username, is_admin) VALUES %s;", [(self.admin, True)])
+            execute_values(cur, "INSERT INTO autopi.user (username) VALUES %s;", [(u,) for u in self.users])
+            rows = [
+                (self.users[i % users], f"pi-{i:05d}", f"{i:064x}", f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}")
+                for i in range(devices)
+            ]
+            query = """
+                INSERT INTO autopi.raspi (username, alias, hardware_id, ip_addr, ssid, ssh, vnc, power, state_digest)
+                VALUES %s RETURNING device_id::text, hardware_id, state_digest;
+            """
+            template = "(%s, %s, %s, %s, 'CSMwireless', 'up', 'down', 'on', md5(%s))"
+            self.devices = execute_values(
+                cur, query, [(*row, row[2]) for row in rows], template=template, page_size=1000, fetch=True
+            )
+            warned = [(devid, HW_CHANGE_WARNING) for devid, _, _ in self.devices[:warnings]]
+            execute_values(cur, "INSERT INTO autopi.raspi_warning (device_id, warning) VALUES %s;", warned)
+            cur.execute("SELECT autopi.publish_network_profile(%s);", (PROFILE,))
+            self.profile_hash = cur.fetchone()[0]
+        conn.commit()
+
+
+def heartbeat(device: tuple) -> dict:
+    """Build a compact heartbeat whose digest matches the seeded state."""
+    devid, _, digest = device
+    return {"version": 2, "devid": devid, "event": "keepalive", "digest": digest}
+
+
+def full_state(device: tuple, rng: random.Random) -> dict:
+    """Build a full state with a new address, as after a reconnect."""
+    devid, hwid, _ = device
+    ip = f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}"
+    digest = f"{rng.getrandbits(64):016x}"
+    return {"version": 2, "devid": devid, "event": "net_update", "digest": digest, "hwid": hwid, "ip": ip}
+
+
+def endpoints(fleet: Fleet, seed: int) -> Dict[str, Callable[[int], dict]]:
+    """Get the request builders of the benchmarked endpoints, by name; each maps a request number to httpx arguments."""
+    rng = random.Random(seed)
+    return {
+        "root": lambda i: {"method": "GET", "url": "/", "headers": {"uid": rng.choice(fleet.users)}},
+        "root_admin": lambda i: {"method": "GET", "url": "/", "headers": {"uid": fleet.admin}},
+        "register": lambda i: {"method": "GET", "url": "/register", "headers": {"uid": rng.choice(fleet.users)}},
+        "help": lambda i: {"method": "GET", "url": "/help"},
+        "status_heartbeat": lambda i: {
+            "method": "POST",
+            "url": "/api/status",
+            "json": heartbeat(rng.choice(fleet.devices)),
+        },
+        "status_full": lambda i: {
+            "method": "POST",
+            "url": "/api/status",
+            "json": full_state(rng.choice(fleet.devices), rng),
+        },
+        "status_batch": lambda i: {
+            "method": "POST",
+            "url": "/api/status/batch",
+            "json": [
+                heartbeat(device) if rng.random() < 0.8 else full_state(device, rng)
+                for device in rng.sample(fleet.devices, min(BATCH_SIZE, len(fleet.devices)))
+            ],
+        },
+        "network_profile": lambda i: {
+            "method": "GET",
+            "url": "/api/network_profile",
+            # devices only fetch a profile they do not have, but proxies and retries revalidate
+            "headers": {"devid": rng.choice(fleet.devices)[0]}
+            if i % 2
+            else {"devid": rng.choice(fleet.devices)[0], "If-None-Match": f'"{fleet.profile_hash}"'},
+        },
+    }
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Get the nearest-rank percentile of sorted values."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+async def drive(build: Callable[[int], dict], requests: int, concurrency: int, warmup: int) -> dict:
+    """Send requests to the app with a fixed number in flight, and summarize them."""
+    transport = httpx.ASGITransport(app=api_main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for i in range(warmup):
+            await client.request(**build(i))
+        Counters.take()
+        latencies: List[float] = []
+        errors = 0
+        numbers = iter(range(requests))
+
+        async def worker():
+            nonlocal errors
+            for i in numbers:
+                start = time.perf_counter()
+                resp = await client.request(**build(i))
+                latencies.append(time.perf_counter() - start)
+                errors += resp.status_code >= 400
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    counts = Counters.take()
+    latencies.sort()
+    result = {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": requests / elapsed,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        **{f"p{p}_ms": percentile(latencies, p) * 1000 for p in (50, 95, 99)},
+        **{f"{name}_per_request": count / requests for name, count in counts.items()},
+    }
+    result["round_trips_per_request"] = result["statements_per_request"] + 2 * result["transactions_per_request"]
+    return result
+
+
+def print_results(results: Dict[str, dict], previous: Optional[Dict[str, dict]] = None):
+    """Print a table of results, with the ratio to a previous run where it has the endpoint."""
+    print(
+        f"{'endpoint':<18} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8} {'errors':>6} "
+        f"{'conns':>6} {'stmts':>6} {'trips':>6}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<18} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} {r['throughput_rps']:>8.1f} "
+            f"{r['errors']:>6} {r['connections_per_request']:>6.1f} {r['statements_per_request']:>6.1f} "
+            f"{r['round_trips_per_request']:>6.1f}"
+        )
+        old = (previous or {}).get(name)
+        if old is not None:
+            ratios = [r[key] / old[key] if old[key] else math.nan for key in ("p50_ms", "p95_ms", "p99_ms")]
+            throughput = r["throughput_rps"] / old["throughput_rps"] if old["throughput_rps"] else math.nan
+            trips = r["round_trips_per_request"] - old["round_trips_per_request"]
+            print(
+                f"{'  vs previous':<18} {ratios[0]:>7.2f}x {ratios[1]:>7.2f}x {ratios[2]:>7.2f}x {throughput:>7.2f}x "
+                f"{'':>6} {'':>6} {'':>6} {trips:>+6.1f}"
+            )
+
+
+def git_commit() -> Optional[str]:
+    """Get the commit of the working tree, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    """Start a database, seed it, benchmark the endpoints and report."""
+    parser = argparse.ArgumentParser(description="Benchmark the API endpoints against a throwaway database.")
+    parser.add_argument("--users", type=int, default=200, help="normal users to seed. Defaults to 200")
+    parser.add_argument("--devices", type=int, default=2000, help="devices to seed. Defaults to 2000")
+    parser.add_argument("--warnings", type=int, default=100, help="devices with a warning. Defaults to 100")
+    parser.add_argument("-n", "--requests", type=int, default=500, help="requests per endpoint. Defaults to 500")
+    parser.add_argument("-c", "--concurrency", type=int, default=8, help="requests in flight. Defaults to 8")
+    parser.add_argument("--warmup", type=int, default=20, help="untimed requests per endpoint. Defaults to 20")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the request mix. Defaults to 0")
+    parser.add_argument(
+        "--endpoint", action="append", choices=ENDPOINTS, help="benchmark only this endpoint (repeatable)"
+    )
+    server = parser.add_mutually_exclusive_group()
+    server.add_argument("--dsn", help="use this existing, empty database instead of a throwaway one")
+    server.add_argument("--docker", metavar="IMAGE", help="run the throwaway database in a container of IMAGE")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE as JSON")
+    parser.add_argument("--compare", metavar="FILE", help="print the change from the results saved in FILE")
+    args = parser.parse_args()
+    if args.users < 1 or args.devices < 1:
+        parser.error("at least one user and one device are needed")
+
+    if args.dsn:
+        database = contextlib.nullcontext({"dsn": args.dsn})
+    elif args.docker:
+        database = docker_postgres(args.docker)
+    else:
+        database = local_postgres()
+    with database as params:
+        conn = psycopg2.connect(**params)
+        try:
+            apply_schema(conn)
+            fleet = Fleet(conn, args.users, args.devices, args.warnings)
+            with conn.cursor() as cur:
+                cur.execute("SHOW server_version;")
+                server_version = cur.fetchone()[0]
+        finally:
+            conn.close()
+
+        # the production role is named after the schema, so unqualified table names resolve to it
+        credentials = {
+            **params,
+            "options": "-c search_path=autopi,public",
+            "connection_factory": CountingConnection,
+            "cursor_factory": CountingCursor,
+        }
+        builders = endpoints(fleet, args.seed)
+        results = {}
+        # update_status prints every status; keep it out of the report
+        with mock.patch.object(api_db, "get_db_credentials", return_value=credentials), open(
+            os.devnull, "w"
+        ) as devnull:
+            for name in args.endpoint or ENDPOINTS:
+                with contextlib.redirect_stdout(devnull):
+                    results[name] = asyncio.run(drive(builders[name], args.requests, args.concurrency, args.warmup))
+
+    previous = None
+    if args.compare:
+        with open(args.compare) as fin:
+            previous = json.load(fin)["results"]
+    print(f"PostgreSQL {server_version}; {args.users} users, {args.devices} devices, concurrency {args.concurrency}")
+    print_results(results, previous)
+    if args.json:
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "postgres": server_version,
+            "parameters": {
+                key: getattr(args, key)
+                for key in ("users", "devices", "warnings", "requests", "concurrency", "warmup", "seed")
+            },
+            "results": results,
+        }
+        with open(args.json, "w") as fout:
+            json.dump(report, fout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
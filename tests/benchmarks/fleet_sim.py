@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+
+"""Simulate a fleet of devices sending status requests to an API server, to size the server.
+
+Usage: `tests/benchmarks/fleet_sim.py BASE_URL [--devices N] [--duration S] [--speed X] [--timing lockstep|jittered]
+[--ramp STEPS] [--new-devices K] [--fleet FILE] [--json FILE]`. Run from the project root with httpx installed.
+
+Requests are built with generate_request.build_request and sent the way generate_request.py sends them: compact
+encoding with a JSON fallback, a full state when the server asks for it, and keepalives scheduled from the server's
+hints (`--timing jittered`) or on the same timer tick on every device (`--timing lockstep`, as before the hints).
+Devices boot together at the start (a boot storm), then send keepalives and, at the given rates per device and hour,
+address changes, service changes, hardware swaps and reboots. `--new-devices` register during the run.
+
+The devices are registered through `/register`, with the `uid` header the login proxy would set, and the fleet is saved
+to `--fleet FILE` to be reused by later runs. Point the simulator at a test deployment that accepts the header, e.g.
+the API container or `uvicorn web.api.main:app` with its own database, not at the production server.
+
+`--speed` runs the simulated clock faster than real time, which multiplies the request rate. With `--ramp STEPS`,
+the fleet grows in STEPS equal phases of `--duration` seconds; the latency and error rate of each phase show where the
+server saturates.
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import math
+import random
+import re
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+ROOT = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT / "src" / "autopi"))
+
+import generate_request  # noqa: E402
+import httpx  # noqa: E402
+from util import compact_status  # noqa: E402
+from util.config import Config  # noqa: E402
+from util.heartbeat import next_due  # noqa: E402
+
+DEVID_PATTERN = re.compile(r"<h1>([0-9a-f-]{36})</h1>")
+
+
+class Histogram:
+    """Latencies in logarithmic buckets (1 ms, doubling every two buckets, up to 32 s), with exact percentiles."""
+
+    EDGES = [0.001 * 2 ** (k / 2) for k in range(31)]
+
+    def __init__(self):
+        """Create an empty histogram."""
+        self.counts = [0] * (len(self.EDGES) + 1)
+        self.values: List[float] = []
+
+    def add(self, latency: float):
+        """Record a latency in seconds."""
+        self.counts[bisect.bisect_left(self.EDGES, latency)] += 1
+        self.values.append(latency)
+
+    def percentile(self, p: float) -> float:
+        """Get the nearest-rank percentile in seconds, or NaN if empty."""
+        if not self.values:
+            return math.nan
+        values = sorted(self.values)
+        return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+    def render(self, width: int = 50) -> List[str]:
+        """Draw the non-empty range of buckets as text bars."""
+        used = [i for i, count in enumerate(self.counts) if count]
+        if not used:
+            return []
+        top = max(self.counts)
+        lines = []
+        for i in range(used[0], used[-1] + 1):
+            label = (
+                f"< {self.EDGES[i] * 1000:8.1f} ms" if i < len(self.EDGES) else f">= {self.EDGES[-1] * 1000:7.0f} ms"
+            )
+            lines.append(f"{label} {self.counts[i]:>8} {'#' * math.ceil(self.counts[i] / top * width)}")
+        return lines
+
+
+class Stats:
+    """Outcomes of the requests sent during one phase, by kind of request."""
+
+    def __init__(self, devices: int):
+        """Create empty stats for a phase with a number of active devices."""
+        self.devices = devices
+        self.latency: Dict[str, Histogram] = {}
+        self.outcomes: Counter = Counter()
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+
+    def record(self, kind: str, sent: float, latency: float, outcome):
+        """Record a request: its kind, wall time sent, latency in seconds and HTTP status or error name."""
+        self.latency.setdefault(kind, Histogram()).add(latency)
+        self.outcomes[(kind, outcome)] += 1
+        self.first = sent if self.first is None else min(self.first, sent)
+        self.last = sent + latency if self.last is None else max(self.last, sent + latency)
+
+    @property
+    def requests(self) -> int:
+        """Get the number of requests."""
+        return sum(self.outcomes.values())
+
+    @property
+    def errors(self) -> int:
+        """Get the number of requests that failed: no response, or a server error."""
+        return sum(n for (_, outcome), n in self.outcomes.items() if isinstance(outcome, str) or outcome >= 500)
+
+    def overall(self) -> Histogram:
+        """Get the latencies of all kinds."""
+        merged = Histogram()
+        for histogram in self.latency.values():
+            merged.counts = [a + b for a, b in zip(merged.counts, histogram.counts)]
+            merged.values.extend(histogram.values)
+        return merged
+
+    def summary(self) -> dict:
+        """Summarize the phase for printing and JSON."""
+        elapsed = (self.last - self.first) if self.requests else 0.0
+        overall = self.overall()
+        return {
+            "devices": self.devices,
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": self.errors / self.requests if self.requests else 0.0,
+            "throughput_rps": self.requests / elapsed if elapsed > 0 else 0.0,
+            **{f"p{p}_ms": overall.percentile(p) * 1000 for p in (50, 95, 99)},
+            "by_kind": {
+                kind: {
+                    "requests": len(histogram.values),
+                    **{f"p{p}_ms": histogram.percentile(p) * 1000 for p in (50, 95, 99)},
+                    "outcomes": {str(o): n for (k, o), n in sorted(self.outcomes.items(), key=str) if k == kind},
+                }
+                for kind, histogram in sorted(self.latency.items())
+            },
+            "histogram": overall.counts,
+        }
+
+
+class Device:
+    """A simulated device: its IDs, the state it reports and the state it last sent."""
+
+    def __init__(self, devid: str, hwid: str, index: int):
+        """Create a device with a state derived from its index."""
+        self.ids = {"hwid": hwid, "devid": devid}
+        self.info = {
+            "ip": f"10.{index // 65536 % 256}.{index // 256 % 256}.{index % 256}",
+            "mac": "b8:27:eb:{:02x}:{:02x}:{:02x}".format(index // 65536 % 256, index // 256 % 256, index % 256),
+            "ssid": "CSMwireless",
+            "ssh": "up",
+            "vnc": "down",
+        }
+        self.last_info: Optional[dict] = None
+        self.next_due: Optional[float] = None
+
+    def request(self, event: str, force: bool = False, reasons: Optional[List[str]] = None) -> dict:
+        """Build a request as generate_request does, recording the state as sent."""
+        if event == "shutdown":
+            return generate_request.build_request(event, self.ids, {})
+        unchanged = not force and self.last_info == self.info
+        self.last_info = dict(self.info)
+        return generate_request.build_request(event, self.ids, dict(self.info), unchanged, reasons)
+
+
+class Simulation:
+    """A fleet run against one server, on a simulated clock."""
+
+    def __init__(self, args: argparse.Namespace, client: httpx.AsyncClient):
+        """Prepare a run; see main for the arguments."""
+        self.args = args
+        self.client = client
+        self.rng = random.Random(args.seed)
+        self.status_url = args.base_url.rstrip("/") + "/api/status"
+        self.register_url = args.base_url.rstrip("/") + "/register"
+        self.phases: List[Stats] = []
+        self.t0 = 0.0
+
+    def now(self) -> float:
+        """Get the simulated time in seconds since the start."""
+        return (time.monotonic() - self.t0) * self.args.speed
+
+    async def sleep_until(self, at: float):
+        """Wait until a simulated time."""
+        delay = (at - self.now()) / self.args.speed
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _stats(self) -> Stats:
+        phase = min(len(self.phases) - 1, int(self.now() // self.args.duration))
+        return self.phases[max(0, phase)]
+
+    async def _post(self, request: dict, kind: str) -> Optional[httpx.Response]:
+        """Send a request as send_request does, recording its outcome."""
+        body, content_type = None, "application/json"
+        if self.args.encoding == "compact":
+            try:
+                body, content_type = compact_status.encode_status(request), compact_status.CONTENT_TYPE
+            except ValueError:
+                pass
+        if body is None:
+            body = json.dumps(request).encode("utf-8")
+        stats = self._stats()
+        sent = time.monotonic()
+        try:
+            resp = await self.client.post(self.status_url, content=body, headers={"Content-Type": content_type})
+            if content_type == compact_status.CONTENT_TYPE and resp.status_code in (415, 422):
+                stats.record(kind, sent, time.monotonic() - sent, resp.status_code)
+                sent = time.monotonic()
+                resp = await self.client.post(self.status_url, json=request)
+        except httpx.HTTPError as e:
+            stats.record(kind, sent, time.monotonic() - sent, type(e).__name__)
+            return None
+        stats.record(kind, sent, time.monotonic() - sent, resp.status_code)
+        return resp
+
+    async def send(self, device: Device, event: str, force: bool = False, reasons: Optional[List[str]] = None):
+        """Send an event from a device, following the server's reply."""
+        request = device.request(event, force, reasons)
+        kind = "heartbeat" if event != "shutdown" and "hwid" not in request else event
+        sent_at = self.now()
+        resp = await self._post(request, kind)
+        if resp is None or resp.status_code >= 400:
+            return
+        try:
+            reply = resp.json()
+        except ValueError:
+            return
+        if reply.get("action") == generate_request.SEND_FULL_STATE:
+            sent_at = self.now()
+            resp = await self._post(device.request(event, True, reasons), "full_state_resend")
+            if resp is None or resp.status_code >= 400:
+                return
+            reply = resp.json()
+        try:
+            device.next_due = next_due(sent_at, float(reply["next_interval"]), float(reply["phase_offset"]))
+        except (KeyError, TypeError, ValueError):
+            device.next_due = None
+
+    def keepalive_due(self, device: Device) -> float:
+        """Get when a device's next keepalive is sent."""
+        tick = Config.HEARTBEAT_TICK
+        if self.args.timing == "lockstep":
+            return (math.floor(self.now() / tick) + 1) * tick
+        if device.next_due is None or device.next_due <= self.now():
+            device.next_due = self.now() + tick
+        return device.next_due + self.rng.uniform(0, self.args.jitter)
+
+    async def run_device(self, device: Device, start_at: float, end: float):
+        """Boot a device and run its events until the end of the simulation."""
+        await self.sleep_until(start_at)
+        await self.send(device, "start", force=True)
+        rates = {
+            "net_update": self.args.ip_changes,
+            "vnc_change": self.args.service_changes,
+            "hw_swap": self.args.hw_swaps,
+            "reboot": self.args.reboots,
+        }
+        upcoming = {kind: self.now() + self.rng.expovariate(rate / 3600) for kind, rate in rates.items() if rate > 0}
+        while True:
+            due = self.keepalive_due(device)
+            kind, at = min(upcoming.items(), key=lambda item: item[1], default=(None, math.inf))
+            if min(due, at) >= end:
+                return
+            if due <= at:
+                await self.sleep_until(due)
+                await self.send(device, "keepalive")
+                continue
+            await self.sleep_until(at)
+            upcoming[kind] = at + self.rng.expovariate(rates[kind] / 3600)
+            if kind == "net_update":
+                device.info["ip"] = f"10.{self.rng.randrange(256)}.{self.rng.randrange(256)}.{self.rng.randrange(256)}"
+                await self.send(device, "net_update", reasons=["net_update"])
+            elif kind == "vnc_change":
+                device.info["vnc"] = "up" if device.info["vnc"] == "down" else "down"
+                await self.send(device, "vnc_change", reasons=["vnc_change"])
+            elif kind == "hw_swap":
+                device.ids["hwid"] = f"{self.rng.getrandbits(256):064x}"
+                await self.send(device, "start", force=True)
+            else:
+                await self.send(device, "shutdown")
+                await self.sleep_until(self.now() + self.args.reboot_time)
+                device.next_due = None
+                await self.send(device, "start", force=True)
+
+    async def register(self, user: str, record: bool = True) -> Optional[Device]:
+        """Register a new device for a user: get an ID from /register, then boot with a new hardware ID."""
+        sent = time.monotonic()
+        try:
+            resp = await self.client.get(self.register_url, headers={"uid": user})
+        except httpx.HTTPError as e:
+            if record:
+                self._stats().record("register", sent, time.monotonic() - sent, type(e).__name__)
+            return None
+        if record:
+            self._stats().record("register", sent, time.monotonic() - sent, resp.status_code)
+        match = DEVID_PATTERN.search(resp.text)
+        if match is None:
+            return None
+        device = Device(match.group(1), f"{self.rng.getrandbits(256):064x}", self.rng.getrandbits(24))
+        if not record:
+            # the next /register for this user only gives a new ID once this one has reported a hardware ID
+            await self.client.post(self.status_url, json=device.request("start", force=True))
+        return device
+
+    async def register_fleet(self, count: int) -> List[Device]:
+        """Register devices before the run, a few users at a time; each user's devices one after another."""
+        users = [f"sim{i:04d}" for i in range(self.args.users)]
+        devices: List[Device] = []
+
+        async def register_user(user: str, n: int):
+            for _ in range(n):
+                device = await self.register(user, record=False)
+                if device is None:
+                    raise RuntimeError(f"registration failed for {user}; does the server accept the uid header?")
+                devices.append(device)
+
+        per_user = [count // len(users) + (i < count % len(users)) for i in range(len(users))]
+        await asyncio.gather(*(register_user(user, n) for user, n in zip(users, per_user) if n))
+        return devices
+
+    async def join(self, at: float, end: float):
+        """Register a new device at a simulated time and run it."""
+        await self.sleep_until(at)
+        device = await self.register(f"sim{self.rng.randrange(self.args.users):04d}")
+        if device is not None:
+            await self.run_device(device, self.now(), end)
+
+    async def run(self, devices: List[Device]):
+        """Run the fleet, growing it over the ramp phases, with new devices joining during the run."""
+        steps = self.args.ramp
+        end = steps * self.args.duration
+        sizes = [round(len(devices) * (k + 1) / steps) for k in range(steps)]
+        self.phases = [Stats(size) for size in sizes]
+        tasks = []
+        self.t0 = time.monotonic()
+        for k, size in enumerate(sizes):
+            start = k * self.args.duration
+            for device in devices[sizes[k - 1] if k else 0 : size]:
+                offset = 0.0 if self.args.timing == "lockstep" else self.rng.uniform(0, self.args.boot_window)
+                tasks.append(self.run_device(device, start + offset, end))
+        for _ in range(self.args.new_devices):
+            tasks.append(self.join(self.rng.uniform(0, end), end))
+        await asyncio.gather(*tasks)
+
+
+def load_fleet(path: Optional[str]) -> List[Device]:
+    """Load the devices saved by an earlier run, or none."""
+    if path is None:
+        return []
+    try:
+        with open(path) as fin:
+            return [Device(devid, hwid, i) for i, (devid, hwid) in enumerate(json.load(fin))]
+    except FileNotFoundError:
+        return []
+
+
+def print_report(phases: List[dict], slo_ms: float, max_error_rate: float):
+    """Print the phases, the saturation point, and the latency by kind and histogram of the last phase."""
+    print(f"{'phase':>5} {'devices':>8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    saturated = None
+    for k, phase in enumerate(phases):
+        print(
+            f"{k + 1:>5} {phase['devices']:>8} {phase['throughput_rps']:>8.1f} {phase['p50_ms']:>8.1f} "
+            f"{phase['p95_ms']:>8.1f} {phase['p99_ms']:>8.1f} {phase['error_rate']:>7.1%}"
+        )
+        if saturated is None and (phase["p95_ms"] > slo_ms or phase["error_rate"] > max_error_rate):
+            saturated = k
+    if saturated is None:
+        print(f"Not saturated: p95 <= {slo_ms:g} ms and errors <= {max_error_rate:.1%} in every phase")
+    elif saturated == 0:
+        print("Saturated in the first phase")
+    else:
+        ok = phases[saturated - 1]
+        print(
+            f"Saturated at phase {saturated + 1} ({phases[saturated]['devices']} devices); the server kept up with "
+            f"{ok['devices']} devices at {ok['throughput_rps']:.1f} req/s"
+        )
+    last = phases[-1]
+    print()
+    print(f"{'kind':<18} {'requests':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}  outcomes")
+    for kind, stats in last["by_kind"].items():
+        outcomes = ", ".join(f"{o}: {n}" for o, n in stats["outcomes"].items())
+        print(
+            f"{kind:<18} {stats['requests']:>8} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+            f"{stats['p99_ms']:>8.1f}  {outcomes}"
+        )
+    histogram = Histogram()
+    histogram.counts = last["histogram"]
+    print()
+    print("\n".join(histogram.render()))
+
+
+def main():
+    """Register or load a fleet, run it against the server and report."""
+    parser = argparse.ArgumentParser(description="Simulate a fleet of devices against an API server.")
+    parser.add_argument("base_url", help="server to load, e.g. http://localhost:8000")
+    parser.add_argument("--devices", type=int, default=100, help="devices in the fleet. Defaults to 100")
+    parser.add_argument("--users", type=int, default=50, help="users owning the devices. Defaults to 50")
+    parser.add_argument("--fleet", metavar="FILE", help="load the fleet from FILE if it exists; save it there")
+    parser.add_argument("--duration", type=float, default=600, help="simulated seconds per phase. Defaults to 600")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulated seconds per real second. Defaults to 1")
+    parser.add_argument("--ramp", type=int, default=1, help="phases over which the fleet grows. Defaults to 1")
+    parser.add_argument(
+        "--timing",
+        choices=("lockstep", "jittered"),
+        default="jittered",
+        help="keepalives on the same tick everywhere, or per the server's hints. Defaults to jittered",
+    )
+    parser.add_argument("--jitter", type=float, default=1.0, help="timer accuracy in seconds. Defaults to 1")
+    parser.add_argument(
+        "--boot-window", type=float, default=30.0, help="seconds over which devices boot. Defaults to 30"
+    )
+    parser.add_argument(
+        "--ip-changes", type=float, default=0.5, help="address changes per device-hour. Defaults to 0.5"
+    )
+    parser.add_argument("--service-changes", type=float, default=0.2, help="per device-hour. Defaults to 0.2")
+    parser.add_argument("--hw-swaps", type=float, default=0.01, help="per device-hour. Defaults to 0.01")
+    parser.add_argument("--reboots", type=float, default=0.1, help="per device-hour. Defaults to 0.1")
+    parser.add_argument("--reboot-time", type=float, default=30.0, help="simulated seconds down. Defaults to 30")
+    parser.add_argument("--new-devices", type=int, default=0, help="devices registering during the run. Defaults to 0")
+    parser.add_argument("--encoding", choices=("compact", "json"), default="compact", help="Defaults to compact")
+    parser.add_argument("--keepalive", action="store_true", help="reuse connections (devices do not)")
+    parser.add_argument("--connections", type=int, default=1000, help="open connections at most. Defaults to 1000")
+    parser.add_argument("--insecure", action="store_true", help="do not verify the server certificate")
+    parser.add_argument("--slo", type=float, default=1000.0, help="p95 latency in ms beyond which a phase is saturated")
+    parser.add_argument("--max-errors", type=float, default=0.01, help="error rate beyond which a phase is saturated")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the simulation. Defaults to 0")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE as JSON")
+    args = parser.parse_args()
+    if args.devices < 1 or args.users < 1 or args.ramp < 1 or args.speed <= 0:
+        parser.error("--devices, --users, --ramp and --speed must be positive")
+    if args.speed * Config.REQUEST_TIMEOUT > Config.HEARTBEAT_MIN_INTERVAL:
+        print("Note: at this speed a slow request can outlast a simulated heartbeat interval", file=sys.stderr)
+
+    async def simulate() -> List[dict]:
+        limits = httpx.Limits(
+            max_connections=args.connections, max_keepalive_connections=args.connections if args.keepalive else 0
+        )
+        timeout = httpx.Timeout(Config.REQUEST_TIMEOUT, pool=None)
+        async with httpx.AsyncClient(limits=limits, timeout=timeout, verify=not args.insecure) as client:
+            sim = Simulation(args, client)
+            devices = load_fleet(args.fleet)[: args.devices]
+            if len(devices) < args.devices:
+                print(f"Registering {args.devices - len(devices)} devices...", file=sys.stderr)
+                devices += await sim.register_fleet(args.devices - len(devices))
+                if args.fleet:
+                    with open(args.fleet, "w") as fout:
+                        json.dump([[d.ids["devid"], d.ids["hwid"]] for d in devices], fout)
+            await sim.run(devices)
+            return [phase.summary() for phase in sim.phases]
+
+    phases = asyncio.run(simulate())
+    print_report(phases, args.slo, args.max_errors)
+    if args.json:
+        report = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "parameters": {key: value for key, value in vars(args).items() if key not in ("json", "fleet")},
+            "histogram_edges_ms": [edge * 1000 for edge in Histogram.EDGES],
+            "phases": phases,
+        }
+        with open(args.json, "w") as fout:
+            json.dump(report, fout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+
+"""Time the hot helpers of the client and the API on synthetic inputs, and compare with a saved baseline.
+
+Usage: `tests/benchmarks/micro_bench.py [PATTERN ...] [--max-ratio R] [--update-baseline]`. Run with the API
+dependencies (airium) installed. PATTERN selects benchmarks by name, e.g. `wpa.*`.
+
+Each benchmark is timed as the best of several repeats. A result is a regression when it is slower than the baseline
+by more than --max-ratio, widened by the measured noise of both runs; the script then exits with status 1.
+"""
+
+import argparse
+import datetime
+import fnmatch
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "src" / "autopi"))
+
+import generate_request  # noqa: E402
+from airium import Airium  # noqa: E402
+from util import network_import  # noqa: E402
+from util import wpa_psk  # noqa: E402
+from util import wpa_interface as wpa  # noqa: E402
+from util.wpa_config import WpaConfig  # noqa: E402
+
+from web.api import generate_html  # noqa: E402
+
+BASELINE = Path(__file__).absolute().parent / "micro_baseline.json"
+COLUMNS = ["Name", "IP Address", "SSID", "SSH", "VNC", "Last Updated", "Username"]
+
+PSK_NETWORKS = 32
+
+BENCHMARKS: Dict[str, Callable[[argparse.Namespace], Callable[[], object]]] = {}
+SIZES: Dict[str, Optional[str]] = {}
+
+
+def benchmark(name: str, size: Optional[str] = None):
+    """Register a benchmark: a function that builds the inputs and returns the call to time.
+
+    Args:
+        name (str): name of the benchmark.
+        size (str | None, optional): the option setting its input size ("rows" or "networks"). Defaults to None.
+    """
+
+    def register(setup):
+        BENCHMARKS[name] = setup
+        SIZES[name] = size
+        return setup
+
+    return register
+
+
+def raspi_rows(count: int, seed: int = 0) -> List[tuple]:
+    """Make rows as returned by PiDBConnection.get_raspis (device ID first), some of them stale or dead."""
+    rng = random.Random(seed)
+    now = datetime.datetime.now(datetime.timezone.utc)
+    rows = []
+    for i in range(count):
+        updated = now - datetime.timedelta(seconds=rng.choice((30, 30, 30, 600, 7200)))
+        rows.append(
+            (
+                f"0b3f1c2e-0000-4000-8000-{i:012d}",
+                f"device-{i}",
+                f"10.{i // 65536}.{i // 256 % 256}.{i % 256}",
+                rng.choice(("CSMwireless", "CSM-Guest", "eduroam")),
+                rng.choice(("up", "up", "down")),
+                rng.choice(("up", "down")),
+                updated,
+                f"user{i % 200}",
+            )
+        )
+    return rows
+
+
+def wpa_config_text(count: int, seed: int = 0) -> str:
+    """Make a wpa config with a header and count networks, as written by make_network."""
+    rng = random.Random(seed)
+    lines = ["ctrl_interface=DIR=/var/run/wpa_supplicant GROUP=netdev\n", "update_config=1\n", "country=US\n"]
+    for i in range(count):
+        lines += [
+            "\n",
+            "network={\n",
+            f'\tssid="network-{i}"\n',
+            f"\tpsk={rng.getrandbits(256):064x}\n",
+            f"\tpriority={rng.randint(0, 3)}\n",
+            "}\n",
+        ]
+    return "".join(lines)
+
+
+def network_list_lines(count: int) -> List[str]:
+    """Make the lines of a network list in the key=value block format, as read by add_network_from_txt.py."""
+    lines = ["# networks to add\n"]
+    for i in range(count):
+        lines += [f"ssid=network-{i}\n", f"password=password-{i}\n", f"priority={i % 4}\n", "\n"]
+    return lines
+
+
+class UncachedPsks(wpa_psk.PskCache):
+    """A PSK cache that never hits, so that every call derives its PSKs."""
+
+    def get(self, ssid: str, passphrase: str) -> Optional[str]:
+        """Miss."""
+        return None
+
+    def update(self, psks):
+        """Keep nothing."""
+
+
+def last_network(config: str) -> str:
+    """Get the text of the last network block, the worst case for a search."""
+    return WpaConfig.parse(config).networks[-1].text
+
+
+@benchmark("html.construct_row", size="rows")
+def bench_construct_row(args: argparse.Namespace) -> Callable[[], object]:
+    """Classify every cell of a table, as / does for the admin."""
+    rows = raspi_rows(args.rows)
+    return lambda: [generate_html.construct_row(zip(COLUMNS, items[1:]), items[0]) for items in rows]
+
+
+@benchmark("html.build_table", size="rows")
+def bench_build_table(args: argparse.Namespace) -> Callable[[], object]:
+    """Render a table of rows to HTML."""
+    rows = [generate_html.construct_row(zip(COLUMNS, items[1:]), items[0]) for items in raspi_rows(args.rows)]
+    return lambda: str(generate_html.build_table(Airium(), rows))
+
+
+@benchmark("html.homepage", size="rows")
+def bench_homepage(args: argparse.Namespace) -> Callable[[], object]:
+    """Render the admin's home page: both tables and the page around them."""
+    rows = [generate_html.construct_row(zip(COLUMNS, items[1:]), items[0]) for items in raspi_rows(args.rows)]
+    owned, other = rows[:10], rows[10:]
+    return lambda: generate_html.build_page("AutoPi", str(generate_html.build_homepage_content(owned, [], other)))
+
+
+@benchmark("wpa.parse", size="networks")
+def bench_wpa_parse(args: argparse.Namespace) -> Callable[[], object]:
+    """Parse a config and serialize it again."""
+    text = wpa_config_text(args.networks)
+    return lambda: WpaConfig.parse(text).dumps()
+
+
+@benchmark("wpa.find", size="networks")
+def bench_wpa_find(args: argparse.Namespace) -> Callable[[], object]:
+    """Parse a config and look up an SSID, which builds the SSID index."""
+    text = wpa_config_text(args.networks)
+    ssid = f"network-{args.networks - 1}"
+    return lambda: WpaConfig.parse(text).find(ssid)
+
+
+@benchmark("wpa.network_exists", size="networks")
+def bench_network_exists(args: argparse.Namespace) -> Callable[[], object]:
+    """Check a config file for the network it ends with."""
+    text = wpa_config_text(args.networks)
+    fd, path = tempfile.mkstemp(prefix="micro_bench_wpa.", suffix=".conf")
+    with os.fdopen(fd, "w") as fout:
+        fout.write(text)
+    args.cleanup.append(path)
+    network = last_network(text)
+    return lambda: wpa.network_exists(network, path)
+
+
+@benchmark("wpa.edit", size="networks")
+def bench_wpa_edit(args: argparse.Namespace) -> Callable[[], object]:
+    """Replace a network in memory, as an edit session does before saving."""
+    text = wpa_config_text(args.networks)
+    ssid = f"network-{args.networks // 2}"
+    network = f'network={{\n\tssid="{ssid}"\n\tpsk={"0" * 64}\n}}\n'
+
+    def edit():
+        config = WpaConfig.parse(text)
+        config.remove_ssid(ssid, all_matches=True)
+        config.add(network)
+        return config.dumps()
+
+    return edit
+
+
+@benchmark("wpa.make_network")
+def bench_make_network(args: argparse.Namespace) -> Callable[[], object]:
+    """Make a protected network: derive its PSK and format it."""
+    wpa_psk._cache = UncachedPsks()  # the PSK cache would turn every call after the first into a lookup
+    return lambda: wpa.make_network("network-0", "password-0", 2)
+
+
+@benchmark("wpa.make_networks")
+def bench_make_networks(args: argparse.Namespace) -> Callable[[], object]:
+    """Make a list of protected networks, deriving their PSKs in parallel."""
+    wpa_psk._cache = UncachedPsks()
+    networks = [(f"network-{i}", f"password-{i}", i % 4) for i in range(PSK_NETWORKS)]
+    return lambda: wpa.make_networks(networks)
+
+
+@benchmark("import.parse_entries", size="networks")
+def bench_parse_entries(args: argparse.Namespace) -> Callable[[], object]:
+    """Read a network list with network_import.parse_entries."""
+    lines = network_list_lines(args.networks)
+    return lambda: list(network_import.parse_entries(lines))
+
+
+@benchmark("request.build_full")
+def bench_build_full(args: argparse.Namespace) -> Callable[[], object]:
+    """Build a request with the full state and its digest."""
+    id_fields = {"hwid": "5f0c8e9e2a2b8d1d7f3c4a6b9e0d1c2b3a4f5e6d7c8b9a0f1e2d3c4b5a697887", "devid": "0b3f1c2e"}
+    info_fields = {"ip": "138.67.186.24", "mac": "b8:27:eb:12:34:56", "ssid": "CSMwireless", "ssh": "up", "vnc": "down"}
+    return lambda: generate_request.build_request("general", id_fields, info_fields)
+
+
+@benchmark("request.build_heartbeat")
+def bench_build_heartbeat(args: argparse.Namespace) -> Callable[[], object]:
+    """Build a compact heartbeat, whose digest is still computed over the full state."""
+    id_fields = {"hwid": "5f0c8e9e2a2b8d1d7f3c4a6b9e0d1c2b3a4f5e6d7c8b9a0f1e2d3c4b5a697887", "devid": "0b3f1c2e"}
+    info_fields = {"ip": "138.67.186.24", "mac": "b8:27:eb:12:34:56", "ssid": "CSMwireless", "ssh": "up", "vnc": "down"}
+    return lambda: generate_request.build_request("keepalive", id_fields, info_fields, unchanged=True)
+
+
+def calibration_workload():
+    """Do a fixed mix of interpreter work, used to compare runs from different machines."""
+    table = {str(i): i * i for i in range(2000)}
+    return sorted("".join(reversed(key)) for key, value in table.items() if value % 3)
+
+
+def measure(func: Callable[[], object], repeat: int, min_time: float) -> dict:
+    """Time a call: enough calls per repeat to take min_time seconds, then repeat.
+
+    Returns:
+        dict: seconds per call (best and median of the repeats), the spread of the repeats (interquartile range over
+        the median), the calls per repeat and the number of repeats.
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+    times = sorted(t / number for t in timer.repeat(repeat, number))
+    quartiles = statistics.quantiles(times, n=4) if len(times) > 1 else [times[0]] * 3
+    median = statistics.median(times)
+    return {
+        "best": times[0],
+        "median": median,
+        "spread": (quartiles[2] - quartiles[0]) / median,
+        "number": number,
+        "repeat": repeat,
+    }
+
+
+def machine() -> dict:
+    """Describe the machine and interpreter the results are from."""
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "system": platform.system(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def git_commit() -> Optional[str]:
+    """Get the commit of the working tree, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT, check=True, capture_output=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, baseline: dict, name: str, max_ratio: float, calibrated: bool) -> tuple:
+    """Compare a result with its baseline.
+
+    The allowed ratio is max_ratio widened by the larger spread of the two runs, so a noisy benchmark needs a larger
+    slowdown before it counts. With calibrated set, both times are divided by their run's calibration time first.
+
+    Returns:
+        tuple: (ratio of current to baseline time, allowed ratio, status), where status is "ok", "faster",
+        "regressed", "new" (no baseline) or "resized" (the baseline used other input sizes).
+    """
+    base = baseline["results"].get(name)
+    now = current["results"][name]
+    if base is None:
+        return None, None, "new"
+    if base["size"] != now["size"]:
+        return None, None, "resized"
+    ratio = now["best"] / base["best"]
+    if calibrated:
+        ratio /= current["calibration"]["best"] / baseline["calibration"]["best"]
+    limit = max_ratio * (1 + max(base["spread"], now["spread"]))
+    if ratio > limit:
+        return ratio, limit, "regressed"
+    if ratio < 1 / limit:
+        return ratio, limit, "faster"
+    return ratio, limit, "ok"
+
+
+def _ratio(value: Optional[float]) -> str:
+    return "" if value is None else f"{value:.2f}"
+
+
+def main():
+    """Run the selected benchmarks, compare them with the baseline and optionally save them."""
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pattern", nargs="*", metavar="PATTERN", help="run benchmarks matching these globs")
+    parser.add_argument("--list", action="store_true", help="list the benchmarks and exit")
+    parser.add_argument("--rows", type=int, default=10000, help="table rows. Defaults to 10000")
+    parser.add_argument("--networks", type=int, default=500, help="networks in configs and lists. Defaults to 500")
+    parser.add_argument("--repeat", type=int, default=7, help="repeats per benchmark. Defaults to 7")
+    parser.add_argument("--min-time", type=float, default=0.2, help="seconds per repeat. Defaults to 0.2")
+    parser.add_argument("--max-ratio", type=float, default=1.25, help="slowdown allowed before noise. Defaults to 1.25")
+    parser.add_argument("--retries", type=int, default=3, help="times to measure a regression again. Defaults to 3")
+    parser.add_argument("--baseline", type=Path, default=BASELINE, help="baseline file. Defaults to %(default)s")
+    parser.add_argument("--update-baseline", action="store_true", help="save the results to the baseline file")
+    parser.add_argument("--json", metavar="FILE", help="save the results to FILE")
+    args = parser.parse_args()
+    args.cleanup = []
+
+    if args.list:
+        for name, setup in BENCHMARKS.items():
+            print(f"{name:<24} {setup.__doc__}")
+        return
+    names = [n for n in BENCHMARKS if not args.pattern or any(fnmatch.fnmatch(n, p) for p in args.pattern)]
+    if not names:
+        parser.error("no benchmark matches " + " ".join(args.pattern))
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else None
+    calibrated = baseline is not None and baseline["machine"] != machine()
+    if calibrated:
+        print("baseline is from another machine or Python; comparing times relative to the calibration workload")
+
+    current = {
+        "machine": machine(),
+        "commit": git_commit(),
+        "calibration": measure(calibration_workload, args.repeat, args.min_time),
+        "results": {},
+    }
+    regressed = []
+    print(f"{'benchmark':<24} {'best':>10} {'median':>10} {'spread':>7} {'ratio':>6} {'limit':>6}  status")
+    try:
+        for name in names:
+            func = BENCHMARKS[name](args)
+            size = {SIZES[name]: getattr(args, SIZES[name])} if SIZES[name] else {}
+            current["results"][name] = {**measure(func, args.repeat, args.min_time), "size": size}
+            ratio, limit, status = None, None, "new"
+            if baseline is not None:
+                ratio, limit, status = compare(current, baseline, name, args.max_ratio, calibrated)
+                for _ in range(args.retries):
+                    if status != "regressed":
+                        break
+                    # measure again before reporting, so a burst of load on the machine does not fail the run
+                    time.sleep(1)
+                    again = measure(func, args.repeat, args.min_time)
+                    if again["best"] < current["results"][name]["best"]:
+                        current["results"][name].update(again)
+                    ratio, limit, status = compare(current, baseline, name, args.max_ratio, calibrated)
+                if status == "regressed":
+                    regressed.append(name)
+            result = current["results"][name]
+            print(
+                f"{name:<24} {result['best'] * 1e3:>8.3f}ms {result['median'] * 1e3:>8.3f}ms "
+                f"{result['spread']:>6.1%} {_ratio(ratio):>6} {_ratio(limit):>6}  {status}"
+            )
+    finally:
+        for path in args.cleanup:
+            os.remove(path)
+
+    if args.json:
+        with open(args.json, "w") as fout:
+            json.dump(current, fout, indent=2)
+    if args.update_baseline:
+        if baseline is not None and not calibrated:
+            current["results"] = {**baseline["results"], **current["results"]}
+        args.baseline.write_text(json.dumps(current, indent=2, sort_keys=True) + "\n")
+        print("saved the baseline to", args.baseline)
+    elif regressed:
+        print(f"{len(regressed)} regressed past {args.max_ratio:.2f}x:", ", ".join(regressed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
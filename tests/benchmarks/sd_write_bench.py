@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+
+"""Measure writes to the SD card caused by recording the last request state.
+
+Usage: `tests/benchmarks/sd_write_bench.py [-n REQUESTS] [--change-every K] [--device DEV --event EVENT]`. Run from the
+project root.
+
+The simulation (default, works on any machine) replays N requests whose state changes every K requests, once with the
+previous approach (compare with the saved JSON, touch it if unchanged, rewrite it if not) and once with StateStore, and
+counts how often the SD card copy was modified. With `--device` on the device, generate_request.py is run N times
+instead, and the sectors written to that block device (from /proc/diskstats) and by the processes (from their resource
+usage) are reported; the device counter also includes writes from the rest of the system.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+AUTOPI_DIR = Path(__file__).absolute().parent.parent.parent / "src" / "autopi"
+sys.path.append(str(AUTOPI_DIR))
+
+from util.state_store import StateStore  # noqa: E402
+
+SECTOR = 512
+
+
+def legacy_update(path: Path, state: dict) -> bool:
+    """Record the state the way generate_request did before StateStore."""
+    try:
+        with open(path) as fin:
+            unchanged = json.load(fin) == state
+    except (OSError, ValueError):
+        unchanged = False
+    if unchanged:
+        path.touch()
+    else:
+        with open(path, "w") as fout:
+            fout.write(json.dumps(state))
+    return unchanged
+
+
+def simulate(requests: int, change_every: int) -> dict:
+    """Replay requests with both approaches.
+
+    Returns:
+        dict[str, tuple[int, int]]: (SD card file modifications, including touches, and bytes of data written) for each
+        approach.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        sd_dir = Path(tmp) / "sd"
+        sd_dir.mkdir()
+        store = StateStore(run_dir=str(Path(tmp) / "run"), persist_dir=str(sd_dir / "store"))
+        approaches = {
+            "legacy": lambda state: legacy_update(sd_dir / "old_request.json", state),
+            "state_store": store.update,
+        }
+        for name, update in approaches.items():
+            modifications = written = 0
+            path = sd_dir / "old_request.json" if name == "legacy" else Path(store.persist_path)
+            last = None
+            for i in range(requests):
+                state = {"ip": f"10.0.{i // change_every % 256}.2", "ssh": "up", "vnc": "down"}
+                unchanged = update(state)
+                stat = path.stat()
+                if (stat.st_mtime_ns, stat.st_ino) != last:
+                    os.utime(path, ns=(0, 0))  # so that modifications within the clock resolution are seen
+                    last = (0, stat.st_ino)
+                    modifications += 1
+                    if not unchanged:
+                        written += stat.st_size
+            results[name] = (modifications, written)
+    return results
+
+
+def sectors_written(device: str) -> int:
+    """Read the sectors written to a block device since boot from /proc/diskstats."""
+    with open("/proc/diskstats") as fin:
+        for line in fin:
+            fields = line.split()
+            if fields[2] == device:
+                return int(fields[9])
+    raise ValueError(f"no block device {device}")
+
+
+def measure_device(device: str, event: str, requests: int) -> tuple:
+    """Run generate_request.py repeatedly.
+
+    Returns:
+        int: bytes written to the device during the runs.
+        int: bytes written by the processes.
+    """
+    before = sectors_written(device)
+    process_blocks = 0
+    for _ in range(requests):
+        proc = subprocess.Popen([sys.executable, str(AUTOPI_DIR / "generate_request.py"), event], cwd=AUTOPI_DIR)
+        _, _, usage = os.wait4(proc.pid, 0)
+        process_blocks += usage.ru_oublock
+    os.sync()
+    return (sectors_written(device) - before) * SECTOR, process_blocks * SECTOR
+
+
+def main():
+    """Report SD card writes for the simulation or for real runs."""
+    parser = argparse.ArgumentParser(description="Benchmark SD card writes of the request state.")
+    parser.add_argument("-n", "--requests", type=int, default=1440, help="requests to make. Defaults to 1440 (a day)")
+    parser.add_argument("--change-every", type=int, default=60, help="requests per state change. Defaults to 60")
+    parser.add_argument("--device", help="measure real runs on this block device instead, e.g. mmcblk0")
+    parser.add_argument("--event", default="keepalive", help="event of the real runs. Defaults to keepalive")
+    args = parser.parse_args()
+
+    if args.device:
+        device, processes = measure_device(args.device, args.event, args.requests)
+        print(f"{'requests':>8} {'device KiB':>11} {'process KiB':>12}")
+        print(f"{args.requests:>8} {device / 1024:>11.1f} {processes / 1024:>12.1f}")
+        return
+
+    print(f"{'approach':<12} {'requests':>8} {'SD writes':>10} {'data KiB':>9}")
+    for name, (modifications, written) in simulate(args.requests, args.change_every).items():
+        print(f"{name:<12} {args.requests:>8} {modifications:>10} {written / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
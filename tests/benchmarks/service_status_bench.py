@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""Compare per-probe latency of the service status backends on a Raspberry Pi.
+
+Usage: `tests/benchmarks/service_status_bench.py [-n RUNS] [SERVICE ...]`. Run from the project root on the device.
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).absolute().parent.parent.parent / "src" / "autopi"))
+
+from util import device_info  # noqa: E402
+from util.config import Config  # noqa: E402
+
+
+def time_probe(probe, service: str, runs: int) -> list:
+    """Time repeated calls of a probe.
+
+    Args:
+        probe (Callable[[str], object]): status function to time.
+        service (str): service to query.
+        runs (int): number of calls.
+
+    Returns:
+        list[float]: per-call latency in milliseconds.
+    """
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        probe(service)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def print_row(name: str, timings: list):
+    """Print latency statistics for one backend."""
+    print(
+        f"{name:<12} mean {statistics.mean(timings):8.3f} ms   median {statistics.median(timings):8.3f} ms   "
+        f"max {max(timings):8.3f} ms"
+    )
+
+
+def main():
+    """Time both backends for each service."""
+    parser = argparse.ArgumentParser(description="Benchmark service status probes.")
+    parser.add_argument("-n", "--runs", type=int, default=50, help="probes per backend. Defaults to 50")
+    parser.add_argument("services", nargs="*", default=[Config.SSH_SERVICE, Config.VNC_SERVICE])
+    args = parser.parse_args()
+
+    for service in args.services:
+        print(f"--- {service} ({args.runs} probes)")
+        print_row("subprocess", time_probe(device_info._is_service_up_subprocess, service, args.runs))
+        try:
+            # the first call opens the bus connection; report it separately from the steady state
+            first = time_probe(device_info.get_unit_active_state, service, 1)
+            print_row("dbus (first)", first)
+            print_row("dbus", time_probe(device_info.get_unit_active_state, service, args.runs))
+        except Exception as e:
+            print(f"{'dbus':<12} unavailable: {e!r}")
+
+
+if __name__ == "__main__":
+    main()
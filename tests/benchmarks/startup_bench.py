@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+
+"""Measure cold start time, import time and peak memory of generate_request.py.
+
+Usage: `tests/benchmarks/startup_bench.py [-n RUNS] [--run EVENT] [--top N] [--json FILE]`. Run from the project root.
+Without `--run`, only the imports are timed, which works on any machine. With `--run keepalive` on the device, a full
+run is timed, including sending the request.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+AUTOPI_DIR = Path(__file__).absolute().parent.parent.parent / "src" / "autopi"
+
+
+def command(event: str = None) -> list:
+    """Build the command that starts the client, either a full run for the event or just its imports."""
+    if event is None:
+        return [sys.executable, "-c", "import generate_request"]
+    return [sys.executable, str(AUTOPI_DIR / "generate_request.py"), event]
+
+
+def time_run(cmd: list) -> tuple:
+    """Run a command once.
+
+    Returns:
+        float: wall time in milliseconds.
+        int: peak resident set size of the process in KiB.
+    """
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=AUTOPI_DIR, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    elapsed = (time.perf_counter() - start) * 1000
+    proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    if proc.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} exited with {proc.returncode}")
+    return elapsed, usage.ru_maxrss
+
+
+def import_times(top: int) -> list:
+    """Collect the modules with the largest cumulative import time, as reported by `python -X importtime`.
+
+    Returns:
+        list[tuple[str, int]]: (module, cumulative microseconds), slowest first.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import generate_request"],
+        cwd=AUTOPI_DIR,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        modules.append((name.strip(), int(cumulative)))
+    modules.sort(key=lambda m: m[1], reverse=True)
+    return modules[:top]
+
+
+def main():
+    """Time repeated cold starts and report import times."""
+    parser = argparse.ArgumentParser(description="Benchmark generate_request.py startup.")
+    parser.add_argument("-n", "--runs", type=int, default=20, help="cold starts to time. Defaults to 20")
+    parser.add_argument("--run", metavar="EVENT", help="time a full run for this event instead of the imports only")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list. Defaults to 15")
+    parser.add_argument("--json", metavar="FILE", help="also write the results to FILE as JSON")
+    args = parser.parse_args()
+
+    cmd = command(args.run)
+    runs = [time_run(cmd) for _ in range(args.runs)]
+    walls = [wall for wall, _ in runs]
+    rss = [peak for _, peak in runs]
+    modules = import_times(args.top)
+
+    print(f"--- {' '.join(cmd[1:])} ({args.runs} runs)")
+    print(
+        f"wall     mean {statistics.mean(walls):8.1f} ms   median {statistics.median(walls):8.1f} ms   "
+        f"max {max(walls):8.1f} ms"
+    )
+    print(f"peak RSS median {statistics.median(rss) / 1024:8.1f} MiB   max {max(rss) / 1024:8.1f} MiB")
+    print("--- slowest imports (cumulative)")
+    for name, cumulative in modules:
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
+
+    if args.json:
+        results = {
+            "command": cmd[1:],
+            "python": sys.version.split()[0],
+            "wall_ms": walls,
+            "peak_rss_kib": rss,
+            "imports_us": dict(modules),
+        }
+        with open(args.json, "w") as fout:
+            json.dump(results, fout, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+"""Compare the JSON and compact binary status encodings: bytes per request, client encode and server decode cost.
+
+Usage: `tests/benchmarks/status_encoding_bench.py [-n RUNS]`. Run from the project root with the API dependencies
+(pydantic) installed.
+"""
+
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).absolute().parent.parent.parent
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "src" / "autopi"))
+
+from util import compact_status  # noqa: E402
+
+from web.api import compact  # noqa: E402
+from web.api.core import StatusModel  # noqa: E402
+
+HEARTBEAT = {
+    "version": 2,
+    "devid": "0b3f1c2e-0000-4000-8000-000000000001",
+    "event": "keepalive",
+    "digest": "0123456789abcdef",
+}
+FULL = {
+    **HEARTBEAT,
+    "event": "general",
+    "hwid": "5f0c8e9e2a2b8d1d7f3c4a6b9e0d1c2b3a4f5e6d7c8b9a0f1e2d3c4b5a697887",
+    "ip": "138.67.186.24",
+    "mac": "b8:27:eb:12:34:56",
+    "ssid": "CSMwireless",
+    "ssh": "up",
+    "vnc": "down",
+}
+
+
+def per_call_us(func, runs: int) -> float:
+    """Time a function, returning the best of 5 repeats in microseconds per call."""
+    return min(timeit.repeat(func, number=runs, repeat=5)) / runs * 1e6
+
+
+def main():
+    """Print size and cost of both encodings for a heartbeat and a full request."""
+    parser = argparse.ArgumentParser(description="Benchmark status encodings.")
+    parser.add_argument("-n", "--runs", type=int, default=20000, help="calls per timing. Defaults to 20000")
+    args = parser.parse_args()
+
+    print(f"{'request':<10} {'encoding':<8} {'bytes':>6} {'encode us':>10} {'decode us':>10}")
+    for name, request in (("heartbeat", HEARTBEAT), ("full", FULL)):
+        body = json.dumps(request).encode("utf-8")
+        encode = per_call_us(lambda: json.dumps(request).encode("utf-8"), args.runs)
+        decode = per_call_us(lambda: StatusModel.model_validate_json(body), args.runs)
+        print(f"{name:<10} {'json':<8} {len(body):>6} {encode:>10.2f} {decode:>10.2f}")
+
+        body = compact_status.encode_status(request)
+        encode = per_call_us(lambda: compact_status.encode_status(request), args.runs)
+        decode = per_call_us(lambda: compact.decode_status(body), args.runs)
+        print(f"{name:<10} {'compact':<8} {len(body):>6} {encode:>10.2f} {decode:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()